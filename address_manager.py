@@ -6,20 +6,38 @@
 
 import os
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from paginator import PageCache, page_size, page_slice, join_page
+
 # 加载环境变量
 load_dotenv()
 
+_EMPTY_WHITELIST = "❌ 白名单为空\n\n请在 .env 文件中配置 WHITELIST_ADDRESSES"
+_WHITELIST_TITLE = "✅ 白名单地址\n\n"
+_ADDRESS_LIST_TITLE = "📋 可用地址列表\n\n"
+
 class AddressManager:
     """简化地址管理器"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        # 白名单版本号：每次设置白名单时递增，分页渲染缓存按版本失效
+        self.whitelist_version = 0
         self.whitelist_addresses = self._load_whitelist_addresses()
+        self._pages = PageCache()
         self.logger.info(f"简化地址管理器初始化完成，共加载 {len(self.whitelist_addresses)} 个白名单地址")
     
+    @property
+    def whitelist_addresses(self) -> Dict[str, Dict]:
+        return self._whitelist_addresses
+    
+    @whitelist_addresses.setter
+    def whitelist_addresses(self, addresses: Dict[str, Dict]):
+        self._whitelist_addresses = addresses
+        self.whitelist_version += 1
+    
     def _load_whitelist_addresses(self) -> Dict[str, Dict]:
         """从.env文件加载白名单地址"""
         try:
@@ -93,37 +111,55 @@ class AddressManager:
         
         return results
     
-    def format_whitelist(self) -> str:
-        """格式化白名单显示"""
+    @staticmethod
+    def _format_entry(index: int, address: str, addr_data: Dict, short: bool) -> str:
+        """一个白名单地址的展示文本（序号从1开始，与 /transfer 的序号一致）"""
+        shown = f"{address[:10]}...{address[-10:]}" if short else address
+        entry = f"{index}. {addr_data['alias']}\n   📍 {shown}\n"
+        if addr_data['description']:
+            entry += f"   📝 {addr_data['description']}\n"
+        return entry + "\n"
+    
+    def _format_all(self, title: str, short: bool) -> str:
+        if not self.whitelist_addresses:
+            return _EMPTY_WHITELIST
+        entries = [self._format_entry(i, address, data, short)
+                   for i, (address, data) in enumerate(self.whitelist_addresses.items(), 1)]
+        return ''.join([title] + entries)
+    
+    def _format_page(self, title: str, short: bool, page: int,
+                     prefix: str = '', footer: str = '') -> Tuple[str, int, int]:
+        """渲染一页并缓存，返回 (文本, 实际页码, 总页数)；prefix、footer 计入消息长度上限"""
         if not self.whitelist_addresses:
-            return "❌ 白名单为空\n\n请在 .env 文件中配置 WHITELIST_ADDRESSES"
+            return prefix + _EMPTY_WHITELIST + footer, 0, 1
         
-        result = "✅ 白名单地址\n\n"
+        size = page_size()
+        pages = (len(self.whitelist_addresses) + size - 1) // size
+        page = min(max(page, 0), pages - 1)
         
-        for i, (address, addr_data) in enumerate(self.whitelist_addresses.items(), 1):
-            result += f"{i}. {addr_data['alias']}\n"
-            result += f"   📍 {address}\n"
-            if addr_data['description']:
-                result += f"   📝 {addr_data['description']}\n"
-            result += "\n"
+        def render():
+            page_items, _, _ = page_slice(list(self.whitelist_addresses.items()), page, size)
+            entries = [self._format_entry(page * size + i, address, data, short)
+                       for i, (address, data) in enumerate(page_items, 1)]
+            return join_page(prefix + title, entries, page, pages, footer), page, pages
         
-        return result
+        return self._pages.get((title, page, size, prefix, footer), self.whitelist_version, render)
+    
+    def format_whitelist(self) -> str:
+        """格式化白名单显示"""
+        return self._format_all(_WHITELIST_TITLE, False)
     
     def format_address_list(self) -> str:
         """格式化地址列表（用于选择）"""
-        if not self.whitelist_addresses:
-            return "❌ 白名单为空\n\n请在 .env 文件中配置 WHITELIST_ADDRESSES"
-        
-        result = "📋 可用地址列表\n\n"
-        
-        for i, (address, addr_data) in enumerate(self.whitelist_addresses.items(), 1):
-            result += f"{i}. {addr_data['alias']}\n"
-            result += f"   📍 {address[:10]}...{address[-10:]}\n"
-            if addr_data['description']:
-                result += f"   📝 {addr_data['description']}\n"
-            result += "\n"
-        
-        return result
+        return self._format_all(_ADDRESS_LIST_TITLE, True)
+    
+    def format_whitelist_page(self, page: int = 0) -> Tuple[str, int, int]:
+        """白名单的第 page 页（从0开始），返回 (文本, 实际页码, 总页数)"""
+        return self._format_page(_WHITELIST_TITLE, False, page)
+    
+    def format_address_list_page(self, page: int = 0, prefix: str = '', footer: str = '') -> Tuple[str, int, int]:
+        """地址列表的第 page 页（从0开始），返回 (文本, 实际页码, 总页数)；prefix、footer 为页首页尾附加文字"""
+        return self._format_page(_ADDRESS_LIST_TITLE, True, page, prefix, footer)
     
     def get_address_for_transfer(self, input_text: str) -> Optional[str]:
         """根据输入获取转账地址（支持序号、别名、地址），非法输入返回None"""
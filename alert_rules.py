@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+入账提醒规则
+从 ALERT_RULES_FILE（JSON）读取规则，按接收地址编译成索引好的判断函数，
+在检测到新交易时立即判定是否提醒、提醒谁；被静音的交易不进入通知，不产生Telegram请求。
+
+规则文件示例：
+{
+  "default": "alert",
+  "rules": [
+    {"name": "粉尘", "max_amount": 1, "action": "mute"},
+    {"name": "陌生发送方", "sender": "unknown", "action": "alert"},
+    {"name": "A大额", "address": "TXXX...", "token": "USDT", "min_amount": 1000, "action": "alert", "users": ["123"]},
+    {"name": "A其余", "address": "TXXX...", "action": "mute"}
+  ]
+}
+
+按文件顺序第一条匹配的规则生效，都不匹配时按 default 处理。条件均可省略：
+- address：接收地址（字符串或列表）
+- token：代币符号（字符串或列表）
+- min_amount / max_amount：金额下限（含）/ 上限（不含）
+- sender："whitelist"（白名单地址）、"unknown"（非白名单地址），或发送方地址 / 白名单别名列表
+动作：alert（提醒，users 可限定接收者）或 mute（静音）
+"""
+
+import os
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+ACTIONS = ('alert', 'mute')
+_CONDITION_KEYS = {'name', 'address', 'token', 'min_amount', 'max_amount', 'sender', 'action', 'users'}
+
+# 规则决策：(是否提醒, 规则名, 限定接收者)
+Decision = Tuple[bool, str, Optional[Tuple[str, ...]]]
+
+
+def _as_list(value) -> List[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+
+class AlertRuleEngine:
+    """规则编译与判定
+
+    每条规则编译为一个只包含其自身条件的 lambda（条件值作为常量绑定），
+    再按接收地址建立索引：地址 -> 该地址适用的规则（地址专属规则和通配规则按文件顺序合并）。
+    判定时一次字典查找加顺序匹配，不再逐条解释规则。
+    """
+
+    def __init__(self, address_manager=None, rules_file: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.address_manager = address_manager
+        self.rules_file = rules_file if rules_file is not None else os.getenv('ALERT_RULES_FILE', 'alert_rules.json')
+        self._mtime = None
+        self._by_address: Dict[str, list] = {}
+        self._wildcard: list = []
+        self._default: Decision = (True, 'default', None)
+        self.rule_count = 0
+        self.reload()
+
+    def load(self, config: Dict):
+        """编译一份规则配置（格式见模块说明），配置有误时抛出 ValueError"""
+        default = config.get('default', 'alert')
+        if default not in ACTIONS:
+            raise ValueError(f"default 只能是 {'/'.join(ACTIONS)}: {default}")
+
+        compiled = []
+        for index, rule in enumerate(config.get('rules', [])):
+            unknown = set(rule) - _CONDITION_KEYS
+            if unknown:
+                raise ValueError(f"规则 {index + 1} 含未知字段: {', '.join(sorted(unknown))}")
+            compiled.append((rule.get('address'), self._compile_rule(index, rule)))
+
+        wildcard = [entry for addresses, entry in compiled if addresses is None]
+        by_address: Dict[str, list] = {}
+        for position, (addresses, entry) in enumerate(compiled):
+            for address in _as_list(addresses or []):
+                by_address.setdefault(address, []).append((position, entry))
+        # 地址专属规则与通配规则按原始顺序合并，保证“第一条匹配生效”
+        wildcard_positions = [(position, entry) for position, (addresses, entry) in enumerate(compiled)
+                              if addresses is None]
+        self._by_address = {
+            address: [entry for _, entry in sorted(entries + wildcard_positions, key=lambda item: item[0])]
+            for address, entries in by_address.items()
+        }
+        self._wildcard = wildcard
+        self._default = (default == 'alert', 'default', None)
+        self.rule_count = len(compiled)
+
+    def _compile_rule(self, index: int, rule: Dict):
+        """把一条规则编译成 (判断函数, 决策)"""
+        action = rule.get('action', 'alert')
+        if action not in ACTIONS:
+            raise ValueError(f"规则 {index + 1} 的 action 只能是 {'/'.join(ACTIONS)}: {action}")
+        name = rule.get('name') or f"规则{index + 1}"
+
+        terms, constants = [], {}
+        if rule.get('token') is not None:
+            constants['tokens'] = frozenset(token.upper() for token in _as_list(rule['token']))
+            terms.append("token in tokens")
+        if rule.get('min_amount') is not None:
+            constants['min_amount'] = float(rule['min_amount'])
+            terms.append("amount >= min_amount")
+        if rule.get('max_amount') is not None:
+            constants['max_amount'] = float(rule['max_amount'])
+            terms.append("amount < max_amount")
+        sender = rule.get('sender')
+        if sender is not None:
+            whitelist = frozenset(self.address_manager.get_whitelist_addresses()) if self.address_manager else frozenset()
+            if sender == 'whitelist':
+                constants['senders'] = whitelist
+                terms.append("sender in senders")
+            elif sender == 'unknown':
+                constants['senders'] = whitelist
+                terms.append("sender not in senders")
+            else:
+                constants['senders'] = frozenset(self._resolve_sender(entry) for entry in _as_list(sender))
+                terms.append("sender in senders")
+
+        source = "lambda amount, token, sender: " + (" and ".join(terms) if terms else "True")
+        # 条件值作为函数的全局常量绑定，源码里只有固定的变量名，不拼接配置内容
+        predicate = eval(compile(source, f"<alert rule {name}>", 'eval'), {'__builtins__': {}, **constants})
+        users = tuple(str(user) for user in rule['users']) if rule.get('users') else None
+        return predicate, (action == 'alert', name, users)
+
+    def _resolve_sender(self, entry: str) -> str:
+        """发送方条件可以写白名单别名"""
+        if self.address_manager and not (entry.startswith('T') and len(entry) == 34):
+            info = self.address_manager.get_address_by_alias(entry)
+            if info:
+                return info['address']
+            raise ValueError(f"未知的白名单别名: {entry}")
+        return entry
+
+    def reload(self) -> bool:
+        """规则文件有变化时重新编译；文件不存在时全部提醒，编译失败时保留原规则"""
+        try:
+            mtime = os.path.getmtime(self.rules_file) if self.rules_file else None
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        if mtime is None:
+            self.load({})
+            return True
+        try:
+            with open(self.rules_file, encoding='utf-8') as f:
+                self.load(json.load(f))
+            self.logger.info(f"提醒规则已加载: {self.rules_file}（{self.rule_count} 条）")
+            return True
+        except Exception as e:
+            self.logger.error(f"提醒规则加载失败，继续使用原规则: {e}")
+            return False
+
+    def evaluate(self, transfer: Dict) -> Decision:
+        """判定一笔入账：返回 (是否提醒, 命中的规则名, 限定接收者或 None)"""
+        amount = transfer['amount']
+        token = transfer.get('token', 'USDT')
+        sender = transfer.get('from')
+        for predicate, decision in self._by_address.get(transfer['to'], self._wildcard):
+            if predicate(amount, token, sender):
+                return decision
+        return self._default
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+历史转账回填
+按 fingerprint 翻页拉取监控地址在全部监控代币（MONITOR_TOKENS，含TRX）上的转入记录并写入本地存储，
+多地址并发、共享API限速、按页保存进度，中断后可继续
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+# 导入自定义模块
+from tron_monitor import TronUSDTMonitor, INBOUND
+from transfer_store import TransferStore
+from log_setup import setup_logging
+
+# 加载环境变量
+load_dotenv()
+
+class RateLimiter:
+    """令牌桶限速器（线程安全），多个工作线程共享同一份API配额"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，配额不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class TransferBackfiller:
+    """监控地址的历史转账回填器"""
+
+    def __init__(self, monitor: TronUSDTMonitor, store: TransferStore,
+                 workers: Optional[int] = None, rate: Optional[float] = None,
+                 page_size: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.monitor = monitor
+        self.store = store
+        self.workers = workers or int(os.getenv('BACKFILL_WORKERS', '4'))
+        # TronGrid 单页最多200条；请求速率按API Key配额设置
+        self.page_size = page_size or int(os.getenv('BACKFILL_PAGE_SIZE', '200'))
+        self.rate_limiter = RateLimiter(rate or float(os.getenv('TRON_API_RATE_LIMIT', '10')))
+
+    def backfill_address(self, address: str, restart: bool = False) -> Dict:
+        """回填单个地址，从上次保存的进度继续"""
+        if restart:
+            self.store.clear_checkpoint(address)
+
+        checkpoint = self.store.get_checkpoint(address)
+        if checkpoint and checkpoint['done']:
+            self.logger.info(f"地址 {address} 已回填完成，共 {checkpoint['fetched']} 条，跳过")
+            return {'address': address, 'fetched': checkpoint['fetched'], 'inserted': 0, 'skipped': True}
+
+        # 进度按列表（trc20、trx）分别记录下一页的 fingerprint，以JSON存在该地址的检查点里
+        fingerprints = self._load_fingerprints(address, checkpoint)
+        fetched = checkpoint['fetched'] if checkpoint and fingerprints else 0
+        inserted = 0
+        registry = self.monitor.token_registry
+        lists = (['trc20'] if registry.contracts else []) + (['trx'] if registry.watch_trx else [])
+        if fingerprints:
+            self.logger.info(f"地址 {address} 从上次进度继续回填（已拉取 {fetched} 条）")
+
+        while True:
+            # 每个未到底的列表续取一页，各占一次请求配额
+            for name in lists:
+                if fingerprints.get(name, '') is not None:
+                    self.rate_limiter.acquire()
+            transfers = [
+                transfer for transfer in self.monitor.iter_token_transfers(
+                    address, limit=self.page_size, fingerprints=fingerprints
+                )
+                if transfer['direction'] == INBOUND
+            ]
+
+            inserted += self.store.add_transfers(transfers)
+            fetched += len(transfers)
+            done = all(fingerprint is None for fingerprint in fingerprints.values())
+            # 每页落盘一次进度，中断后从下一页继续
+            self.store.save_checkpoint(address, None if done else json.dumps(fingerprints), fetched, done, int(time.time()))
+            self.logger.info(f"地址 {address} 回填进度: 已拉取 {fetched} 条，新写入 {inserted} 条")
+            if done:
+                break
+
+        return {'address': address, 'fetched': fetched, 'inserted': inserted, 'skipped': False}
+
+    def _load_fingerprints(self, address: str, checkpoint: Optional[Dict]) -> Dict[str, Optional[str]]:
+        """从检查点取回各列表的翻页进度；旧版只回填USDT时保存的单个 fingerprint 无法续用，从头开始（已有记录会被忽略）"""
+        if not checkpoint or not checkpoint['fingerprint']:
+            return {}
+        try:
+            fingerprints = json.loads(checkpoint['fingerprint'])
+        except ValueError:
+            fingerprints = None
+        if not isinstance(fingerprints, dict):
+            self.logger.info(f"地址 {address} 的回填进度来自旧版本（只含USDT），从头回填")
+            return {}
+        return fingerprints
+
+    def run(self, addresses: List[str], restart: bool = False) -> List[Dict]:
+        """并发回填多个地址，单个地址失败不影响其他地址"""
+        results = []
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(self.backfill_address, address, restart): address
+                for address in addresses
+            }
+            for future in as_completed(futures):
+                address = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    self.logger.error(f"地址 {address} 回填失败（进度已保存，可重新运行继续）: {e}")
+                    results.append({'address': address, 'error': str(e)})
+
+        elapsed = time.time() - started
+        total = sum(r.get('fetched', 0) for r in results if not r.get('skipped'))
+        self.logger.info(f"回填结束: {len(addresses)} 个地址，本次拉取 {total} 条，耗时 {elapsed:.1f} 秒")
+        return results
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="回填监控地址在全部监控代币上的历史转入记录")
+    parser.add_argument('addresses', nargs='*', help="要回填的地址（默认全部 MONITOR_ADDRESSES）")
+    parser.add_argument('--workers', type=int, default=None, help="并发地址数")
+    parser.add_argument('--rate', type=float, default=None, help="每秒请求数上限")
+    parser.add_argument('--restart', action='store_true', help="忽略已保存的进度，从头回填")
+    args = parser.parse_args()
+
+    setup_logging()
+
+    monitor = TronUSDTMonitor()
+    addresses = args.addresses or monitor.get_monitor_addresses()
+    if not addresses:
+        logging.error("未配置监控地址")
+        sys.exit(1)
+
+    store = TransferStore()
+    backfiller = TransferBackfiller(monitor, store, workers=args.workers, rate=args.rate)
+    results = backfiller.run(addresses, restart=args.restart)
+    store.close()
+
+    if any('error' in r for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
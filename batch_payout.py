@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+批量转账（批量打款）
+从CSV解析别名/金额，统一校验后流水线签名、限并发广播，逐笔记录结果，失败可续跑
+"""
+
+import os
+import csv
+import io
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from tronpy.exceptions import TransactionNotFound
+
+# 导入自定义模块
+from wallet_operations import TronWallet
+from address_manager import AddressManager
+from resource_forecaster import DEFAULT_FEE_LIMIT
+
+# 加载环境变量
+load_dotenv()
+
+# 逐笔状态：pending 待处理 → signed 已签名 → broadcast 已广播；failed 失败（可续跑）
+ITEM_PENDING = 'pending'
+ITEM_SIGNED = 'signed'
+ITEM_BROADCAST = 'broadcast'
+ITEM_FAILED = 'failed'
+
+# 批次状态：ready 待确认 → executing 执行中 → done 已执行（未完成的部分可续跑）
+BATCH_READY = 'ready'
+BATCH_EXECUTING = 'executing'
+BATCH_DONE = 'done'
+
+
+def _decode_message(message: str) -> str:
+    """节点错误信息通常是十六进制编码的文本"""
+    try:
+        return bytes.fromhex(message).decode('utf-8', errors='replace')
+    except ValueError:
+        return message
+
+
+def parse_payout_csv(text: str, address_manager: AddressManager) -> Tuple[List[Dict], List[str]]:
+    """解析 "别名,金额" 格式的CSV（别名也可以是序号或地址），返回 (明细, 错误列表)"""
+    items = []
+    errors = []
+    for line_no, row in enumerate(csv.reader(io.StringIO(text)), 1):
+        row = [col.strip() for col in row]
+        if not row or not any(row) or row[0].startswith('#'):
+            continue
+        if len(row) < 2:
+            errors.append(f"第{line_no}行格式错误: {','.join(row)}")
+            continue
+        alias, amount_str = row[0], row[1]
+        try:
+            amount = float(amount_str)
+        except ValueError:
+            # 允许表头行
+            if line_no == 1:
+                continue
+            errors.append(f"第{line_no}行金额无效: {amount_str}")
+            continue
+        if amount <= 0:
+            errors.append(f"第{line_no}行金额必须大于0: {amount_str}")
+            continue
+        to_address = address_manager.get_address_for_transfer(alias)
+        if not to_address:
+            errors.append(f"第{line_no}行未找到白名单地址: {alias}")
+            continue
+        items.append({'alias': alias, 'to_address': to_address, 'amount': amount})
+    return items, errors
+
+
+class PayoutBatchStore:
+    """批量转账明细存储（SQLite），记录每笔的状态、txid和已签名交易，用于续跑"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv('PAYOUT_DB_PATH', 'payouts.db')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS payout_batches (
+                    batch_id TEXT PRIMARY KEY,
+                    token TEXT NOT NULL,
+                    total REAL NOT NULL,
+                    item_count INTEGER NOT NULL,
+                    created_at INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS payout_items (
+                    batch_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    alias TEXT,
+                    to_address TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    txid TEXT,
+                    signed_tx TEXT,
+                    expiration INTEGER,
+                    error TEXT,
+                    updated_at INTEGER NOT NULL,
+                    PRIMARY KEY (batch_id, seq)
+                )
+            """)
+            # 旧库升级：每笔记录分配到的付款钱包（为空表示主钱包）
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(payout_items)")}
+            if 'from_address' not in columns:
+                self._conn.execute("ALTER TABLE payout_items ADD COLUMN from_address TEXT")
+            # 旧库升级：批次状态，已有批次视为已执行过（只能续跑）
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(payout_batches)")}
+            if 'status' not in columns:
+                self._conn.execute(f"ALTER TABLE payout_batches ADD COLUMN status TEXT NOT NULL DEFAULT '{BATCH_DONE}'")
+            # 上次进程在执行中退出的批次：逐笔状态已落库，释放后可续跑
+            self._conn.execute("UPDATE payout_batches SET status = ? WHERE status = ?", (BATCH_DONE, BATCH_EXECUTING))
+
+    def create_batch(self, token: str, items: List[Dict]) -> str:
+        """保存新批次，返回批次号"""
+        batch_id = uuid.uuid4().hex[:8]
+        now = int(time.time())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO payout_batches (batch_id, token, total, item_count, created_at, status) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (batch_id, token, sum(item['amount'] for item in items), len(items), now, BATCH_READY)
+            )
+            self._conn.executemany(
+                "INSERT INTO payout_items (batch_id, seq, alias, to_address, amount, from_address, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(batch_id, seq, item['alias'], item['to_address'], item['amount'], item.get('from_address'),
+                  ITEM_PENDING, now)
+                 for seq, item in enumerate(items, 1)]
+            )
+        return batch_id
+
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """获取批次信息"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM payout_batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim_batch(self, batch_id: str, resume: bool = True) -> bool:
+        """原子地把批次标记为执行中，已在执行（或 resume=False 时已确认过）返回 False"""
+        sql = "UPDATE payout_batches SET status = ? WHERE batch_id = ? AND status "
+        sql += "!= ?" if resume else "= ?"
+        with self._lock, self._conn:
+            cursor = self._conn.execute(sql, (BATCH_EXECUTING, batch_id, BATCH_EXECUTING if resume else BATCH_READY))
+        return cursor.rowcount == 1
+
+    def release_batch(self, batch_id: str):
+        """执行结束，释放批次"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE payout_batches SET status = ? WHERE batch_id = ?", (BATCH_DONE, batch_id))
+
+    def get_items(self, batch_id: str, statuses: Optional[Tuple[str, ...]] = None) -> List[Dict]:
+        """按序号获取批次明细，可按状态过滤"""
+        sql = "SELECT * FROM payout_items WHERE batch_id = ?"
+        params = [batch_id]
+        if statuses:
+            sql += f" AND status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY seq", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def update_item(self, batch_id: str, seq: int, status: str, **fields):
+        """更新单笔状态（txid / signed_tx / expiration / error）"""
+        columns = ['status = ?', 'updated_at = ?']
+        params = [status, int(time.time())]
+        for name in ('txid', 'signed_tx', 'expiration', 'error'):
+            if name in fields:
+                columns.append(f"{name} = ?")
+                params.append(fields[name])
+        params.extend([batch_id, seq])
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE payout_items SET {', '.join(columns)} WHERE batch_id = ? AND seq = ?",
+                params
+            )
+
+    def summarize(self, batch_id: str) -> Dict[str, int]:
+        """统计批次各状态笔数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS count FROM payout_items WHERE batch_id = ? GROUP BY status",
+                (batch_id,)
+            ).fetchall()
+        return {row['status']: row['count'] for row in rows}
+
+
+class BatchPayoutEngine:
+    """批量转账引擎"""
+
+    def __init__(self, wallet: TronWallet, store: Optional[PayoutBatchStore] = None):
+        self.logger = logging.getLogger(__name__)
+        self.wallet = wallet
+        self.store = store or PayoutBatchStore()
+        self.max_items = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+        self.broadcast_concurrency = int(os.getenv('BATCH_BROADCAST_CONCURRENCY', '4'))
+        # 签名交易过期后多等几个出块间隔（每块约3秒）再判定未上链
+        self.resign_margin_ms = int(os.getenv('BATCH_RESIGN_MARGIN_MS', '9000'))
+
+    def prepare(self, items: List[Dict], token_type: str) -> Dict:
+        """统一校验整批（白名单、单笔限额、总余额、总能量）并分配付款钱包，通过后保存批次"""
+        if not items:
+            return {'success': False, 'errors': ['批次为空']}
+        if len(items) > self.max_items:
+            return {'success': False, 'errors': [f'批次超过 {self.max_items} 笔']}
+
+        errors = []
+        for seq, item in enumerate(items, 1):
+            if not self.wallet._validate_transfer(item['to_address'], item['amount'], token_type):
+                errors.append(f"第{seq}笔校验失败（白名单或限额）: {item['alias']} {item['amount']}")
+
+        total = sum(item['amount'] for item in items)
+        sources, allocation_errors = self._allocate(items, token_type)
+        errors.extend(allocation_errors)
+        items = [dict(item, from_address=source) for item, source in zip(items, sources)]
+
+        if errors:
+            return {'success': False, 'errors': errors}
+
+        batch_id = self.store.create_batch(token_type, items)
+        wallets: Dict[str, int] = {}
+        for item in items:
+            wallets[item['from_address']] = wallets.get(item['from_address'], 0) + 1
+        self.logger.info(f"批量转账批次 {batch_id} 已创建: {len(items)} 笔，合计 {total} {token_type}，付款钱包: {wallets}")
+        return {'success': True, 'batch_id': batch_id, 'count': len(items), 'total': total, 'wallets': wallets}
+
+    def _allocate(self, items: List[Dict], token_type: str) -> Tuple[List[Optional[str]], List[str]]:
+        """把整批分配到钱包池的付款钱包，返回 (每笔的付款地址, 错误列表)
+
+        按金额从大到小逐笔分配：优先给质押能量够用的钱包，其中剩余能量和余额最多的优先，
+        这样大额和高能耗的转账先占位，各钱包的余额和能量被均衡消耗。
+        USDT批次最后按钱包分组做一次完整的资源规划（燃烧TRX的上限等）。
+        """
+        forecaster = self.wallet.resource_forecaster
+        addresses = self.wallet.wallet_addresses
+        balances = {}
+        energy = {}
+        for address in addresses:
+            if token_type == 'USDT':
+                balances[address] = self.wallet._get_usdt_account_snapshot(address)['usdt']
+                energy[address] = forecaster.get_resources(address)['available_energy']
+            else:
+                balances[address] = float(self.wallet.tron.get_account_balance(address))
+
+        total = sum(item['amount'] for item in items)
+        if sum(balances.values()) < total:
+            return [None] * len(items), [f"{token_type}余额不足: {sum(balances.values())} < {total}"]
+
+        errors = []
+        sources: List[Optional[str]] = [None] * len(items)
+        for index in sorted(range(len(items)), key=lambda i: items[i]['amount'], reverse=True):
+            item = items[index]
+            candidates = [address for address in addresses if balances[address] >= item['amount']]
+            if not candidates:
+                errors.append(f"第{index + 1}笔金额超过任一钱包的剩余余额: {item['alias']} {item['amount']}")
+                continue
+            if token_type == 'USDT':
+                cost = forecaster.estimate_usdt_energy(candidates[0], item['to_address'], int(item['amount'] * 1_000_000))
+                candidates = [address for address in candidates if energy[address] >= cost] or candidates
+                source = max(candidates, key=lambda address: (energy[address], balances[address]))
+                energy[source] -= cost
+            else:
+                source = max(candidates, key=lambda address: balances[address])
+            balances[source] -= item['amount']
+            sources[index] = source
+
+        if token_type == 'USDT' and not errors:
+            for address in addresses:
+                group = [(item['to_address'], int(item['amount'] * 1_000_000))
+                         for item, source in zip(items, sources) if source == address]
+                if not group:
+                    continue
+                plan = forecaster.plan_usdt_transfers(address, group)
+                if not plan['ok']:
+                    errors.append(plan['error'] if len(addresses) == 1 else f"{address}: {plan['error']}")
+        return sources, errors
+
+    def _on_chain(self, batch_id: str, item: Dict) -> bool:
+        """交易已上链时把该笔标记为已广播"""
+        try:
+            self.wallet.tron.get_transaction(item['txid'])
+        except TransactionNotFound:
+            return False
+        self.store.update_item(batch_id, item['seq'], ITEM_BROADCAST)
+        return True
+
+    def _reconcile_signed(self, batch_id: str, item: Dict) -> Optional[str]:
+        """续跑时处理上次已签名但未确认广播的交易，返回需要重新处理的状态或 None（已处理）
+
+        未过期的签名交易只原样重发（同一 txid 最多上链一次）；过期后再等 RESIGN_MARGIN_MS，
+        让过期前刚被打包的交易也能查到，再核对一次仍未上链才重新签名，避免重复打款。
+        """
+        if self._on_chain(batch_id, item):
+            return None
+        expiration = item['expiration'] or 0
+        now_ms = int(time.time() * 1000)
+        if item['signed_tx'] and now_ms < expiration:
+            return ITEM_SIGNED
+        wait_ms = expiration + self.resign_margin_ms - now_ms
+        if wait_ms > 0:
+            time.sleep(wait_ms / 1000)
+        if self._on_chain(batch_id, item):
+            return None
+        return ITEM_PENDING
+
+    def claim(self, batch_id: str, resume: bool = True) -> Optional[str]:
+        """占用批次的执行权，成功返回 None（之后由 run 执行并释放），否则返回拒绝原因
+
+        resume=False 用于确认按钮：只有从未执行过的批次可以占用，连点或重复回调都会被拒绝。
+        """
+        if not self.store.get_batch(batch_id):
+            return f'批次不存在: {batch_id}'
+        if self.store.claim_batch(batch_id, resume):
+            return None
+        batch = self.store.get_batch(batch_id)
+        if batch and batch['status'] == BATCH_EXECUTING:
+            return f'批次 {batch_id} 正在执行中'
+        return f'批次 {batch_id} 已执行过，请使用 /batch_resume {batch_id} 续跑'
+
+    def execute(self, batch_id: str, progress: Optional[Callable[[Dict], None]] = None, resume: bool = True) -> Dict:
+        """执行（或续跑）批次；同一批次同时只能有一个执行"""
+        error = self.claim(batch_id, resume)
+        if error:
+            return {'success': False, 'error': error}
+        return self.run(batch_id, progress)
+
+    def run(self, batch_id: str, progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """执行已占用的批次：签名线程按序号流水线签名，广播线程池限并发广播，结束后释放批次"""
+        try:
+            return self._run(batch_id, progress)
+        finally:
+            self.store.release_batch(batch_id)
+
+    def _run(self, batch_id: str, progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        batch = self.store.get_batch(batch_id)
+        token_type = batch['token']
+        default_address = self.wallet.address
+        started = time.time()
+
+        work = []
+        for item in self.store.get_items(batch_id, (ITEM_PENDING, ITEM_SIGNED, ITEM_FAILED)):
+            if item['status'] == ITEM_SIGNED or (item['status'] == ITEM_FAILED and item['txid']):
+                try:
+                    state = self._reconcile_signed(batch_id, item)
+                except Exception as e:
+                    # 无法确认是否已上链时跳过，避免重复打款，下次续跑再核对
+                    self.logger.error(f"批次 {batch_id} 第{item['seq']}笔链上核对失败，本次跳过: {e}")
+                    continue
+                if state is None:
+                    continue
+                item['status'] = state
+            work.append(item)
+
+        # 每笔的付款钱包在创建批次时分配（旧批次为空，使用主钱包）
+        for item in work:
+            item['from_address'] = item.get('from_address') or default_address
+        sources = sorted({item['from_address'] for item in work})
+
+        # 整个签名和广播期间占用这些付款钱包，与单笔转账互斥；有钱包正被占用时拒绝执行，稍后续跑
+        locks = []
+        for source in sources:
+            lock = self.wallet._wallet_locks.setdefault(source, threading.Lock())
+            if not lock.acquire(blocking=False):
+                for held in locks:
+                    held.release()
+                self.logger.warning(f"批次 {batch_id} 付款钱包 {source} 正在被其他转账使用，拒绝执行")
+                return {'success': False, 'error': f'付款钱包 {source} 正在被其他转账使用，请稍后使用 /batch_resume {batch_id} 续跑'}
+            locks.append(lock)
+        try:
+            return self._sign_and_broadcast(batch_id, token_type, work, sources, started, progress)
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def _check_source(self, token_type: str, source: str, items: List[Dict]) -> Tuple[Optional[str], Dict[int, int]]:
+        """签名前按最新余额和资源重新核对一个付款钱包的待签名交易，返回 (错误, 每笔的 fee_limit)
+
+        创建批次后余额和能量可能已被其他转账消耗，所以先作废缓存再查询。
+        USDT每笔的 fee_limit 由资源规划给出（需要燃烧TRX的交易需要更高的上限）。
+        """
+        self.wallet.invalidate_account_snapshot(source)
+        self.wallet.resource_forecaster.invalidate(source)
+        if token_type == 'TRX':
+            balance = float(self.wallet.tron.get_account_balance(source))
+            total = sum(item['amount'] for item in items)
+            if balance < total:
+                return f'TRX余额不足: {balance} < {total}', {}
+            return None, {}
+        usdt = self.wallet._get_usdt_account_snapshot(source)['usdt']
+        total = sum(item['amount'] for item in items)
+        if usdt < total:
+            return f'USDT余额不足: {usdt} < {total}', {}
+        plan = self.wallet.resource_forecaster.plan_usdt_transfers(
+            source, [(item['to_address'], int(item['amount'] * 1_000_000)) for item in items]
+        )
+        if not plan['ok']:
+            return plan['error'], {}
+        return None, {item['seq']: planned['fee_limit'] for item, planned in zip(items, plan['items'])}
+
+    def _sign_and_broadcast(self, batch_id: str, token_type: str, work: List[Dict], sources: List[str],
+                            started: float, progress: Optional[Callable[[Dict], None]]) -> Dict:
+        # 按付款钱包分组签名，每个钱包的交易签名前重新核对一次
+        work = sorted(work, key=lambda item: (item['from_address'], item['seq']))
+
+        signed_queue: "queue.Queue[Optional[Tuple[Dict, object]]]" = queue.Queue(maxsize=self.broadcast_concurrency * 2)
+
+        def signer():
+            """按序号签名，每笔使用不同有效期，保证txid唯一"""
+            try:
+                source = check_error = None
+                fee_limits = {}
+                for offset, item in enumerate(work):
+                    if item['status'] == ITEM_SIGNED:
+                        signed_queue.put((item, json.loads(item['signed_tx'])))
+                        continue
+                    if item['from_address'] != source:
+                        source = item['from_address']
+                        to_sign = [other for other in work
+                                   if other['from_address'] == source and other['status'] != ITEM_SIGNED]
+                        try:
+                            check_error, fee_limits = self._check_source(token_type, source, to_sign)
+                        except Exception as e:
+                            check_error, fee_limits = f'核对付款钱包失败: {e}', {}
+                        if check_error:
+                            self.logger.error(f"批次 {batch_id} 钱包 {source} 签名前核对未通过: {check_error}")
+                    if check_error:
+                        self.store.update_item(batch_id, item['seq'], ITEM_FAILED, error=check_error)
+                        if progress:
+                            progress({'seq': item['seq'], 'status': ITEM_FAILED, 'error': check_error})
+                        continue
+                    try:
+                        txn = self.wallet.build_signed_transfer(
+                            token_type, item['to_address'], item['amount'], item['from_address'],
+                            expiration_ms=60_000 + offset,
+                            fee_limit=fee_limits.get(item['seq'], DEFAULT_FEE_LIMIT)
+                        )
+                        signed_json = txn.to_json()
+                        self.store.update_item(
+                            batch_id, item['seq'], ITEM_SIGNED, txid=txn.txid,
+                            signed_tx=json.dumps(signed_json), expiration=signed_json['raw_data']['expiration']
+                        )
+                        signed_queue.put((item, signed_json))
+                    except Exception as e:
+                        self.logger.error(f"批次 {batch_id} 第{item['seq']}笔签名失败: {e}")
+                        self.store.update_item(batch_id, item['seq'], ITEM_FAILED, error=str(e))
+            finally:
+                for _ in range(self.broadcast_concurrency):
+                    signed_queue.put(None)
+
+        def broadcaster():
+            while True:
+                entry = signed_queue.get()
+                if entry is None:
+                    return
+                item, signed_json = entry
+                try:
+                    ret = self.wallet.tron.provider.make_request("wallet/broadcasttransaction", signed_json)
+                    # 重发已广播过的交易会返回 DUP_TRANSACTION_ERROR，视为成功
+                    if not ret.get('result') and ret.get('code') != 'DUP_TRANSACTION_ERROR':
+                        if ret.get('code') == 'TAPOS_ERROR':
+                            # 参考区块失效，后续签名重新获取；本笔记为失败，续跑时过期后重新签名
+                            self.wallet.invalidate_ref_block()
+                        raise RuntimeError(f"{ret.get('code')}: {_decode_message(ret.get('message', ''))}")
+                    self.store.update_item(batch_id, item['seq'], ITEM_BROADCAST, error=None)
+                    if progress:
+                        progress({'seq': item['seq'], 'status': ITEM_BROADCAST, 'txid': signed_json['txID']})
+                except Exception as e:
+                    self.logger.error(f"批次 {batch_id} 第{item['seq']}笔广播失败: {e}")
+                    self.store.update_item(batch_id, item['seq'], ITEM_FAILED, error=str(e))
+                    if progress:
+                        progress({'seq': item['seq'], 'status': ITEM_FAILED, 'error': str(e)})
+
+        signer_thread = threading.Thread(target=signer, name=f'payout-signer-{batch_id}')
+        signer_thread.start()
+        with ThreadPoolExecutor(max_workers=self.broadcast_concurrency) as executor:
+            for _ in range(self.broadcast_concurrency):
+                executor.submit(broadcaster)
+        signer_thread.join()
+        for source in sources:
+            self.wallet.invalidate_account_snapshot(source)
+            self.wallet.resource_forecaster.invalidate(source)
+
+        summary = self.store.summarize(batch_id)
+        failed = self.store.get_items(batch_id, (ITEM_FAILED, ITEM_PENDING, ITEM_SIGNED))
+        self.logger.info(f"批次 {batch_id} 执行完成，耗时 {time.time() - started:.1f} 秒: {summary}")
+        return {
+            'success': not failed,
+            'batch_id': batch_id,
+            'token': token_type,
+            'summary': summary,
+            'failed': failed
+        }
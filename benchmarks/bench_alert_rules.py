@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+提醒规则判定吞吐
+按种子生成规则集（每个地址若干专属规则 + 通配的粉尘/陌生发送方/大额规则）和随机入账，
+对比 AlertRuleEngine（按地址索引的编译规则）与逐条解释规则的朴素实现，
+输出每秒判定次数，并检查是否达到 --target（默认 10 万次/秒）
+
+用法: python benchmarks/bench_alert_rules.py [--addresses 1000] [--rules-per-address 3]
+                                             [--transfers 200000] [--seed 1] [--target 100000]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_rules import AlertRuleEngine
+
+
+def fake_address(seed: int, kind: str, index: int) -> str:
+    """34 位、T 开头的确定性地址（只用于匹配，不校验）"""
+    return 'T' + hashlib.sha256(f"{seed}:{kind}:{index}".encode()).hexdigest()[:33]
+
+
+class StaticAddressManager:
+    """只提供白名单的地址管理器"""
+
+    def __init__(self, addresses):
+        self.addresses = {address: {'address': address, 'alias': f"w{i}"} for i, address in enumerate(addresses)}
+
+    def get_whitelist_addresses(self):
+        return list(self.addresses)
+
+    def get_address_by_alias(self, alias):
+        return next((info for info in self.addresses.values() if info['alias'] == alias), None)
+
+
+def build_rules(rng: random.Random, addresses, whitelist, rules_per_address: int) -> dict:
+    rules = [
+        {"name": "粉尘", "max_amount": 1, "action": "mute"},
+        {"name": "陌生发送方", "sender": "unknown", "action": "alert"},
+    ]
+    for address in addresses:
+        for i in range(rules_per_address - 1):
+            rules.append({"name": f"{address[:6]}-{i}", "address": address, "token": rng.choice(["USDT", "USDC"]),
+                          "min_amount": rng.choice([100, 1000, 10000]), "action": "alert",
+                          "users": [str(rng.randint(1, 5))]})
+        rules.append({"name": f"{address[:6]}-rest", "address": address, "action": "mute"})
+    rules.append({"name": "大额", "min_amount": 50000, "sender": "whitelist", "action": "alert"})
+    return {"default": "alert", "rules": rules}
+
+
+def naive_evaluate(rules: dict, whitelist: set, transfer: dict):
+    """不编译、不索引：每笔入账从头解释全部规则"""
+    for index, rule in enumerate(rules['rules']):
+        address = rule.get('address')
+        if address is not None and transfer['to'] not in ([address] if isinstance(address, str) else address):
+            continue
+        if rule.get('token') is not None and transfer['token'] != rule['token'].upper():
+            continue
+        if rule.get('min_amount') is not None and transfer['amount'] < rule['min_amount']:
+            continue
+        if rule.get('max_amount') is not None and transfer['amount'] >= rule['max_amount']:
+            continue
+        sender = rule.get('sender')
+        if sender == 'whitelist' and transfer['from'] not in whitelist:
+            continue
+        if sender == 'unknown' and transfer['from'] in whitelist:
+            continue
+        return rule.get('action', 'alert') == 'alert', rule.get('name') or f"规则{index + 1}"
+    return rules.get('default', 'alert') == 'alert', 'default'
+
+
+def timed(fn, transfers) -> tuple:
+    start = time.perf_counter()
+    results = [fn(transfer) for transfer in transfers]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='提醒规则判定吞吐')
+    parser.add_argument('--addresses', type=int, default=1000, help='有专属规则的监控地址数')
+    parser.add_argument('--rules-per-address', type=int, default=3)
+    parser.add_argument('--whitelist', type=int, default=50, help='白名单地址数')
+    parser.add_argument('--transfers', type=int, default=200000, help='判定的入账笔数')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--target', type=float, default=100000, help='编译规则需达到的每秒判定次数')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    addresses = [fake_address(args.seed, 'monitor', i) for i in range(args.addresses)]
+    # 另有 10% 的入账打到没有专属规则的地址
+    others = [fake_address(args.seed, 'other', i) for i in range(max(1, args.addresses // 10))]
+    whitelist = [fake_address(args.seed, 'white', i) for i in range(args.whitelist)]
+    strangers = [fake_address(args.seed, 'stranger', i) for i in range(args.whitelist)]
+    config = build_rules(rng, addresses, whitelist, args.rules_per_address)
+
+    transfers = [{
+        'to': rng.choice(others) if rng.random() < 0.1 else rng.choice(addresses),
+        'from': rng.choice(whitelist) if rng.random() < 0.7 else rng.choice(strangers),
+        'token': rng.choice(['USDT', 'USDT', 'USDC']),
+        'amount': round(rng.lognormvariate(3, 3), 6),
+    } for _ in range(args.transfers)]
+
+    engine = AlertRuleEngine(StaticAddressManager(whitelist), rules_file='')
+    start = time.perf_counter()
+    engine.load(config)
+    compile_seconds = time.perf_counter() - start
+
+    compiled_seconds, compiled = timed(engine.evaluate, transfers)
+    # 朴素实现按比例抽样，规则多时全量跑太慢
+    sample = transfers[:max(1, min(len(transfers), 20000))]
+    whitelist_set = set(whitelist)
+    naive_seconds, naive = timed(lambda t: naive_evaluate(config, whitelist_set, t), sample)
+    mismatches = sum(1 for (a, r, _), (b, s) in zip(compiled, naive) if (a, r) != (b, s))
+
+    compiled_rate = len(transfers) / compiled_seconds
+    naive_rate = len(sample) / naive_seconds
+    result = {
+        'params': vars(args),
+        'rules': engine.rule_count,
+        'compile_ms': round(compile_seconds * 1000, 2),
+        'compiled': {'evaluations': len(transfers), 'seconds': round(compiled_seconds, 4),
+                     'per_sec': round(compiled_rate), 'muted': sum(1 for a, _, _ in compiled if not a)},
+        'naive': {'evaluations': len(sample), 'seconds': round(naive_seconds, 4), 'per_sec': round(naive_rate)},
+        'speedup': round(compiled_rate / naive_rate, 1),
+        'mismatches': mismatches,
+        'meets_target': compiled_rate >= args.target,
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if mismatches or not result['meets_target']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+相同查询合并：多人同时 /balance、/latest 时的上游请求量
+用本地模拟服务（trongrid_simulator.py）模拟有延迟的上游，每轮清空余额缓存后让 --concurrency 个
+操作员同时发送 /balance 或 /latest：命令作为 Telegram 更新放入 Application.update_queue，
+经 PTB 的更新分发（按 TELEGRAM_CONCURRENT_UPDATES 并发或逐条）到 Application.process_update 和命令处理器，
+与线上相同。对比每轮的节点、TronGrid 请求数和每条命令从收到到处理完的耗时：
+- off：关闭 single-flight（默认逐条处理更新，后到的命令排队等前一条处理完，上游请求靠余额缓存省下）
+- off-concurrent：关闭 single-flight，TELEGRAM_CONCURRENT_UPDATES=16 并发处理更新
+- on：开启 single-flight（默认配置：逐条分发更新，/balance、/latest 处理器不阻塞分发）
+
+每种模式在独立子进程中运行。
+
+用法: python benchmarks/bench_coalescing.py [--modes off,off-concurrent,on] [--concurrency 20] [--rounds 5]
+                                           [--addresses 10] [--latency-ms 50] [--output result.json]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from bench_monitor import make_addresses, start_simulator, sim_request, summarize, git_commit
+
+OPERATOR_ID = 1000
+
+
+def run_worker(args) -> dict:
+    """子进程：同时投递 concurrency 条相同命令，统计上游请求"""
+    workdir = tempfile.mkdtemp(prefix='bench_coalescing_')
+    addresses = make_addresses(args.addresses, args.seed)
+    os.environ.update({
+        'TRONGRID_API_URL': args.base_url,
+        'TRON_NODE_URL': args.base_url,
+        'TELEGRAM_API_BASE_URL': args.base_url,
+        'TELEGRAM_BOT_TOKEN': '123456:bench',
+        'ALLOWED_USERS': str(OPERATOR_ID),
+        'MONITOR_ADDRESSES': ','.join(addresses),
+        'TRANSFER_DB_PATH': os.path.join(workdir, 'transfers.db'),
+        'PAYOUT_DB_PATH': os.path.join(workdir, 'payouts.db'),
+        'TRON_PRIVATE_KEY': '0' * 63 + '1',
+        'BOT_SINGLE_FLIGHT': 'true' if args.worker == 'on' else 'false',
+        'BOT_PAGE_SIZE': str(args.addresses),
+        'LOG_LEVEL': 'WARNING',
+        'LOG_FILE': '',
+    })
+    if args.worker == 'off-concurrent':
+        os.environ['TELEGRAM_CONCURRENT_UPDATES'] = '16'
+    else:
+        os.environ.pop('TELEGRAM_CONCURRENT_UPDATES', None)
+    os.environ.pop('TRON_API_KEY', None)
+    os.environ.pop('TRON_WALLET_ADDRESS', None)
+
+    from telegram import Update
+    from telegram.ext import CommandHandler
+    from telegram_bot import TelegramBot
+    bot = TelegramBot()
+    application = bot.application
+    monitor = bot.tron_monitor
+    result = {'mode': args.worker, 'concurrent_updates': application.concurrent_updates}
+
+    received = {}
+    latencies = []
+
+    def timed(callback):
+        async def wrapper(update, context):
+            try:
+                return await callback(update, context)
+            finally:
+                latencies.append(time.perf_counter() - received.pop(update.update_id))
+        return wrapper
+
+    # 包装命令处理器本身记录耗时：处理器不阻塞分发时，更新队列排空并不代表命令已处理完
+    for handler in application.handlers[0]:
+        if isinstance(handler, CommandHandler) and handler.commands & {'balance', 'latest'}:
+            handler.callback = timed(handler.callback)
+
+    def command_update(update_id: int, command: str) -> Update:
+        return Update.de_json({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': OPERATOR_ID, 'type': 'private'},
+                'from': {'id': OPERATOR_ID, 'is_bot': False, 'first_name': 'bench'},
+                'text': command,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+            },
+        }, application.bot)
+
+    async def measure(view: str) -> dict:
+        node, trongrid = [], []
+        latencies.clear()
+        for round_no in range(args.rounds):
+            # 模拟缓存刚过期、入账提醒后大家同时查询
+            monitor.balance_cache.clear()
+            bot.pages = type(bot.pages)()
+            before = sim_request(args.base_url, '/_sim/stats')
+            for i in range(args.concurrency):
+                update_id = round_no * args.concurrency + i + 1
+                received[update_id] = time.perf_counter()
+                await application.update_queue.put(command_update(update_id, f"/{view}"))
+            await application.update_queue.join()
+            while received:
+                await asyncio.sleep(0.01)
+            after = sim_request(args.base_url, '/_sim/stats')
+            node.append(after['node'] - before['node'])
+            trongrid.append(after['trongrid'] - before['trongrid'])
+        return {
+            **summarize(latencies),
+            'node_requests_per_round': round(sum(node) / len(node), 1),
+            'trongrid_requests_per_round': round(sum(trongrid) / len(trongrid), 1),
+        }
+
+    async def run():
+        await application.initialize()
+        await application.start()
+        try:
+            result['balance'] = await measure('balance')
+            result['latest'] = await measure('latest')
+        finally:
+            await application.stop()
+            await application.shutdown()
+
+    asyncio.run(run())
+    bot.wallet_operations.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='相同查询合并：并发查询的上游请求量')
+    parser.add_argument('--modes', default='off,off-concurrent,on',
+                        help='逗号分隔：off（不合并）、off-concurrent（不合并 + 并发处理更新）、on（single-flight）')
+    parser.add_argument('--concurrency', type=int, default=20, help='同时查询的操作员数')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--addresses', type=int, default=10, help='监控地址数（都在第一页）')
+    parser.add_argument('--latency-ms', type=float, default=50, help='模拟上游请求延迟')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='结果 JSON 输出文件')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    sim_args = argparse.Namespace(seed=args.seed, history=1, latency_ms=args.latency_ms, jitter_ms=0, rate_limit=0,
+                                  telegram_latency_ms=0)
+    params = {key: value for key, value in vars(args).items() if key not in ('worker', 'base_url', 'output')}
+    results = []
+    for mode in [mode.strip() for mode in args.modes.split(',') if mode.strip()]:
+        process, base_url = start_simulator(sim_args)
+        try:
+            command = [sys.executable, os.path.abspath(__file__), '--worker', mode, '--base-url', base_url,
+                       '--concurrency', str(args.concurrency), '--rounds', str(args.rounds),
+                       '--addresses', str(args.addresses), '--seed', str(args.seed)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        finally:
+            process.terminate()
+            process.wait()
+        results.append(result)
+        print(f"{mode:>14}: /balance 每轮节点请求 {result['balance']['node_requests_per_round']}，"
+              f"p95 {result['balance'].get('p95_ms')}ms", file=sys.stderr)
+
+    report = {
+        'benchmark': 'coalescing',
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
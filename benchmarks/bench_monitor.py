@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+监控链路端到端压测
+启动本地 TronGrid / Telegram 模拟服务（trongrid_simulator.py），用真实的 TronMonitorApp 对
+10 / 100 / 1000 / 10000 个监控地址分别测量：
+- 单地址拉取延迟（get_usdt_transfers）
+- 一轮检查耗时（check_new_transfers）：首轮（全部历史为新交易）和注入新交易后的稳态轮
+- 地址吞吐、转账吞吐、通知发送吞吐（_send_transaction_notification 发往模拟 Telegram）
+- 内存：tracemalloc 峰值和进程最大 RSS
+
+主循环每个地址固定等待 1 秒，直接跑 start_monitoring 测到的主要是这段等待，
+所以这里直接调用 check_new_transfers 和通知函数。
+每个规模在独立子进程中运行，互不影响内存统计；地址和转账由 --seed 确定，结果可复现。
+
+用法: python benchmarks/bench_monitor.py [--sizes 10,100,1000,10000] [--latency-ms 0] [--rate-limit 0]
+                                        [--history 10] [--new-fraction 0.1] [--seed 1] [--output result.json]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from tronpy.keys import to_base58check_address
+
+
+def make_addresses(count: int, seed: int) -> list:
+    """按种子生成确定的监控地址"""
+    return [
+        to_base58check_address(b'\x41' + hashlib.sha256(f"{seed}:monitor:{i}".encode()).digest()[:20])
+        for i in range(count)
+    ]
+
+
+def start_simulator(args) -> tuple:
+    """启动模拟服务子进程，返回 (进程, 基础URL)"""
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, 'trongrid_simulator.py'),
+        '--seed', str(args.seed), '--history', str(args.history),
+        '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+        '--rate-limit', str(args.rate_limit), '--telegram-latency-ms', str(args.telegram_latency_ms),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline().strip()
+    if not line.startswith('listening '):
+        process.kill()
+        raise RuntimeError(f"模拟服务启动失败: {line!r}")
+    return process, f"http://127.0.0.1:{line.split()[1]}"
+
+
+def sim_request(base_url: str, path: str, payload: dict = None) -> dict:
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(base_url + path, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def summarize(values: list) -> dict:
+    """延迟样本（秒）的分位数统计，单位毫秒"""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    pick = lambda pct: values[min(len(values) - 1, int(pct / 100 * len(values)))]
+    return {
+        'count': len(values),
+        'mean_ms': round(statistics.mean(values) * 1000, 3),
+        'p50_ms': round(pick(50) * 1000, 3),
+        'p95_ms': round(pick(95) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+
+def run_worker(args) -> dict:
+    """子进程：在一个规模下跑完整测量"""
+    addresses = make_addresses(args.worker, args.seed)
+    workdir = tempfile.mkdtemp(prefix='bench_monitor_')
+    os.environ.update({
+        'TRONGRID_API_URL': args.base_url,
+        'TRON_NODE_URL': args.base_url,
+        'TELEGRAM_API_BASE_URL': args.base_url,
+        'TELEGRAM_BOT_TOKEN': '123456:bench',
+        'ALLOWED_USERS': ','.join(str(1000 + i) for i in range(args.recipients)),
+        'MONITOR_ADDRESSES': ','.join(addresses),
+        'TRANSFER_DB_PATH': os.path.join(workdir, 'transfers.db'),
+        'PAYOUT_DB_PATH': os.path.join(workdir, 'payouts.db'),
+        'STATE_SNAPSHOT_PATH': os.path.join(workdir, 'state.bin'),
+        'TRON_PRIVATE_KEY': hashlib.sha256(f"{args.seed}:signer".encode()).hexdigest(),
+        'CONFIRMATION_TRACKING': 'false',
+        'METRICS_PORT': '0',
+        'LOG_LEVEL': 'WARNING',
+    })
+    os.environ.pop('TRON_API_KEY', None)
+    os.environ.pop('TRON_WALLET_ADDRESS', None)
+
+    tracemalloc.start()
+    from main import TronMonitorApp
+    app = TronMonitorApp()
+    monitor = app.tron_monitor
+    result = {'addresses': len(addresses)}
+
+    # 单地址拉取延迟
+    sample = addresses[:min(len(addresses), args.latency_samples)]
+    fetch_times = []
+    for address in sample:
+        start = time.perf_counter()
+        monitor.get_usdt_transfers(address, limit=20)
+        fetch_times.append(time.perf_counter() - start)
+    result['fetch_latency'] = summarize(fetch_times)
+
+    # 首轮：全部历史都是新交易
+    start = time.perf_counter()
+    cold = monitor.check_new_transfers()
+    elapsed = time.perf_counter() - start
+    result['cold_cycle'] = {
+        'seconds': round(elapsed, 3),
+        'new_transfers': len(cold),
+        'addresses_per_sec': round(len(addresses) / elapsed, 1),
+        'transfers_per_sec': round(len(cold) / elapsed, 1),
+    }
+
+    # 稳态轮：注入少量新交易
+    injected = sim_request(args.base_url, '/_sim/inject', {
+        'addresses': addresses, 'fraction': args.new_fraction, 'per_address': 1})['injected']
+    start = time.perf_counter()
+    fresh = monitor.check_new_transfers()
+    elapsed = time.perf_counter() - start
+    result['steady_cycle'] = {
+        'seconds': round(elapsed, 3),
+        'injected': injected,
+        'new_transfers': len(fresh),
+        'addresses_per_sec': round(len(addresses) / elapsed, 1),
+    }
+
+    # 通知：与监控循环一样逐笔发送
+    async def notify_all():
+        await app.telegram_bot.application.bot.initialize()
+        durations = []
+        for tx in fresh[:args.max_notifications]:
+            tx['trace']['enqueued_at'] = time.time()
+            begin = time.perf_counter()
+            await app._send_transaction_notification(tx)
+            durations.append(time.perf_counter() - begin)
+        await app.telegram_bot.application.bot.shutdown()
+        return durations
+
+    notify_times = asyncio.run(notify_all())
+    result['notifications'] = {
+        **summarize(notify_times),
+        'recipients': args.recipients,
+        'messages_per_sec': round(len(notify_times) * args.recipients / sum(notify_times), 1) if notify_times else 0,
+    }
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result['memory'] = {
+        'tracemalloc_current_mb': round(current / 1024 / 1024, 2),
+        'tracemalloc_peak_mb': round(peak / 1024 / 1024, 2),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+    }
+    result['simulator'] = sim_request(args.base_url, '/_sim/stats')
+    app.telegram_bot.wallet_operations.close()
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='监控链路端到端压测')
+    parser.add_argument('--sizes', default='10,100,1000,10000', help='监控地址数量，逗号分隔')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--history', type=int, default=10, help='每个地址的初始转账笔数')
+    parser.add_argument('--new-fraction', type=float, default=0.1, help='稳态轮有新交易的地址比例')
+    parser.add_argument('--latency-ms', type=float, default=0, help='模拟 TronGrid 请求延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='模拟延迟抖动')
+    parser.add_argument('--rate-limit', type=float, default=0, help='模拟 TronGrid 每秒请求上限，0 为不限')
+    parser.add_argument('--telegram-latency-ms', type=float, default=0, help='模拟 Telegram 请求延迟')
+    parser.add_argument('--recipients', type=int, default=1, help='通知接收者数量')
+    parser.add_argument('--latency-samples', type=int, default=100, help='单地址拉取延迟的采样地址数')
+    parser.add_argument('--max-notifications', type=int, default=1000, help='每个规模最多发送的通知数')
+    parser.add_argument('--output', help='结果 JSON 输出文件')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(run_worker(args)))
+        return
+
+    params = {key: value for key, value in vars(args).items() if key not in ('worker', 'base_url', 'output')}
+    results = []
+    for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        process, base_url = start_simulator(args)
+        try:
+            command = [sys.executable, os.path.abspath(__file__), '--worker', str(size), '--base-url', base_url]
+            for key, value in params.items():
+                command += ['--' + key.replace('_', '-'), str(value)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        finally:
+            process.terminate()
+            process.wait()
+        results.append(result)
+        print(f"{size:>6} 地址: 首轮 {result['cold_cycle']['seconds']}s, "
+              f"稳态轮 {result['steady_cycle']['seconds']}s, "
+              f"拉取 p50 {result['fetch_latency'].get('p50_ms')}ms, "
+              f"通知 {result['notifications']['messages_per_sec']}/s, "
+              f"峰值内存 {result['memory']['tracemalloc_peak_mb']}MB", file=sys.stderr)
+
+    report = {
+        'benchmark': 'monitor',
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+重启预热：状态快照的写入/读取耗时与重启后的第一轮轮询
+- 合成数据：--seen 笔已处理交易 + --addresses 个地址的状态，测快照编码、写入、mmap 读回的耗时和文件大小
+- 端到端：对本地模拟服务（trongrid_simulator.py）先冷启动跑一轮并保存快照，再在新的子进程中
+  带快照重启，比较两次启动的就绪耗时和第一轮轮询发现的“新交易”数（带快照时应为 0，与稳态轮一致）；
+  启动后先经机器人渲染 /balance 第一页，带快照时应直接显示恢复的余额、不请求上游
+
+用法: python benchmarks/bench_snapshot.py [--seen 100000] [--addresses 1000] [--history 10]
+                                         [--seed 1] [--output result.json]
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import hashlib
+import threading
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from bench_monitor import make_addresses, start_simulator, sim_request, git_commit
+
+
+def synthetic(args, workdir: str) -> dict:
+    """合成状态的快照写入和读回"""
+    from state_snapshot import StateSnapshot
+
+    addresses = make_addresses(args.addresses, args.seed)
+    now = time.time()
+    monitor = types.SimpleNamespace(
+        processed_transactions={hashlib.sha256(f"{args.seed}:tx:{i}".encode()).hexdigest() + (':out' if i % 10 == 0 else '')
+                                for i in range(args.seen)},
+        balance_cache={address: (float(i), now) for i, address in enumerate(addresses)},
+        last_synced={address: now for address in addresses},
+        state_lock=threading.Lock(),
+    )
+    snapshot = StateSnapshot(os.path.join(workdir, 'synthetic.bin'))
+    start = time.perf_counter()
+    size = snapshot.save(monitor)
+    save_seconds = time.perf_counter() - start
+
+    restored = types.SimpleNamespace(processed_transactions=set(), balance_cache={}, last_synced={},
+                                     state_lock=threading.Lock())
+    start = time.perf_counter()
+    snapshot.restore(restored)
+    restore_seconds = time.perf_counter() - start
+
+    json_size = len(json.dumps({'seen': list(monitor.processed_transactions),
+                                'balances': monitor.balance_cache, 'synced': monitor.last_synced}))
+    return {
+        'seen': args.seen,
+        'addresses': args.addresses,
+        'bytes': size,
+        'json_bytes_for_reference': json_size,
+        'save_ms': round(save_seconds * 1000, 2),
+        'restore_ms': round(restore_seconds * 1000, 2),
+        'round_trip_ok': (restored.processed_transactions == monitor.processed_transactions
+                          and restored.balance_cache == monitor.balance_cache
+                          and restored.last_synced == monitor.last_synced),
+    }
+
+
+def run_worker(args) -> dict:
+    """子进程：启动应用（有快照则恢复）、跑第一轮轮询、保存快照"""
+    addresses = make_addresses(args.addresses, args.seed)
+    os.environ.update({
+        'TRONGRID_API_URL': args.base_url,
+        'TRON_NODE_URL': args.base_url,
+        'TELEGRAM_API_BASE_URL': args.base_url,
+        'TELEGRAM_BOT_TOKEN': '123456:bench',
+        'ALLOWED_USERS': '1000',
+        'MONITOR_ADDRESSES': ','.join(addresses),
+        'TRANSFER_DB_PATH': os.path.join(args.workdir, f"transfers-{args.worker}.db"),
+        'PAYOUT_DB_PATH': os.path.join(args.workdir, 'payouts.db'),
+        'STATE_SNAPSHOT_PATH': os.path.join(args.workdir, 'state.bin'),
+        'TRON_PRIVATE_KEY': hashlib.sha256(f"{args.seed}:signer".encode()).hexdigest(),
+        'CONFIRMATION_TRACKING': 'false',
+        'METRICS_PORT': '0',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_FILE': '',
+    })
+    os.environ.pop('TRON_API_KEY', None)
+    os.environ.pop('TRON_WALLET_ADDRESS', None)
+
+    from main import TronMonitorApp
+    from paginator import page_size
+    start = time.perf_counter()
+    app = TronMonitorApp()
+    ready_seconds = time.perf_counter() - start
+    monitor = app.tron_monitor
+    result = {
+        'run': args.worker,
+        'ready_ms': round(ready_seconds * 1000, 1),
+        'restored_seen': len(monitor.processed_transactions),
+    }
+
+    bot = app.telegram_bot
+    before = sim_request(args.base_url, '/_sim/stats')
+    text = bot._balance_page(0)[0]
+    after = sim_request(args.base_url, '/_sim/stats')
+    # 冷启动时这次 /balance 查询上游并写入余额缓存；带快照重启后应直接显示恢复的余额，不查上游
+    restored = [monitor.balance_cache[address][0] for address in monitor.get_monitor_addresses()[:page_size()]
+                if address in monitor.balance_cache]
+    result['balance_view'] = {
+        'upstream_requests': (after['node'] - before['node']) + (after['trongrid'] - before['trongrid']),
+        'shows_cached_balances': bool(restored) and all(f"{balance:,.2f}" in text for balance in restored),
+    }
+
+    requests_before = sim_request(args.base_url, '/_sim/stats')['trongrid']
+    start = time.perf_counter()
+    first = monitor.check_new_transfers()
+    result['first_poll'] = {
+        'seconds': round(time.perf_counter() - start, 3),
+        'new_transfers': len(first),
+        'trongrid_requests': sim_request(args.base_url, '/_sim/stats')['trongrid'] - requests_before,
+    }
+
+    start = time.perf_counter()
+    result['snapshot_bytes'] = app.state_snapshot.save(monitor)
+    result['snapshot_save_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    app.telegram_bot.wallet_operations.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重启预热：状态快照')
+    parser.add_argument('--seen', type=int, default=100000, help='合成数据的已处理交易数')
+    parser.add_argument('--addresses', type=int, default=1000, help='监控地址数')
+    parser.add_argument('--history', type=int, default=10, help='模拟服务每个地址的初始转账笔数')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='结果 JSON 输出文件')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='bench_snapshot_')
+    report = {
+        'benchmark': 'snapshot',
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('worker', 'base_url', 'workdir', 'output')},
+        'synthetic': synthetic(args, workdir),
+        'restart': [],
+    }
+
+    sim_args = argparse.Namespace(seed=args.seed, history=args.history, latency_ms=0, jitter_ms=0, rate_limit=0,
+                                  telegram_latency_ms=0)
+    process, base_url = start_simulator(sim_args)
+    try:
+        # 第一次没有快照（冷启动），第二次恢复第一次退出时写下的快照
+        for run in ('cold', 'warm'):
+            command = [sys.executable, os.path.abspath(__file__), '--worker', run, '--base-url', base_url,
+                       '--workdir', workdir, '--addresses', str(args.addresses), '--seed', str(args.seed)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            report['restart'].append(result)
+            print(f"{run:>5}: 就绪 {result['ready_ms']}ms，第一轮 {result['first_poll']['seconds']}s，"
+                  f"新交易 {result['first_poll']['new_transfers']} 笔，"
+                  f"/balance 上游请求 {result['balance_view']['upstream_requests']} 次", file=sys.stderr)
+    finally:
+        process.terminate()
+        process.wait()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
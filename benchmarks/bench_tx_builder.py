@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+交易构建签名吞吐对比
+tronpy 原生构建（每笔取参考区块 + getsignweight）对比 TransferTxBuilder 模板构建，
+节点用本地模拟代替，--rtt-ms 模拟每次节点请求的往返延迟
+
+用法: python benchmarks/bench_tx_builder.py [--count 200] [--rtt-ms 50]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tronpy import Tron
+from tronpy.keys import PrivateKey
+from tronpy.providers import HTTPProvider
+
+from tx_builder import TransferTxBuilder
+
+USDT_CONTRACT = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+USDT_ABI = [{
+    "name": "transfer",
+    "type": "Function",
+    "stateMutability": "Nonpayable",
+    "inputs": [{"name": "_to", "type": "address"}, {"name": "_value", "type": "uint256"}],
+    "outputs": [{"name": "", "type": "bool"}],
+}]
+
+
+class SimulatedNodeProvider(HTTPProvider):
+    """模拟节点：按固定延迟应答构建交易需要的接口，并统计请求次数"""
+
+    def __init__(self, rtt_ms: float):
+        super().__init__("http://127.0.0.1:0/")
+        self.rtt = rtt_ms / 1000
+        self.requests = 0
+
+    def make_request(self, method, params=None):
+        self.requests += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+        if method == "wallet/getnodeinfo":
+            return {"block": "Num:60000020,ID:" + "00" * 32, "solidityBlock": "Num:60000001,ID:" + "0000000003938701" + "ab" * 24}
+        if method == "wallet/getcontract":
+            return {"contract_address": USDT_CONTRACT, "name": "TetherToken", "abi": {"entrys": USDT_ABI}}
+        if method == "wallet/getsignweight":
+            txid = hashlib.sha256(json.dumps(params["raw_data"], sort_keys=True).encode()).hexdigest()
+            return {"transaction": {"transaction": {"txID": txid}}, "permission": None}
+        raise ValueError(f"未模拟的接口: {method}")
+
+
+def run_path(name, build_and_sign, count, provider):
+    """执行 count 次构建+签名，返回统计结果"""
+    provider.requests = 0
+    started = time.perf_counter()
+    for i in range(count):
+        build_and_sign(i)
+    elapsed = time.perf_counter() - started
+    return {
+        "path": name,
+        "count": count,
+        "seconds": round(elapsed, 4),
+        "tx_per_second": round(count / elapsed, 1),
+        "ms_per_tx": round(elapsed / count * 1000, 3),
+        "node_requests": provider.requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="交易构建签名吞吐对比")
+    parser.add_argument("--count", type=int, default=200, help="每种方式构建的交易笔数")
+    parser.add_argument("--rtt-ms", type=float, default=50.0, help="模拟节点请求往返延迟（毫秒）")
+    parser.add_argument("--seed", type=int, default=20240101, help="随机种子（私钥、收款地址）")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    private_key = PrivateKey(bytes(rng.getrandbits(8) for _ in range(32)))
+    owner = private_key.public_key.to_base58check_address()
+    recipients = [
+        PrivateKey(bytes(rng.getrandbits(8) for _ in range(32))).public_key.to_base58check_address()
+        for _ in range(16)
+    ]
+
+    provider = SimulatedNodeProvider(args.rtt_ms)
+    tron = Tron(provider=provider)
+    contract = tron.get_contract(USDT_CONTRACT)
+    # 模拟节点不按protobuf计算txid，跳过一致性核对
+    builder = TransferTxBuilder(tron, USDT_CONTRACT, verify=False)
+
+    def tronpy_path(i):
+        contract.functions.transfer(recipients[i % len(recipients)], 1_000_000 + i) \
+            .with_owner(owner).fee_limit(20_000_000).build().sign(private_key)
+
+    def template_path(i):
+        builder.build_usdt_transfer(owner, recipients[i % len(recipients)], 1_000_000 + i).sign(private_key)
+
+    results = [
+        run_path("tronpy", tronpy_path, args.count, provider),
+        run_path("template", template_path, args.count, provider),
+    ]
+    print(json.dumps({
+        "benchmark": "tx_builder",
+        "rtt_ms": args.rtt_ms,
+        "seed": args.seed,
+        "results": results,
+        "speedup": round(results[1]["tx_per_second"] / results[0]["tx_per_second"], 1),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+命令往返延迟：长轮询 vs Webhook
+用本地模拟 Bot API（trongrid_simulator.py）模拟用户发送 /help，测量从用户发出命令到机器人回复
+到达 Bot API 的耗时。polling 模式走 getUpdates 长轮询，webhook 模式由模拟服务直接推送到
+webhook_server.WebhookServer；另外验证密钥错误的推送会被拒绝。
+
+每种模式在独立子进程中运行：先逐条发送测延迟，再并发发送测吞吐。
+
+用法: python benchmarks/bench_webhook.py [--modes polling,webhook] [--count 200] [--concurrency 16]
+                                        [--telegram-latency-ms 0] [--output result.json]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from bench_monitor import make_addresses, start_simulator, sim_request, summarize, git_commit
+
+USER_ID = 1000
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def send_commands(base_url: str, count: int, concurrency: int) -> tuple:
+    """发送 count 条命令（最多 concurrency 条同时进行），返回 (各条往返耗时秒, 失败数, 总耗时秒)"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await asyncio.to_thread(sim_request, base_url, '/_sim/telegram/command',
+                                           {'text': '/help', 'user_id': USER_ID, 'timeout': 30})
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(count)))
+    elapsed = time.perf_counter() - start
+    latencies = [r['latency_ms'] / 1000 for r in results if r['ok']]
+    return latencies, sum(1 for r in results if not r['ok']), elapsed
+
+
+def check_bad_secret(port: int) -> int:
+    """用错误的密钥推送一条更新，返回HTTP状态码（应为403）"""
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/telegram", data=b'{"update_id": 1}',
+        headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': 'wrong'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def run_worker(args) -> dict:
+    """子进程：启动一种模式的机器人并测量"""
+    workdir = tempfile.mkdtemp(prefix='bench_webhook_')
+    port = free_port()
+    os.environ.update({
+        'TRONGRID_API_URL': args.base_url,
+        'TRON_NODE_URL': args.base_url,
+        'TELEGRAM_API_BASE_URL': args.base_url,
+        'TELEGRAM_BOT_TOKEN': '123456:bench',
+        'ALLOWED_USERS': str(USER_ID),
+        'MONITOR_ADDRESSES': ','.join(make_addresses(3, args.seed)),
+        'TRANSFER_DB_PATH': os.path.join(workdir, 'transfers.db'),
+        'PAYOUT_DB_PATH': os.path.join(workdir, 'payouts.db'),
+        'TRON_PRIVATE_KEY': '0' * 63 + '1',
+        'TELEGRAM_CONCURRENT_UPDATES': str(args.concurrency),
+        'WEBHOOK_PORT': str(port),
+        'WEBHOOK_URL': f"http://127.0.0.1:{port}/telegram",
+        'WEBHOOK_SECRET_TOKEN': 'bench-secret',
+        'LOG_LEVEL': 'WARNING',
+        'LOG_FILE': '',
+    })
+    os.environ.pop('TRON_API_KEY', None)
+    os.environ.pop('TRON_WALLET_ADDRESS', None)
+
+    from telegram_bot import TelegramBot
+    bot = TelegramBot()
+    application = bot.application
+    result = {'mode': args.worker}
+
+    async def measure():
+        running = True
+        task = None
+        if args.worker == 'webhook':
+            task = asyncio.create_task(bot.run_webhook(lambda: running))
+            while not application.running:
+                await asyncio.sleep(0.05)
+            result['bad_secret_status'] = await asyncio.to_thread(check_bad_secret, port)
+        else:
+            await application.initialize()
+            await application.updater.start_polling(poll_interval=0.0, timeout=10)
+            await application.start()
+
+        # 预热一条，排除首个请求建连的开销
+        await send_commands(args.base_url, 1, 1)
+        latencies, failed, _ = await send_commands(args.base_url, args.count, 1)
+        result['sequential'] = {**summarize(latencies), 'failed': failed}
+        latencies, failed, elapsed = await send_commands(args.base_url, args.count, args.concurrency)
+        result['concurrent'] = {
+            **summarize(latencies),
+            'failed': failed,
+            'concurrency': args.concurrency,
+            'commands_per_sec': round(len(latencies) / elapsed, 1),
+        }
+
+        if task:
+            running = False
+            await task
+        else:
+            await application.updater.stop()
+            await application.stop()
+            await application.shutdown()
+
+    asyncio.run(measure())
+    result['simulator'] = sim_request(args.base_url, '/_sim/stats')
+    bot.wallet_operations.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='命令往返延迟：长轮询 vs Webhook')
+    parser.add_argument('--modes', default='polling,webhook', help='逗号分隔：polling、webhook')
+    parser.add_argument('--count', type=int, default=200, help='每种模式发送的命令数')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发阶段同时进行的命令数')
+    parser.add_argument('--telegram-latency-ms', type=float, default=0, help='模拟 Bot API 请求延迟')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='结果 JSON 输出文件')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        return
+
+    # start_simulator 需要的其余参数
+    sim_args = argparse.Namespace(seed=args.seed, history=1, latency_ms=0, jitter_ms=0, rate_limit=0,
+                                  telegram_latency_ms=args.telegram_latency_ms)
+    params = {key: value for key, value in vars(args).items() if key not in ('worker', 'base_url', 'output')}
+    results = []
+    for mode in [mode.strip() for mode in args.modes.split(',') if mode.strip()]:
+        process, base_url = start_simulator(sim_args)
+        try:
+            command = [sys.executable, os.path.abspath(__file__), '--worker', mode, '--base-url', base_url,
+                       '--count', str(args.count), '--concurrency', str(args.concurrency), '--seed', str(args.seed)]
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        finally:
+            process.terminate()
+            process.wait()
+        results.append(result)
+        print(f"{mode:>8}: 逐条 p50 {result['sequential'].get('p50_ms')}ms / p95 {result['sequential'].get('p95_ms')}ms, "
+              f"并发 {result['concurrent']['commands_per_sec']} 条/秒", file=sys.stderr)
+
+    report = {
+        'benchmark': 'webhook',
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
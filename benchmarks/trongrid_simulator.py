@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+本地 TronGrid / Telegram 模拟服务（压测用）
+- TronGrid REST：/v1/accounts/{addr}/transactions/trc20、/v1/accounts/{addr}/tokens/trc20、/v1/accounts/{addr}
+- 节点接口：/wallet/getcontract、/wallet/triggerconstantcontract 等监控和钱包初始化用到的接口
+- Telegram Bot API：/bot<token>/<method>（getMe、sendMessage、editMessageText、getUpdates、setWebhook 等）
+- 控制接口：POST /_sim/inject 注入新转账，GET /_sim/stats 查看请求统计，
+  POST /_sim/telegram/command 模拟用户发送一条命令（设置了 webhook 时推送，否则进入 getUpdates），
+  等到机器人回复后返回往返耗时
+
+每个地址的转账历史由随机种子和地址确定，相同参数下输出可复现；
+支持固定延迟 + 抖动、全局限流（超出返回 429）。
+
+用法: python benchmarks/trongrid_simulator.py [--port 0] [--latency-ms 0] [--rate-limit 0] [--history 10]
+启动后第一行输出 "listening <port>"
+"""
+
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+USDT_CONTRACT = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+USDT_ABI = [
+    {
+        "name": "transfer", "type": "Function", "stateMutability": "Nonpayable",
+        "inputs": [{"name": "_to", "type": "address"}, {"name": "_value", "type": "uint256"}],
+        "outputs": [{"name": "", "type": "bool"}],
+    },
+    {
+        "name": "balanceOf", "type": "Function", "stateMutability": "View",
+        "inputs": [{"name": "who", "type": "address"}],
+        "outputs": [{"name": "", "type": "uint256"}],
+    },
+]
+TOKEN_INFO = {"symbol": "USDT", "address": USDT_CONTRACT, "decimals": 6, "name": "Tether USD"}
+SENDER = 'TJRabPrwbZy45sbavfcjinPJC18kjpRTv8'
+
+
+class SimulatorState:
+    """模拟链上状态：按地址懒生成的转账历史、限流令牌桶和请求统计"""
+
+    def __init__(self, seed: int, history: int, latency_ms: float, jitter_ms: float,
+                 rate_limit: float, telegram_latency_ms: float):
+        self.seed = seed
+        self.history = history
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_limit = rate_limit
+        self.telegram_latency = telegram_latency_ms / 1000
+        self.start_ms = 1_700_000_000_000
+        self._transfers = {}
+        self._injected = 0
+        self._tokens = rate_limit
+        self._last_refill = time.monotonic()
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self.stats = {'trongrid': 0, 'node': 0, 'telegram': 0, 'rate_limited': 0, 'records_served': 0}
+        # Telegram 更新：getUpdates 待取队列、webhook 配置、等待回复的会话
+        self._updates = []
+        self._update_id = 0
+        self._updates_ready = threading.Condition()
+        self.webhook = None
+        self._reply_waiters = {}
+
+    def _make_transfer(self, address: str, index: int) -> dict:
+        digest = hashlib.sha256(f"{self.seed}:{address}:{index}".encode()).digest()
+        return {
+            "transaction_id": digest.hex(),
+            "token_info": TOKEN_INFO,
+            "block_timestamp": self.start_ms + index * 3_000,
+            "from": SENDER,
+            "to": address,
+            "type": "Transfer",
+            "value": str(int.from_bytes(digest[:4], 'big') % 10_000_000_000 + 1_000_000),
+        }
+
+    def transfers(self, address: str) -> list:
+        """地址的转账列表（新的在前），首次访问时按种子生成历史"""
+        with self._lock:
+            records = self._transfers.get(address)
+            if records is None:
+                records = [self._make_transfer(address, i) for i in range(self.history)]
+                records.reverse()
+                self._transfers[address] = records
+            return records
+
+    def inject(self, addresses: list, fraction: float, per_address: int) -> int:
+        """为 fraction 比例的地址（按种子确定）各追加 per_address 笔新转账"""
+        rng = random.Random(f"{self.seed}:inject:{self._injected}")
+        chosen = [address for address in addresses if rng.random() < fraction]
+        count = 0
+        for address in chosen:
+            records = self.transfers(address)
+            with self._lock:
+                for _ in range(per_address):
+                    index = self.history + self._injected + count
+                    transfer = self._make_transfer(address, index)
+                    transfer['block_timestamp'] = int(time.time() * 1000)
+                    records.insert(0, transfer)
+                    count += 1
+        with self._lock:
+            self._injected += count
+        return count
+
+    def allow(self) -> bool:
+        """全局令牌桶限流，rate_limit 为 0 时不限流"""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._last_refill) * self.rate_limit)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.stats['rate_limited'] += 1
+            return False
+
+    def delay(self, base: float):
+        if base or self.jitter:
+            time.sleep(max(0.0, base + random.uniform(-self.jitter, self.jitter)))
+
+    def next_message_id(self) -> int:
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+    def push_command(self, text: str, user_id: int, timeout: float = 30) -> dict:
+        """模拟用户 user_id 发送命令，等待机器人向该会话回复，返回往返耗时"""
+        with self._updates_ready:
+            self._update_id += 1
+            update_id = self._update_id
+        # 每条命令用独立会话，回复和命令一一对应
+        chat_id = 10_000_000 + update_id
+        command = text.split()[0]
+        update = {"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        }}
+        replied = threading.Event()
+        with self._lock:
+            self._reply_waiters[chat_id] = replied
+        start = time.perf_counter()
+        webhook = self.webhook
+        if webhook:
+            headers = {'Content-Type': 'application/json'}
+            if webhook.get('secret_token'):
+                headers['X-Telegram-Bot-Api-Secret-Token'] = webhook['secret_token']
+            request = urllib.request.Request(webhook['url'], data=json.dumps(update).encode(), headers=headers)
+            with urllib.request.urlopen(request, timeout=timeout):
+                pass
+        else:
+            with self._updates_ready:
+                self._updates.append(update)
+                self._updates_ready.notify_all()
+        ok = replied.wait(timeout)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._reply_waiters.pop(chat_id, None)
+        return {"ok": ok, "latency_ms": round(elapsed * 1000, 3), "mode": "webhook" if webhook else "polling"}
+
+    def get_updates(self, offset: int, timeout: float) -> list:
+        """getUpdates 长轮询：丢弃已确认的更新，没有新更新时最多等待 timeout 秒"""
+        with self._updates_ready:
+            self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            if not self._updates and timeout > 0:
+                self._updates_ready.wait(timeout)
+                self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            return list(self._updates)
+
+    def notify_reply(self, chat_id: int):
+        with self._lock:
+            waiter = self._reply_waiters.get(chat_id)
+        if waiter:
+            waiter.set()
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: SimulatorState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_params(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if not body:
+            return {}
+        content_type = self.headers.get('Content-Type', '')
+        if 'application/x-www-form-urlencoded' in content_type:
+            return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        try:
+            return json.loads(body)
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        params = self._read_params() if self.command == 'POST' else {}
+        parts = [part for part in url.path.split('/') if part]
+        state = self.state
+
+        if parts[:1] == ['_sim']:
+            return self._control(parts[1:], params)
+        if parts and parts[0].startswith('bot'):
+            return self._telegram(parts[1] if len(parts) > 1 else '', params)
+        if parts[:1] == ['wallet'] or parts[:1] == ['walletsolidity']:
+            state.count('node')
+            state.delay(state.latency)
+            return self._node(parts[-1], params)
+        if parts[:2] == ['v1', 'accounts'] and len(parts) >= 3:
+            state.count('trongrid')
+            if not state.allow():
+                return self._send_json({"Error": "request rate exceeded the allowed_rps"}, 429)
+            state.delay(state.latency)
+            return self._trongrid(parts[2], parts[3:], query)
+        self._send_json({"Error": f"unknown path {url.path}"}, 404)
+
+    def _trongrid(self, address: str, rest: list, query: dict):
+        state = self.state
+        if rest == ['transactions', 'trc20']:
+            records = state.transfers(address)
+            min_timestamp = int(query.get('min_timestamp', 0))
+            offset = int(query.get('fingerprint') or 0)
+            limit = min(int(query.get('limit', 20)), 200)
+            matched = [r for r in records if r['block_timestamp'] >= min_timestamp]
+            page = matched[offset:offset + limit]
+            meta = {"at": int(time.time() * 1000), "page_size": len(page)}
+            if offset + limit < len(matched):
+                meta["fingerprint"] = str(offset + limit)
+            state.count('records_served', len(page))
+            return self._send_json({"data": page, "success": True, "meta": meta})
+        if rest == ['transactions']:
+            # 原生TRX转账：模拟数据只有USDT
+            return self._send_json({"data": [], "success": True, "meta": {"page_size": 0}})
+        if rest == ['tokens', 'trc20']:
+            return self._send_json({"data": [{"balance": "123456789"}], "success": True, "meta": {}})
+        if not rest:
+            return self._send_json({"data": [{"balance": 100_000_000}], "success": True, "meta": {}})
+        return self._send_json({"Error": "unknown endpoint"}, 404)
+
+    def _node(self, method: str, params: dict):
+        if method == 'getcontract':
+            return self._send_json({"contract_address": USDT_CONTRACT, "name": "TetherToken",
+                                    "abi": {"entrys": USDT_ABI}})
+        if method == 'triggerconstantcontract':
+            return self._send_json({"result": {"result": True}, "energy_used": 14650,
+                                    "constant_result": [format(123456789, '064x')]})
+        if method == 'getaccount':
+            return self._send_json({"address": params.get('address'), "balance": 100_000_000})
+        if method == 'getaccountresource':
+            return self._send_json({"EnergyLimit": 500_000, "EnergyUsed": 0, "freeNetLimit": 600})
+        if method == 'getchainparameters':
+            return self._send_json({"chainParameter": [{"key": "getEnergyFee", "value": 420},
+                                                       {"key": "getTransactionFee", "value": 1000}]})
+        if method == 'getnodeinfo':
+            return self._send_json({"block": "Num:60000020,ID:" + "00" * 32,
+                                    "solidityBlock": "Num:60000001,ID:" + "0000000003938701" + "ab" * 24})
+        return self._send_json({"Error": f"unsupported node method {method}"}, 400)
+
+    def _telegram(self, method: str, params: dict):
+        state = self.state
+        state.count('telegram')
+        state.delay(state.telegram_latency)
+        if method == 'getMe':
+            return self._send_json({"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}})
+        if method == 'getUpdates':
+            updates = state.get_updates(int(params.get('offset') or 0), float(params.get('timeout') or 0))
+            return self._send_json({"ok": True, "result": updates})
+        if method == 'setWebhook':
+            state.webhook = {'url': params.get('url'), 'secret_token': params.get('secret_token')}
+            return self._send_json({"ok": True, "result": True})
+        if method == 'deleteWebhook':
+            state.webhook = None
+            return self._send_json({"ok": True, "result": True})
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id') or 1)
+            message_id = int(params.get('message_id') or state.next_message_id())
+            state.notify_reply(chat_id)
+            return self._send_json({"ok": True, "result": {
+                "message_id": message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params.get('text', '')}})
+        return self._send_json({"ok": True, "result": True})
+
+    def _control(self, parts: list, params: dict):
+        state = self.state
+        if parts == ['inject']:
+            injected = state.inject(params.get('addresses', []), float(params.get('fraction', 0.1)),
+                                    int(params.get('per_address', 1)))
+            return self._send_json({"injected": injected})
+        if parts == ['telegram', 'command']:
+            return self._send_json(state.push_command(params.get('text', '/help'), int(params.get('user_id', 1)),
+                                                      float(params.get('timeout', 30))))
+        if parts == ['stats']:
+            with state._lock:
+                return self._send_json(dict(state.stats))
+        return self._send_json({"Error": "unknown control endpoint"}, 404)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 TronGrid / Telegram 模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help='0 表示随机端口')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--history', type=int, default=10, help='每个地址的初始转账笔数')
+    parser.add_argument('--latency-ms', type=float, default=0, help='TronGrid/节点请求的固定延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='延迟的随机抖动范围')
+    parser.add_argument('--rate-limit', type=float, default=0, help='TronGrid 每秒请求上限，0 为不限')
+    parser.add_argument('--telegram-latency-ms', type=float, default=0, help='Telegram 请求的固定延迟')
+    args = parser.parse_args()
+
+    SimulatorHandler.state = SimulatorState(args.seed, args.history, args.latency_ms, args.jitter_ms,
+                                            args.rate_limit, args.telegram_latency_ms)
+    server = ThreadingHTTPServer((args.host, args.port), SimulatorHandler)
+    server.daemon_threads = True
+    print(f"listening {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
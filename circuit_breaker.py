@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+上游熔断器
+按上游端点（TronGrid REST 路径 / 节点接口）各维护一个熔断器：连续失败达到阈值后熔断，
+熔断期间请求立即失败，不再逐个地址重试退避；冷却时间过后放行一个探测请求（半开），
+成功则恢复，失败则继续熔断。
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import requests
+from dotenv import load_dotenv
+
+from metrics import CIRCUIT_TRANSITIONS
+
+# 加载环境变量
+load_dotenv()
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """端点已熔断，请求未发出"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"上游端点已熔断: {endpoint}（{retry_after:.0f} 秒后探测）")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """是否计为上游故障：连接错误、超时、5xx 和 429 计入，其他 4xx 是请求本身的问题"""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return True
+
+
+class CircuitBreaker:
+    """单个端点的熔断器（closed -> open -> half_open -> closed/open）"""
+
+    def __init__(self, endpoint: str, failure_threshold: Optional[int] = None,
+                 reset_timeout: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold or int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(
+            os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        """调用方持有锁"""
+        if state == self.state:
+            return
+        self.state = state
+        CIRCUIT_TRANSITIONS.inc(endpoint=self.endpoint, state=state)
+        if state == OPEN:
+            self.logger.warning(f"上游端点熔断: {self.endpoint}（连续失败 {self.failures} 次，"
+                                f"{self.reset_timeout:.0f} 秒后探测）")
+        elif state == CLOSED:
+            self.logger.info(f"上游端点恢复: {self.endpoint}")
+
+    @property
+    def is_open(self) -> bool:
+        """熔断中或正在探测（尚未确认恢复）"""
+        return self.state != CLOSED
+
+    def retry_after(self) -> float:
+        """距下次探测还有多少秒"""
+        if self.state != OPEN or self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.time())
+
+    def allow(self) -> bool:
+        """是否放行本次请求；半开状态同一时间只放行一个探测请求"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    return False
+                self._transition(HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self.last_success_at = time.time()
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+                self._transition(OPEN)
+
+    @contextmanager
+    def guard(self):
+        """包住一次请求：熔断时抛出 CircuitOpenError，按结果记录成功或失败"""
+        if not self.allow():
+            raise CircuitOpenError(self.endpoint, self.retry_after())
+        try:
+            yield
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            # 被取消等情况不算结果，释放探测名额
+            with self._lock:
+                self._probing = False
+            raise
+        else:
+            self.record_success()
+
+
+class CircuitBreakerRegistry:
+    """端点 -> 熔断器"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+        return breaker
+
+    def is_open(self, endpoint: str) -> bool:
+        breaker = self._breakers.get(endpoint)
+        return breaker is not None and breaker.is_open
+
+    def open_endpoints(self) -> List[str]:
+        """当前熔断中（含半开）的端点"""
+        return sorted(endpoint for endpoint, breaker in list(self._breakers.items()) if breaker.is_open)
+
+
+# 进程内共享：TronGrid REST 请求和 tronpy 节点请求都登记在这里
+BREAKERS = CircuitBreakerRegistry()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+交易确认跟踪
+暂存已通知但未固化的交易（转入和转出），按最新固化区块批量判断是否已不可逆
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# 导入自定义模块
+from tron_monitor import TronUSDTMonitor, transfer_key
+
+# 加载环境变量
+load_dotenv()
+
+class ConfirmationTracker:
+    """交易确认跟踪器
+
+    每轮检查只查询一次最新固化区块；区块时间已早于固化区块的待确认交易，
+    再按被监控地址用 only_confirmed 查询批量核对（与监控同一个请求，两个方向、全部监控代币），
+    从最早的待确认交易时间起按 fingerprint 翻页，全部找到或翻到底为止，而不是逐笔查询交易信息。
+    待确认交易按 transfer_key 登记，同一笔转账的转入和转出各自跟踪。
+    """
+
+    def __init__(self, monitor: TronUSDTMonitor):
+        self.logger = logging.getLogger(__name__)
+        self.monitor = monitor
+        # 固化区块已经越过交易时间这么久仍查不到，视为交易未被确认（分叉丢弃等）
+        self.drop_grace = int(os.getenv('CONFIRMATION_DROP_GRACE', '60'))
+        self._pending: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, transfer: Dict, messages: Optional[List[Tuple[int, int]]] = None, text: str = ""):
+        """登记一笔待确认交易及其通知消息 (chat_id, message_id)"""
+        with self._lock:
+            self._pending[transfer_key(transfer)] = {
+                'transfer': transfer,
+                'messages': list(messages or []),
+                'text': text,
+                'added_at': time.time()
+            }
+
+    def pending_count(self) -> int:
+        """待确认交易数"""
+        with self._lock:
+            return len(self._pending)
+
+    def _get_solid_block(self) -> Tuple[int, int]:
+        """获取最新固化区块的 (区块号, 毫秒时间戳)"""
+        block = self.monitor.tron.get_latest_solid_block()
+        raw_data = block['block_header']['raw_data']
+        return raw_data['number'], raw_data['timestamp']
+
+    def check(self) -> List[Dict]:
+        """检查一轮，返回本轮已定论的交易（status 为 confirmed 或 dropped）"""
+        with self._lock:
+            if not self._pending:
+                return []
+            pending = list(self._pending.values())
+
+        solid_number, solid_timestamp = self._get_solid_block()
+
+        # 只核对区块时间已早于固化区块的交易，按被监控地址分组
+        matured: Dict[str, List[Dict]] = {}
+        for entry in pending:
+            transfer = entry['transfer']
+            if transfer.get('timestamp', 0) <= solid_timestamp:
+                matured.setdefault(transfer.get('address', transfer['to']), []).append(entry)
+
+        finalized = []
+        for address, entries in matured.items():
+            min_timestamp = min(entry['transfer'].get('timestamp', 0) for entry in entries)
+            wanted = {transfer_key(entry['transfer']) for entry in entries}
+            confirmed_keys = set()
+            try:
+                # 繁忙地址在 min_timestamp 之后可能有上百笔固化交易，翻页直到待确认的都找到
+                for tx in self.monitor.iter_token_transfers(
+                    address, limit=200, only_confirmed=True, min_timestamp=min_timestamp, all_pages=True
+                ):
+                    key = transfer_key(tx)
+                    if key in wanted:
+                        confirmed_keys.add(key)
+                        if len(confirmed_keys) == len(wanted):
+                            break
+            except Exception as e:
+                self.logger.warning(f"核对地址 {address} 的固化交易失败，下轮重试: {e}")
+                continue
+
+            for entry in entries:
+                transfer = entry['transfer']
+                if transfer_key(transfer) in confirmed_keys:
+                    status = 'confirmed'
+                elif solid_timestamp - transfer.get('timestamp', 0) > self.drop_grace * 1000:
+                    status = 'dropped'
+                else:
+                    continue
+                finalized.append(dict(entry, status=status, solid_block=solid_number))
+
+        with self._lock:
+            for entry in finalized:
+                self._pending.pop(transfer_key(entry['transfer']), None)
+
+        for entry in finalized:
+            if entry['status'] == 'confirmed':
+                self.logger.info(f"交易已固化: {entry['transfer']['txid']} (固化区块 {solid_number})")
+            else:
+                self.logger.warning(f"交易未能固化: {entry['transfer']['txid']} (固化区块 {solid_number})")
+        return finalized
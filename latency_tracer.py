@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+入账通知延迟追踪
+每笔新交易记录出块、拉取、去重、入队和逐个接收者发送的时间点，
+统计各阶段延迟分位数并定期输出一行分位数结构化日志（逐笔明细只在DEBUG下抽样输出），用于判断延迟来自索引、轮询间隔还是Telegram
+"""
+
+import os
+import json
+import math
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from log_setup import debug_sampled
+
+# 各阶段：(名称, 起点, 终点)
+STAGES = (
+    ('index', 'block_time', 'fetched_at'),      # 出块到被拉取：TronGrid索引延迟 + 轮询间隔
+    ('dedup', 'fetched_at', 'dedup_at'),        # 去重并写入本地存储
+    ('queue', 'dedup_at', 'enqueued_at'),       # 等待进入通知
+    ('send', 'enqueued_at', 'sent_at'),         # 逐个接收者发送（每个接收者一个样本）
+    ('total', 'block_time', 'sent_at'),         # 出块到接收者收到通知
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法分位数（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def start_trace(transfer: Dict, fetched_at: float) -> Dict:
+    """为新发现的交易创建追踪记录（时间均为秒级Unix时间）"""
+    timestamp = transfer.get('timestamp') or 0
+    return {
+        'txid': transfer.get('txid'),
+        'to': transfer.get('to'),
+        'block_time': timestamp / 1000 if timestamp > 1e10 else timestamp,
+        'fetched_at': fetched_at,
+        'dedup_at': None,
+        'enqueued_at': None,
+        'sends': []
+    }
+
+
+class LatencyTracer:
+    """延迟追踪汇总：保留最近 TRACE_HISTORY 笔的完整追踪"""
+
+    def __init__(self, history: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self._traces = deque(maxlen=history or int(os.getenv('TRACE_HISTORY', '1000')))
+        self._lock = threading.Lock()
+        # 每隔 TRACE_SUMMARY_INTERVAL 秒在INFO级别输出一行最近这段时间的分位数汇总，0 为不输出
+        self.summary_interval = float(os.getenv('TRACE_SUMMARY_INTERVAL', '60'))
+        self._last_summary = time.time()
+
+    def finish(self, trace: Dict):
+        """记录一笔完成通知的追踪；到汇总间隔时输出分位数汇总，开启DEBUG时按抽样比例输出逐笔结构化日志"""
+        now = time.time()
+        trace['finished_at'] = now
+        with self._lock:
+            self._traces.append(trace)
+            due = self.summary_interval > 0 and now - self._last_summary >= self.summary_interval
+            if due:
+                window = now - self._last_summary
+                self._last_summary = now
+        if due:
+            self.logger.info("transfer_latency_summary %s", json.dumps(self.summary(window), ensure_ascii=False))
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        durations = {
+            name: [round(value, 3) for value in values]
+            for name, values in self._stage_durations(trace).items()
+        }
+        debug_sampled(self.logger, "transfer_trace %s", json.dumps({
+            'txid': trace['txid'],
+            'to': trace['to'],
+            'block_time': trace['block_time'],
+            'fetched_at': round(trace['fetched_at'], 3),
+            'dedup_at': round(trace['dedup_at'], 3) if trace['dedup_at'] else None,
+            'enqueued_at': round(trace['enqueued_at'], 3) if trace['enqueued_at'] else None,
+            'sends': [dict(send, sent_at=round(send['sent_at'], 3)) for send in trace['sends']],
+            'durations': durations
+        }, ensure_ascii=False))
+
+    @staticmethod
+    def _stage_durations(trace: Dict) -> Dict[str, List[float]]:
+        """一笔追踪中各阶段的耗时（秒）；涉及发送的阶段每个成功的接收者一个样本"""
+        sent_times = [send['sent_at'] for send in trace['sends'] if send.get('ok')]
+        durations = {}
+        for name, start_key, end_key in STAGES:
+            start = trace.get(start_key)
+            if not start:
+                continue
+            ends = sent_times if end_key == 'sent_at' else [trace.get(end_key)]
+            values = [end - start for end in ends if end]
+            if values:
+                durations[name] = values
+        return durations
+
+    def summary(self, window: Optional[float] = None) -> Dict:
+        """各阶段延迟分位数；window 为只统计最近多少秒内完成的追踪"""
+        with self._lock:
+            traces = list(self._traces)
+        if window:
+            cutoff = time.time() - window
+            traces = [trace for trace in traces if trace.get('finished_at', trace['fetched_at']) >= cutoff]
+
+        samples: Dict[str, List[float]] = {name: [] for name, _, _ in STAGES}
+        failed_sends = 0
+        for trace in traces:
+            for name, values in self._stage_durations(trace).items():
+                samples[name].extend(values)
+            failed_sends += sum(1 for send in trace['sends'] if not send.get('ok'))
+
+        stages = {}
+        for name, values in samples.items():
+            values.sort()
+            stages[name] = {
+                'count': len(values),
+                **{f'p{pct}': percentile(values, pct) for pct in PERCENTILES},
+                'max': values[-1] if values else 0.0
+            }
+        return {'transfers': len(traces), 'failed_sends': failed_sends, 'stages': stages}
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+日志配置
+所有日志先进入内存队列，由后台线程写控制台和文件，调用方（事件循环、监控线程）不再等待磁盘IO；
+日志文件按大小或按时间轮转，可输出JSON格式；热路径上的诊断日志走抽样DEBUG
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime
+from typing import Optional
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _file_handler(log_file: str) -> logging.Handler:
+    """按 LOG_ROTATE 选择轮转方式：size（按大小）或 time（按时间）"""
+    backup_count = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    if os.getenv('LOG_ROTATE', 'size').lower() == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=os.getenv('LOG_ROTATE_WHEN', 'midnight'),
+            backupCount=backup_count, encoding='utf-8'
+        )
+    return logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=int(os.getenv('LOG_MAX_BYTES', str(20 * 1024 * 1024))),
+        backupCount=backup_count, encoding='utf-8'
+    )
+
+
+def setup_logging(log_file: Optional[str] = None, level: Optional[str] = None):
+    """配置根日志：QueueHandler 入队，QueueListener 后台线程写控制台和（可选的）轮转文件
+
+    LOG_LEVEL 日志级别，LOG_FORMAT=json 输出JSON，LOG_FILE 覆盖默认日志文件（设为空字符串则不写文件）
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if os.getenv('LOG_FORMAT', 'text').lower() == 'json' else logging.Formatter(TEXT_FORMAT)
+    log_file = os.getenv('LOG_FILE', log_file)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(getattr(logging, (level or os.getenv('LOG_LEVEL', 'INFO')).upper()))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """停止后台写日志线程（会先写完队列中剩余的日志）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+_sample_rate = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+
+
+def debug_sampled(logger: logging.Logger, msg: str, *args):
+    """抽样DEBUG：热路径诊断日志只按 LOG_DEBUG_SAMPLE_RATE 的比例输出，未开启DEBUG时不做格式化"""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < _sample_rate:
+        logger.debug(msg, *args)
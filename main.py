@@ -12,12 +12,19 @@ import logging
 import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
-import threading
 from telegram import BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
 
 # 导入自定义模块
-from tron_monitor import TronUSDTMonitor
+from tron_monitor import TronUSDTMonitor, OUTBOUND
 from telegram_bot import TelegramBot
+from confirmation_tracker import ConfirmationTracker
+from shard_queue import ShardQueue
+from state_snapshot import StateSnapshot
+from log_setup import setup_logging, debug_sampled
+from metrics import (
+    POLL_CYCLE_SECONDS, NOTIFY_LAG_SECONDS, TELEGRAM_SEND_SECONDS, TELEGRAM_SEND_ERRORS,
+    start_metrics_server
+)
 
 # 加载环境变量
 load_dotenv()
@@ -28,10 +35,25 @@ class TronMonitorApp:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.running = False
+        self.monitor_task = None
         
         # 初始化组件
         self.tron_monitor = TronUSDTMonitor()
-        self.telegram_bot = TelegramBot()
+        self.telegram_bot = TelegramBot(self.tron_monitor)
+        
+        # 运行时状态快照：恢复已处理交易等，重启后的第一轮轮询不重复拉取、不重复提醒
+        self.state_snapshot = StateSnapshot()
+        self.state_snapshot.restore(self.tron_monitor)
+        
+        # 入账确认跟踪（通知先发出，固化后再更新消息状态）
+        self.confirmation_tracker = None
+        if os.getenv('CONFIRMATION_TRACKING', 'true').lower() == 'true':
+            self.confirmation_tracker = ConfirmationTracker(self.tron_monitor)
+        
+        # 分片模式：地址由 shard_worker.py 工作进程拉取，本进程只从共享队列取新交易发通知
+        self.shard_queue = None
+        if os.getenv('SHARD_MODE', 'false').lower() == 'true':
+            self.shard_queue = ShardQueue()
         
         # 设置信号处理
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -59,42 +81,88 @@ class TronMonitorApp:
             
             self.logger.info(f"开始监控 {len(monitor_addresses)} 个地址")
             
-            # 启动监控循环
-            while self.running:
-                try:
-                    for address in monitor_addresses:
-                        if not self.running:
-                            break
-                        
-                        try:
-                            # 检查新交易
-                            new_transfers = self.tron_monitor.check_new_transfers()
-                            new_transactions = [tx for tx in new_transfers if tx.get('to') == address]
+            confirmation_task = None
+            if self.confirmation_tracker:
+                confirmation_task = asyncio.create_task(self._confirmation_loop())
+            
+            try:
+                if self.shard_queue:
+                    await self._shard_notify_loop()
+                
+                # 启动监控循环
+                while self.running and not self.shard_queue:
+                    try:
+                        cycle_start = time.perf_counter()
+                        for address in monitor_addresses:
+                            if not self.running:
+                                break
                             
-                            if new_transactions:
-                                for tx in new_transactions:
-                                    # 发送通知
+                            try:
+                                # 检查新交易，边解析边通知；拉取和解析在线程池中进行，不阻塞机器人的事件循环
+                                transfers = self.tron_monitor.iter_new_transfers([address])
+                                while True:
+                                    tx = await asyncio.to_thread(next, transfers, None)
+                                    if tx is None:
+                                        break
+                                    detected_at = time.perf_counter()
+                                    tx['trace']['enqueued_at'] = time.time()
                                     await self._send_transaction_notification(tx)
-                            
-                            # 短暂延迟
-                            await asyncio.sleep(1)
-                            
-                        except Exception as e:
-                            self.logger.error(f"监控地址 {address} 时出错: {e}")
-                            continue
-                    
-                    # 等待下次检查
-                    monitor_interval = int(os.getenv('MONITOR_INTERVAL', '30'))
-                    await asyncio.sleep(monitor_interval)
-                    
-                except Exception as e:
-                    self.logger.error(f"监控循环出错: {e}")
-                    await asyncio.sleep(10)  # 出错后等待10秒再重试
+                                    NOTIFY_LAG_SECONDS.observe(time.perf_counter() - detected_at)
+                                
+                                # 短暂延迟
+                                await asyncio.sleep(1)
+                                
+                            except Exception as e:
+                                self.logger.error(f"监控地址 {address} 时出错: {e}")
+                                continue
+                        
+                        POLL_CYCLE_SECONDS.observe(time.perf_counter() - cycle_start)
+                        await asyncio.to_thread(self.state_snapshot.maybe_save, self.tron_monitor)
+                        
+                        # 等待下次检查
+                        monitor_interval = int(os.getenv('MONITOR_INTERVAL', '30'))
+                        await asyncio.sleep(monitor_interval)
+                        
+                    except Exception as e:
+                        self.logger.error(f"监控循环出错: {e}")
+                        await asyncio.sleep(10)  # 出错后等待10秒再重试
+            finally:
+                if confirmation_task:
+                    confirmation_task.cancel()
             
         except Exception as e:
             self.logger.error(f"启动监控失败: {e}")
             raise
     
+    async def _shard_notify_loop(self):
+        """分片模式：按入队顺序发送工作进程发现的新交易"""
+        self.logger.info(f"分片模式，从共享队列读取新交易: {self.shard_queue.db_path}")
+        poll_interval = float(os.getenv('SHARD_QUEUE_POLL_INTERVAL', '1'))
+        last_prune = 0.0
+        while self.running:
+            try:
+                for queue_id, tx in self.shard_queue.pending():
+                    if not self.running:
+                        break
+                    detected_at = time.perf_counter()
+                    # 工作进程写的是各自的本地存储（可能配置了不同的存储路径），这里补写一份供 /latest 等查询（只存入账）
+                    if tx.get('direction') != OUTBOUND:
+                        self.tron_monitor.transfer_store.add_transfers([tx])
+                    if tx.get('trace'):
+                        tx['trace']['enqueued_at'] = time.time()
+                    await self._send_transaction_notification(tx)
+                    self.shard_queue.mark_delivered(queue_id)
+                    NOTIFY_LAG_SECONDS.observe(time.perf_counter() - detected_at)
+                
+                if time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    pruned = self.shard_queue.prune()
+                    if pruned:
+                        self.logger.info(f"已清理 {pruned} 条过期队列记录")
+            except Exception as e:
+                self.logger.error(f"读取分片队列出错: {e}")
+            await asyncio.sleep(poll_interval)
+    
     async def _send_transaction_notification(self, transaction):
         """发送交易通知"""
         try:
@@ -111,33 +179,108 @@ class TronMonitorApp:
                 time_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
             else:
                 time_str = str(timestamp)
-            msg = f"📍 {to_address[:10]}...{to_address[-10:] if to_address else ''}\n"
+            if transaction.get('direction') == OUTBOUND:
+                # 转出：标明被监控的转出地址和收款方
+                msg = f"🚨 转出提醒\n"
+                msg += f"📍 {from_address[:10]}...{from_address[-10:] if from_address else ''}\n"
+                msg += f"📥 收款方: {to_address}\n"
+            else:
+                msg = f"📍 {to_address[:10]}...{to_address[-10:] if to_address else ''}\n"
             msg += f"🕐 时间: {time_str}\n"
-            msg += f"💰 金额: {amount} USDT\n"
+            msg += f"💰 金额: {amount} {transaction.get('token', 'USDT')}\n"
             msg += f"🔗 交易哈希: {txid[:20]}..."
             keyboard = [[InlineKeyboardButton("在区块链浏览器查看", url=f"https://tronscan.org/#/transaction/{txid}")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
+            text = f"{msg}\n⏳ 状态: 等待区块固化" if self.confirmation_tracker else msg
             # 获取允许的用户列表
             allowed_users = os.getenv('ALLOWED_USERS', '').split(',')
             allowed_users = [user.strip() for user in allowed_users if user.strip()]
             if not allowed_users:
                 self.logger.warning("未配置允许的用户，跳过通知")
                 return
+            # 提醒规则限定了接收者时只发给其中的授权用户
+            notify_users = transaction.get('notify_users')
+            if notify_users:
+                allowed_users = [user for user in allowed_users if user in notify_users]
+            trace = transaction.get('trace')
+            sent_messages = []
             for user_id in allowed_users:
                 try:
-                    await self.telegram_bot.application.bot.send_message(
-                        chat_id=user_id,
-                        text=msg,
-                        reply_markup=reply_markup
-                    )
-                    self.logger.info(f"通知已发送给用户 {user_id}")
+                    with TELEGRAM_SEND_SECONDS.time(method='send_message'):
+                        message = await self.telegram_bot.application.bot.send_message(
+                            chat_id=user_id,
+                            text=text,
+                            reply_markup=reply_markup
+                        )
+                    sent_messages.append((message.chat_id, message.message_id))
+                    if trace:
+                        trace['sends'].append({'chat_id': user_id, 'sent_at': time.time(), 'ok': True})
+                    debug_sampled(self.logger, "通知已发送给用户 %s", user_id)
                 except Exception as e:
+                    TELEGRAM_SEND_ERRORS.inc(method='send_message')
+                    if trace:
+                        trace['sends'].append({'chat_id': user_id, 'sent_at': time.time(), 'ok': False})
                     self.logger.error(f"发送通知给用户 {user_id} 失败: {e}")
                     continue
-            self.logger.info(f"已发送交易通知: {transaction.get('txid', 'unknown')}")
+            if self.confirmation_tracker:
+                self.confirmation_tracker.add(transaction, sent_messages, msg)
+            if trace:
+                self.telegram_bot.latency_tracer.finish(trace)
+            debug_sampled(self.logger, "已发送交易通知: %s", transaction.get('txid', 'unknown'))
         except Exception as e:
             self.logger.error(f"发送交易通知失败: {e}")
     
+    async def _confirmation_loop(self):
+        """定期批量检查待确认交易，固化后更新已发送的通知"""
+        check_interval = int(os.getenv('CONFIRMATION_CHECK_INTERVAL', '6'))
+        while self.running:
+            await asyncio.sleep(check_interval)
+            try:
+                finalized = await asyncio.to_thread(self.confirmation_tracker.check)
+            except Exception as e:
+                self.logger.error(f"检查交易确认状态失败: {e}")
+                continue
+            for entry in finalized:
+                await self._update_confirmation_status(entry)
+    
+    async def _update_confirmation_status(self, entry):
+        """把通知消息的状态行更新为最终确认结果"""
+        txid = entry['transfer'].get('txid', 'unknown')
+        if entry['status'] == 'confirmed':
+            status = f"✅ 状态: 已确认（固化区块 {entry['solid_block']}）"
+        else:
+            status = "⚠️ 状态: 未能确认，请在区块链浏览器核实"
+        keyboard = [[InlineKeyboardButton("在区块链浏览器查看", url=f"https://tronscan.org/#/transaction/{txid}")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        for chat_id, message_id in entry['messages']:
+            try:
+                with TELEGRAM_SEND_SECONDS.time(method='edit_message_text'):
+                    await self.telegram_bot.application.bot.edit_message_text(
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        text=f"{entry['text']}\n{status}",
+                        reply_markup=reply_markup
+                    )
+            except Exception as e:
+                TELEGRAM_SEND_ERRORS.inc(method='edit_message_text')
+                self.logger.error(f"更新确认状态失败 {chat_id}/{message_id}: {e}")
+    
+    def start_monitoring_task(self):
+        """在机器人的事件循环上启动监控（发送通知用的 Bot 连接绑定在这个循环上）"""
+        self.running = True
+        self.monitor_task = asyncio.create_task(self.start_monitoring())
+    
+    async def stop_monitoring_task(self):
+        """停止监控任务并等待其退出"""
+        self.running = False
+        if self.monitor_task and not self.monitor_task.done():
+            self.monitor_task.cancel()
+            try:
+                await self.monitor_task
+            except asyncio.CancelledError:
+                pass
+        self.monitor_task = None
+    
     async def run(self):
         self.running = True
         self.logger.info("启动简化Tron监控应用...")
@@ -155,11 +298,6 @@ class TronMonitorApp:
             await self.telegram_bot.application.stop()
             await self.telegram_bot.application.shutdown()
 
-def start_monitoring_task(app):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(app.start_monitoring())
-
 async def on_startup(application):
     # 注册BotCommand，支持/自动补全
     commands = [
@@ -168,27 +306,34 @@ async def on_startup(application):
         BotCommand("status", "显示监控状态"),
         BotCommand("balance", "查询监控地址余额"),
         BotCommand("latest", "显示最新交易"),
+        BotCommand("history", "查询地址入账历史"),
+        BotCommand("stats", "入账统计"),
+        BotCommand("perf", "通知延迟统计"),
         BotCommand("whitelist", "显示白名单地址"),
         BotCommand("wallet_balance", "查询钱包余额"),
-        BotCommand("transfer", "转账到白名单地址")
+        BotCommand("transfer", "转账到白名单地址"),
+        BotCommand("batch_transfer", "批量转账到白名单地址")
     ]
     await application.bot.set_my_commands(commands)
     # 调用telegram_bot的send_startup_info方法
     bot = application.bot_data.get("telegram_bot_instance")
     if bot:
         await bot.send_startup_info()
+    # 监控与机器人共用同一个事件循环
+    app = application.bot_data.get("monitor_app")
+    if app:
+        app.start_monitoring_task()
+
+async def on_shutdown(application):
+    # 机器人停止处理更新后再停止监控，关闭 Bot 连接前不再有通知在发送
+    app = application.bot_data.get("monitor_app")
+    if app:
+        await app.stop_monitoring_task()
 
 def main():
     """主函数"""
-    # 设置日志
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler('tron_monitor.log', encoding='utf-8')
-        ]
-    )
+    # 设置日志（后台线程写控制台和轮转文件）
+    setup_logging('tron_monitor.log')
     
     logger = logging.getLogger(__name__)
     
@@ -213,15 +358,26 @@ def main():
         # 创建并运行应用
         app = TronMonitorApp()
         
-        # 存储telegram_bot实例，供on_startup使用
+        # 本地指标端点（Prometheus 文本格式）
+        start_metrics_server()
+        
+        # 存储telegram_bot实例和应用，供on_startup使用
         app.telegram_bot.application.bot_data["telegram_bot_instance"] = app.telegram_bot
-        # 启动监控任务
-        monitor_thread = threading.Thread(target=start_monitoring_task, args=(app,))
-        monitor_thread.start()
-        # 注册on_startup
+        app.telegram_bot.application.bot_data["monitor_app"] = app
+        # 注册on_startup（同时启动监控任务）和on_shutdown
         app.telegram_bot.application.post_init = on_startup
-        # 只跑run_polling
-        app.telegram_bot.application.run_polling()
+        app.telegram_bot.application.post_stop = on_shutdown
+        # TELEGRAM_MODE=webhook 时由本地HTTP服务接收推送，否则长轮询
+        if os.getenv('TELEGRAM_MODE', 'polling').lower() == 'webhook':
+            app.running = True
+            asyncio.run(app.telegram_bot.run_webhook(lambda: app.running, post_init=on_startup,
+                                                     post_stop=on_shutdown))
+        else:
+            app.telegram_bot.application.run_polling()
+        # 机器人退出后保存状态快照，并清零私钥
+        app.running = False
+        app.state_snapshot.save(app.tron_monitor)
+        app.telegram_bot.wallet_operations.close()
         
     except KeyboardInterrupt:
         logger.info("收到中断信号，正在退出...")
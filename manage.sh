@@ -1,11 +1,13 @@
 #!/bin/bash
 
 # Tron监控服务管理脚本
-# 用法: ./manage.sh {start|stop|restart|status|logs}
+# 用法: ./manage.sh {start|stop|restart|status|logs|backfill|workers}
 
 PROJECT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 LOG_FILE="$PROJECT_DIR/monitor.log"
 PID_FILE="$PROJECT_DIR/monitor.pid"
+WORKERS_LOG_FILE="$PROJECT_DIR/shard_workers.log"
+WORKERS_PID_FILE="$PROJECT_DIR/shard_workers.pid"
 
 start() {
     if [ -f "$PID_FILE" ] && kill -0 $(cat "$PID_FILE") 2>/dev/null; then
@@ -54,6 +56,43 @@ logs() {
     tail -f "$LOG_FILE"
 }
 
+backfill() {
+    echo "[INFO] 回填监控地址历史交易 (中断后重新运行可继续)..."
+    cd "$PROJECT_DIR" && python3 backfill.py "$@"
+}
+
+workers() {
+    # 分片工作进程（主程序需设置 SHARD_MODE=true）
+    case "$1" in
+        start)
+            if [ -f "$WORKERS_PID_FILE" ] && kill -0 $(cat "$WORKERS_PID_FILE") 2>/dev/null; then
+                echo "[INFO] 分片工作进程已在运行 (PID: $(cat $WORKERS_PID_FILE))"
+                exit 0
+            fi
+            echo "[INFO] 启动 ${2:-2} 个分片工作进程..."
+            cd "$PROJECT_DIR" && nohup python3 shard_worker.py --processes "${2:-2}" > "$WORKERS_LOG_FILE" 2>&1 &
+            echo $! > "$WORKERS_PID_FILE"
+            echo "[INFO] 启动成功, PID: $(cat $WORKERS_PID_FILE)"
+            ;;
+        stop)
+            if [ -f "$WORKERS_PID_FILE" ] && kill -0 $(cat "$WORKERS_PID_FILE") 2>/dev/null; then
+                kill $(cat "$WORKERS_PID_FILE")
+                echo "[INFO] 分片工作进程已停止"
+            else
+                echo "[WARN] 分片工作进程未运行"
+            fi
+            rm -f "$WORKERS_PID_FILE"
+            ;;
+        status)
+            cd "$PROJECT_DIR" && python3 shard_worker.py --status
+            ;;
+        *)
+            echo "用法: $0 workers {start [进程数]|stop|status}"
+            exit 1
+            ;;
+    esac
+}
+
 case "$1" in
     start)
         start
@@ -71,8 +110,16 @@ case "$1" in
     logs)
         logs
         ;;
+    backfill)
+        shift
+        backfill "$@"
+        ;;
+    workers)
+        shift
+        workers "$@"
+        ;;
     *)
-        echo "用法: $0 {start|stop|restart|status|logs}"
+        echo "用法: $0 {start|stop|restart|status|logs|backfill|workers}"
         exit 1
         ;;
 esac
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+运行指标
+内置的计数器/直方图注册表，以 Prometheus 文本格式通过本地 HTTP 端口暴露
+"""
+
+import os
+import re
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from tronpy.providers import HTTPProvider
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 延迟类直方图的默认桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_ADDRESS_RE = re.compile(r'T[1-9A-HJ-NP-Za-km-z]{33}')
+_HEX_RE = re.compile(r'/[0-9a-fA-F]{64}')
+
+
+def endpoint_label(url: str) -> str:
+    """把请求URL归一成端点标签：去掉主机和查询参数，地址和哈希替换为占位符，避免标签基数膨胀"""
+    path = urlsplit(url).path or url
+    path = _ADDRESS_RE.sub('{address}', path)
+    return _HEX_RE.sub('/{hash}', path)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+
+
+class Histogram:
+    """分桶直方图"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶计数（非累积）..., +Inf桶计数, 总和]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """统计代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}'
+            cumulative += state[len(self.buckets)]
+            le = 'le="+Inf"'
+            yield f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, key)} {state[-1]}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}'
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# 请求
+TRONGRID_REQUEST_SECONDS = REGISTRY.histogram(
+    'tron_api_request_seconds', 'TronGrid/节点请求耗时（秒）', ('endpoint',))
+REQUEST_RETRIES = REGISTRY.counter(
+    'tron_api_retries_total', 'TronGrid请求重试次数', ('endpoint',))
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    'circuit_breaker_transitions_total', '上游端点熔断器状态切换次数', ('endpoint', 'state'))
+# 监控
+POLL_CYCLE_SECONDS = REGISTRY.histogram(
+    'monitor_poll_cycle_seconds', '一轮监控轮询耗时（秒，不含轮询间隔）')
+TRANSFERS_SEEN = REGISTRY.counter(
+    'monitor_transfers_seen_total', '轮询读到的转账记录数（含重复）')
+DEDUP_HITS = REGISTRY.counter(
+    'monitor_dedup_hits_total', '已处理过而被去重跳过的转账数')
+NEW_TRANSFERS = REGISTRY.counter(
+    'monitor_new_transfers_total', '新发现的转入交易数')
+ALERT_DECISIONS = REGISTRY.counter(
+    'alert_rule_decisions_total', '新交易按提醒规则判定的结果', ('action',))
+# 通知
+NOTIFY_LAG_SECONDS = REGISTRY.histogram(
+    'notify_lag_seconds', '从检测到新交易到通知发送完成的延迟（秒）')
+TELEGRAM_SEND_SECONDS = REGISTRY.histogram(
+    'telegram_send_seconds', 'Telegram消息发送耗时（秒）', ('method',))
+TELEGRAM_SEND_ERRORS = REGISTRY.counter(
+    'telegram_send_errors_total', 'Telegram消息发送失败次数', ('method',))
+COALESCED_REQUESTS = REGISTRY.counter(
+    'bot_coalesced_requests_total', '与进行中的相同查询合并、未单独执行的命令数', ('view',))
+# 缓存
+CACHE_REQUESTS = REGISTRY.counter(
+    'cache_requests_total', '缓存查询次数', ('cache', 'result'))
+
+
+def cache_result(cache: str, hit: bool):
+    """记录一次缓存命中或未命中"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+class InstrumentedHTTPProvider(HTTPProvider):
+    """记录每个节点接口耗时的 tronpy HTTPProvider，传入 breakers 时每个接口经过各自的熔断器"""
+
+    def __init__(self, *args, breakers=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breakers = breakers
+
+    def make_request(self, method: str, params: dict = None) -> dict:
+        endpoint = method if method.startswith('/') else '/' + method
+        guard = self.breakers.get(endpoint).guard() if self.breakers else nullcontext()
+        with guard, TRONGRID_REQUEST_SECONDS.time(endpoint=endpoint):
+            return super().make_request(method, params)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取请求很频繁，不写访问日志
+        pass
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """在后台线程启动指标端点（METRICS_PORT=0 时不启动）"""
+    logger = logging.getLogger(__name__)
+    port = port if port is not None else int(os.getenv('METRICS_PORT', '9108'))
+    host = host or os.getenv('METRICS_HOST', '127.0.0.1')
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"指标端点启动失败 {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"指标端点已启动: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+机器人长列表分页
+把地址列表、余额、最新交易等按页渲染（每页 BOT_PAGE_SIZE 条，且不超过Telegram单条消息4096字符），
+配上一页/下一页的内联按钮；渲染好的页面按数据版本缓存，数据不变时翻页直接取缓存。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from dotenv import load_dotenv
+
+from metrics import cache_result
+
+# 加载环境变量
+load_dotenv()
+
+MESSAGE_LIMIT = 4096
+PAGE_CALLBACK_PREFIX = 'page:'
+# 页码按钮本身不做任何事
+NOOP_CALLBACK = 'page:noop'
+
+
+def page_size() -> int:
+    return max(1, int(os.getenv('BOT_PAGE_SIZE', '10')))
+
+
+def page_slice(items: Sequence, page: int, size: Optional[int] = None) -> Tuple[Sequence, int, int]:
+    """取第 page 页（从0开始，越界时收到首/末页），返回 (本页条目, 实际页码, 总页数)"""
+    size = size or page_size()
+    pages = max(1, (len(items) + size - 1) // size)
+    page = min(max(page, 0), pages - 1)
+    return items[page * size:(page + 1) * size], page, pages
+
+
+def join_page(header: str, entries: List[str], page: int, pages: int, footer: str = '') -> str:
+    """拼接一页：标题 + 条目 + 页码 + 页脚，超长时截断条目部分，标题、页码和页脚保持完整"""
+    tail = f"📄 第 {page + 1}/{pages} 页\n" if pages > 1 else ''
+    tail += footer
+    body = header + ''.join(entries)
+    if len(body) + len(tail) > MESSAGE_LIMIT:
+        body = body[:max(0, MESSAGE_LIMIT - len(tail) - 3)] + '\n…\n'
+    return body + tail
+
+
+def page_keyboard(view: str, page: int, pages: int,
+                  rows: Optional[List[List[InlineKeyboardButton]]] = None) -> Optional[InlineKeyboardMarkup]:
+    """翻页按钮（回调数据 page:<视图>:<页码>），rows 为放在翻页按钮上方的其他按钮"""
+    keyboard = list(rows or [])
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton("⬅️ 上一页", callback_data=f"{PAGE_CALLBACK_PREFIX}{view}:{page - 1}"))
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=NOOP_CALLBACK))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton("下一页 ➡️", callback_data=f"{PAGE_CALLBACK_PREFIX}{view}:{page + 1}"))
+        keyboard.append(nav)
+    return InlineKeyboardMarkup(keyboard) if keyboard else None
+
+
+def parse_page_callback(data: str) -> Optional[Tuple[str, int]]:
+    """解析翻页回调，返回 (视图, 页码)；不是翻页回调或是页码按钮时返回 None"""
+    if not data.startswith(PAGE_CALLBACK_PREFIX) or data == NOOP_CALLBACK:
+        return None
+    view, _, page = data[len(PAGE_CALLBACK_PREFIX):].rpartition(':')
+    if not view or not page.isdigit():
+        return None
+    return view, int(page)
+
+
+class PageCache:
+    """渲染结果缓存：键 -> (数据版本, 渲染结果)，版本变化才重新渲染，按最近使用淘汰"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv('BOT_PAGE_CACHE_SIZE', '512'))
+        self._entries: 'OrderedDict[Hashable, Tuple[Hashable, object]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: Hashable, render: Callable[[], object]):
+        """取缓存的渲染结果，版本不同或未缓存时调用 render 并缓存"""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                cache_result('pages', True)
+                return cached[1]
+        cache_result('pages', False)
+        value = render()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+转出交易回执跟踪
+后台批量轮询已广播交易的回执（带退避），得到最终结果后回调更新Telegram消息
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+# 导入自定义模块
+from wallet_operations import TronWallet
+
+# 加载环境变量
+load_dotenv()
+
+# 回执最终结果回调：(txid, 回执或None表示超时, 登记时附带的上下文)
+ReceiptCallback = Callable[[str, Optional[Dict], Dict], Awaitable[None]]
+
+class ReceiptTracker:
+    """交易回执跟踪器
+
+    所有待确认交易在同一个后台任务中按轮批量查询；没有新结果时轮询间隔指数退避，
+    有新交易登记时重置为最短间隔。
+    """
+
+    def __init__(self, wallet: TronWallet, on_final: ReceiptCallback):
+        self.logger = logging.getLogger(__name__)
+        self.wallet = wallet
+        self.on_final = on_final
+        self.min_interval = float(os.getenv('RECEIPT_POLL_MIN_INTERVAL', '3'))
+        self.max_interval = float(os.getenv('RECEIPT_POLL_MAX_INTERVAL', '30'))
+        self.timeout = float(os.getenv('RECEIPT_TIMEOUT', '600'))
+        self._pending: Dict[str, Dict] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def track(self, txid: str, context: Dict):
+        """登记一笔已广播交易，首次调用时在当前事件循环中启动后台任务"""
+        self._pending[txid] = {'context': context, 'added_at': time.time()}
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def pending_count(self) -> int:
+        """待确认交易数"""
+        return len(self._pending)
+
+    async def _run(self):
+        interval = self.min_interval
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+                # 有新交易登记：重置退避，稍等片刻让交易进块
+                self._wakeup.clear()
+                interval = self.min_interval
+                await asyncio.sleep(self.min_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            txids = list(self._pending)
+            try:
+                receipts = await asyncio.to_thread(self.wallet.get_transaction_receipts, txids)
+            except Exception as e:
+                self.logger.error(f"批量查询交易回执失败: {e}")
+                receipts = {}
+
+            resolved = 0
+            now = time.time()
+            for txid in txids:
+                entry = self._pending.get(txid)
+                if entry is None:
+                    continue
+                receipt = receipts.get(txid)
+                if receipt is None and now - entry['added_at'] < self.timeout:
+                    continue
+                self._pending.pop(txid, None)
+                resolved += 1
+                try:
+                    await self.on_final(txid, receipt, entry['context'])
+                except Exception as e:
+                    self.logger.error(f"处理交易回执回调失败 {txid}: {e}")
+
+            interval = self.min_interval if resolved else min(interval * 2, self.max_interval)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+热钱包资源预测
+缓存账户的能量/带宽并按链上恢复规则推算当前可用量，按收款方估算USDT转账能量，
+预测还能负担多少笔转账，能量不足时可选择燃烧TRX支付
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from tronpy import Tron
+from tronpy.keys import to_hex_address
+from dotenv import load_dotenv
+from metrics import cache_result
+
+# 加载环境变量
+load_dotenv()
+
+# 能量和带宽的恢复窗口：已用量在24小时内线性恢复
+RESOURCE_WINDOW_MS = 24 * 60 * 60 * 1000
+
+# 交易字节数（带签名），即消耗的带宽
+USDT_TX_BYTES = 345
+TRX_TX_BYTES = 268
+
+# 无法估算时的兜底能量：收款方已持有USDT / 从未持有USDT（需要新建存储槽）
+USDT_ENERGY_EXISTING = 65_000
+USDT_ENERGY_NEW = 131_000
+
+# 链参数查询失败时的默认单价（sun）
+DEFAULT_ENERGY_FEE = 420
+DEFAULT_BANDWIDTH_FEE = 1000
+
+# 交易默认手续费上限（sun）
+DEFAULT_FEE_LIMIT = 20_000_000
+
+
+def regenerate(used: int, elapsed_ms: float) -> int:
+    """按线性恢复规则计算经过 elapsed_ms 后剩余的已用量"""
+    if elapsed_ms >= RESOURCE_WINDOW_MS:
+        return 0
+    return int(used * (RESOURCE_WINDOW_MS - elapsed_ms) / RESOURCE_WINDOW_MS)
+
+
+class ResourceForecaster:
+    """账户资源预测器
+
+    账户资源每隔 refresh_interval 秒才真正查询一次，期间按恢复规则推算，
+    本地广播的交易直接记入已用量；收款方的能量估算按地址缓存。
+    """
+
+    def __init__(self, tron: Tron, usdt_contract_address: str,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.logger = logging.getLogger(__name__)
+        self.tron = tron
+        self.usdt_contract_address = usdt_contract_address
+        self.executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix='resource')
+        self.refresh_interval = float(os.getenv('RESOURCE_REFRESH_INTERVAL', '300'))
+        self.recipient_ttl = float(os.getenv('RECIPIENT_ENERGY_TTL', '3600'))
+        self.estimate_margin = float(os.getenv('ENERGY_ESTIMATE_MARGIN', '1.1'))
+        # 能量不足时是否允许燃烧TRX支付，以及单笔最多燃烧多少TRX
+        self.burn_enabled = os.getenv('ENERGY_BURN_ENABLED', 'false').lower() == 'true'
+        self.burn_max_trx = float(os.getenv('ENERGY_BURN_MAX_TRX', '50'))
+
+        self._accounts: Dict[str, Dict] = {}
+        self._recipient_energy: Dict[str, Tuple[int, float]] = {}
+        self._prices: Optional[Tuple[int, int]] = None
+        self._prices_time = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch_account(self, address: str) -> Dict:
+        """查询账户资源和TRX余额（并发），getaccountresource 返回的已用量已恢复到当前时刻"""
+        balance_future = self.executor.submit(self.tron.get_account_balance, address)
+        resource = self.tron.get_account_resource(address)
+        try:
+            trx_balance = int(balance_future.result() * 1_000_000)
+        except Exception:
+            # 未激活账户查不到余额
+            trx_balance = 0
+        return {
+            'energy_limit': resource.get('EnergyLimit', 0),
+            'energy_used': resource.get('EnergyUsed', 0),
+            'net_limit': resource.get('NetLimit', 0),
+            'net_used': resource.get('NetUsed', 0),
+            'free_net_limit': resource.get('freeNetLimit', 0),
+            'free_net_used': resource.get('freeNetUsed', 0),
+            'trx_balance': trx_balance,
+            'anchor_ms': time.time() * 1000,
+            'fetched_at': time.time()
+        }
+
+    def get_prices(self) -> Tuple[int, int]:
+        """能量和带宽的燃烧单价 (sun/能量, sun/字节)，每小时刷新一次"""
+        with self._lock:
+            if self._prices and time.time() - self._prices_time < 3600:
+                return self._prices
+        try:
+            params = {p['key']: p.get('value', 0) for p in self.tron.get_chain_parameters()}
+            prices = (params.get('getEnergyFee') or DEFAULT_ENERGY_FEE,
+                      params.get('getTransactionFee') or DEFAULT_BANDWIDTH_FEE)
+        except Exception as e:
+            self.logger.warning(f"获取链参数失败，使用默认资源单价: {e}")
+            prices = (DEFAULT_ENERGY_FEE, DEFAULT_BANDWIDTH_FEE)
+        with self._lock:
+            self._prices = prices
+            self._prices_time = time.time()
+        return prices
+
+    def get_resources(self, address: str, refresh: bool = False) -> Dict:
+        """推算账户当前可用的能量、带宽和TRX余额"""
+        with self._lock:
+            account = self._accounts.get(address)
+        stale = refresh or account is None or time.time() - account['fetched_at'] >= self.refresh_interval
+        cache_result('account_resources', not stale)
+        if stale:
+            account = self._fetch_account(address)
+            with self._lock:
+                self._accounts[address] = account
+
+        elapsed = time.time() * 1000 - account['anchor_ms']
+        energy_used = regenerate(account['energy_used'], elapsed)
+        net_used = regenerate(account['net_used'], elapsed)
+        free_net_used = regenerate(account['free_net_used'], elapsed)
+        return {
+            'energy_limit': account['energy_limit'],
+            'available_energy': max(account['energy_limit'] - energy_used, 0),
+            'available_bandwidth': max(account['net_limit'] - net_used, 0),
+            'available_free_bandwidth': max(account['free_net_limit'] - free_net_used, 0),
+            'trx_balance': account['trx_balance'],
+            'age': round(time.time() - account['fetched_at'], 1)
+        }
+
+    def record_usage(self, address: str, energy: int = 0, bandwidth: int = 0, burned_sun: int = 0,
+                     transferred_sun: int = 0):
+        """记入本地广播交易消耗的资源：先把已用量恢复到当前时刻再累加，与链上记账方式一致
+
+        burned_sun 为燃烧的资源费用，transferred_sun 为转出的TRX金额，都从TRX余额中扣除。
+        """
+        with self._lock:
+            account = self._accounts.get(address)
+            if account is None:
+                return
+            now_ms = time.time() * 1000
+            elapsed = now_ms - account['anchor_ms']
+            account['energy_used'] = regenerate(account['energy_used'], elapsed)
+            account['net_used'] = regenerate(account['net_used'], elapsed)
+            account['free_net_used'] = regenerate(account['free_net_used'], elapsed)
+            account['anchor_ms'] = now_ms
+
+            staked_energy = min(energy, max(account['energy_limit'] - account['energy_used'], 0))
+            account['energy_used'] += staked_energy
+            if account['net_limit'] - account['net_used'] >= bandwidth:
+                account['net_used'] += bandwidth
+            elif account['free_net_limit'] - account['free_net_used'] >= bandwidth:
+                account['free_net_used'] += bandwidth
+            account['trx_balance'] = max(account['trx_balance'] - burned_sun - transferred_sun, 0)
+
+    def invalidate(self, address: str):
+        """作废账户资源缓存（如交易因资源不足失败时）"""
+        with self._lock:
+            self._accounts.pop(address, None)
+
+    def estimate_usdt_energy(self, from_address: str, to_address: str, amount_sun: int) -> int:
+        """估算向 to_address 转USDT需要的能量，按收款方缓存
+
+        首选节点模拟执行的实际能量（含动态能量惩罚），失败时按收款方是否已持有USDT取兜底值。
+        """
+        with self._lock:
+            cached = self._recipient_energy.get(to_address)
+        if cached and time.time() - cached[1] < self.recipient_ttl:
+            cache_result('recipient_energy', True)
+            return cached[0]
+        cache_result('recipient_energy', False)
+
+        parameter = to_hex_address(to_address)[2:].rjust(64, '0') + format(amount_sun, '064x')
+        try:
+            ret = self.tron.trigger_constant_contract(
+                from_address, self.usdt_contract_address, 'transfer(address,uint256)', parameter
+            )
+            energy = ret.get('energy_used', 0) + ret.get('energy_penalty', 0)
+            if not energy:
+                raise ValueError('节点未返回能量估算')
+            energy = int(energy * self.estimate_margin)
+        except Exception as e:
+            self.logger.warning(f"模拟执行估算能量失败，按收款方持币情况估算: {e}")
+            try:
+                holds_usdt = self.tron.get_contract(self.usdt_contract_address).functions.balanceOf(to_address) > 0
+            except Exception:
+                holds_usdt = False
+            energy = USDT_ENERGY_EXISTING if holds_usdt else USDT_ENERGY_NEW
+
+        with self._lock:
+            self._recipient_energy[to_address] = (energy, time.time())
+        return energy
+
+    def mark_recipient_funded(self, to_address: str):
+        """收款方收到USDT后，后续转账不再需要新建存储槽"""
+        with self._lock:
+            cached = self._recipient_energy.get(to_address)
+            if cached and cached[0] > USDT_ENERGY_EXISTING:
+                self._recipient_energy.pop(to_address, None)
+
+    def bandwidth_burn(self, address: str, tx_bytes: int) -> int:
+        """一笔交易需燃烧的带宽费用（sun），质押和免费带宽够用时为 0，与USDT规划的算法一致"""
+        resources = self.get_resources(address)
+        if resources['available_bandwidth'] + resources['available_free_bandwidth'] >= tx_bytes:
+            return 0
+        return tx_bytes * self.get_prices()[1]
+
+    def plan_usdt_transfers(self, from_address: str, transfers: List[Tuple[str, int]]) -> Dict:
+        """为一笔或一批USDT转账规划资源
+
+        transfers 为 [(收款地址, 最小单位金额)]。质押能量按顺序分配，
+        不足部分在允许燃烧时计算需燃烧的TRX以及每笔交易所需的 fee_limit。
+        """
+        resources = self.get_resources(from_address)
+        energy_fee, bandwidth_fee = self.get_prices()
+
+        energy_left = resources['available_energy']
+        bandwidth_left = resources['available_bandwidth'] + resources['available_free_bandwidth']
+        items = []
+        energy_needed = burn_sun = 0
+        for to_address, amount_sun in transfers:
+            energy = self.estimate_usdt_energy(from_address, to_address, amount_sun)
+            staked = min(energy, energy_left)
+            energy_left -= staked
+            item_burn = (energy - staked) * energy_fee
+            if bandwidth_left >= USDT_TX_BYTES:
+                bandwidth_left -= USDT_TX_BYTES
+            else:
+                item_burn += USDT_TX_BYTES * bandwidth_fee
+            energy_needed += energy
+            burn_sun += item_burn
+            # 燃烧部分由 fee_limit 兜底，留出余量以免能量价格波动导致 OUT_OF_ENERGY
+            fee_limit = max(DEFAULT_FEE_LIMIT, math.ceil((energy - staked) * energy_fee * 1.2))
+            items.append({'to_address': to_address, 'energy': energy, 'burn_sun': item_burn, 'fee_limit': fee_limit})
+
+        shortfall = max(energy_needed - resources['available_energy'], 0)
+        plan = {
+            'ok': True,
+            'error': None,
+            'energy_needed': energy_needed,
+            'available_energy': resources['available_energy'],
+            'burn_trx': burn_sun / 1_000_000,
+            'items': items
+        }
+        if shortfall and not self.burn_enabled:
+            plan.update(ok=False, error=f"能源不足: {resources['available_energy']} < {energy_needed}")
+        elif burn_sun > resources['trx_balance']:
+            plan.update(ok=False, error=f"TRX不足以支付资源费用: 需 {burn_sun / 1_000_000:.2f} TRX")
+        elif shortfall and max(item['burn_sun'] for item in items) > self.burn_max_trx * 1_000_000:
+            plan.update(ok=False, error=f"单笔需燃烧的TRX超过上限 {self.burn_max_trx} TRX")
+        return plan
+
+    def affordable_transfers(self, address: str, energy_per_transfer: int = USDT_ENERGY_EXISTING) -> Dict:
+        """预测还能负担多少笔USDT转账：仅用质押能量的笔数，以及允许燃烧TRX时的总笔数"""
+        resources = self.get_resources(address)
+        energy_fee, bandwidth_fee = self.get_prices()
+        staked_count = resources['available_energy'] // energy_per_transfer
+
+        with_burn = staked_count
+        if self.burn_enabled:
+            # 质押能量用完后每笔都要燃烧全部能量（保守按带宽也需燃烧计算）
+            burn_per_transfer = energy_per_transfer * energy_fee + USDT_TX_BYTES * bandwidth_fee
+            leftover_energy = resources['available_energy'] - staked_count * energy_per_transfer
+            first_burn = (energy_per_transfer - leftover_energy) * energy_fee + USDT_TX_BYTES * bandwidth_fee
+            if resources['trx_balance'] >= first_burn:
+                with_burn += 1 + (resources['trx_balance'] - first_burn) // burn_per_transfer
+        return {
+            'available_energy': resources['available_energy'],
+            'energy_per_transfer': energy_per_transfer,
+            'staked': staked_count,
+            'with_burn': with_burn,
+            'burn_enabled': self.burn_enabled
+        }
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+分片监控队列
+多个监控工作进程按地址哈希分片拉取，新交易写入共享的SQLite队列，由通知进程统一发送。
+队列使用WAL模式，读写依赖同机共享内存，所有进程须在同一台机器上（不支持经网络文件系统跨主机共享）。
+分片归属用 rendezvous 哈希在存活的工作进程之间计算，工作进程心跳超时后其地址自动由其余进程接管。
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+
+def shard_owner(address: str, workers: List[str]) -> Optional[str]:
+    """rendezvous 哈希：地址归属得分最高的工作进程，增减进程时只有相关地址会迁移"""
+    best, best_score = None, None
+    for worker_id in workers:
+        score = hashlib.sha256(f"{worker_id}:{address}".encode()).digest()
+        if best_score is None or score > best_score:
+            best, best_score = worker_id, score
+    return best
+
+
+def default_worker_id() -> str:
+    """主机名 + 进程号"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ShardQueue:
+    """共享队列（SQLite）：工作进程注册和心跳、新交易入队、通知进程取出发送"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path or os.getenv('SHARD_DB_PATH', 'shards.db')
+        self.heartbeat_timeout = float(os.getenv('SHARD_HEARTBEAT_TIMEOUT', '30'))
+        self.retention = float(os.getenv('SHARD_QUEUE_RETENTION', '86400'))
+        # 每个监控地址保留最近多少个去重键：轮询每次只取最近 MONITOR_FETCH_LIMIT 条（TRC20、TRX 各一个列表），
+        # 更早的交易不会再被拉到，默认留 4 倍余量；超出的已发送记录过了保留期即删除
+        fetch_limit = int(os.getenv('MONITOR_FETCH_LIMIT', '50'))
+        self.keys_per_address = int(os.getenv('SHARD_KEYS_PER_ADDRESS', str(fetch_limit * 4)))
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+    def _init_schema(self):
+        """创建表和索引"""
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS shard_workers (
+                    worker_id TEXT PRIMARY KEY,
+                    host TEXT NOT NULL,
+                    pid INTEGER NOT NULL,
+                    started_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL,
+                    addresses INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # txid 列存去重键（转入为txid，转出为 txid:out）：分片迁移期间两个进程拉到同一笔交易时只入队一次；
+            # 每个监控地址（address 列）最近的键一直保留，重启或迁移后的进程不会重复提醒仍在轮询范围内的旧交易
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS transfer_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    txid TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    worker_id TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    delivered_at REAL,
+                    address TEXT
+                )
+            """)
+            # 旧库升级：按监控地址保留去重键，能从内容取回地址的旧记录补上，内容已清空的在清理时删除
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(transfer_queue)")}
+            if 'address' not in columns:
+                self._conn.execute("ALTER TABLE transfer_queue ADD COLUMN address TEXT")
+                self._conn.execute(
+                    "UPDATE transfer_queue SET address = json_extract(payload, '$.address') WHERE payload != ''"
+                )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_queue_pending ON transfer_queue (delivered_at, id)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_queue_address ON transfer_queue (address, id)"
+            )
+
+    def heartbeat(self, worker_id: str, addresses: int = 0):
+        """注册或刷新工作进程心跳"""
+        host, _, pid = worker_id.rpartition(':')
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO shard_workers (worker_id, host, pid, started_at, heartbeat_at, addresses) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at, "
+                "addresses = excluded.addresses",
+                (worker_id, host or worker_id, int(pid) if pid.isdigit() else 0, now, now, addresses)
+            )
+
+    def unregister(self, worker_id: str):
+        """工作进程正常退出时注销，其余进程立即接管它的地址"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM shard_workers WHERE worker_id = ?", (worker_id,))
+
+    def live_workers(self) -> List[str]:
+        """心跳未超时的工作进程"""
+        cutoff = time.time() - self.heartbeat_timeout
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker_id FROM shard_workers WHERE heartbeat_at >= ? ORDER BY worker_id", (cutoff,)
+            ).fetchall()
+        return [row['worker_id'] for row in rows]
+
+    def enqueue(self, transfer: Dict, worker_id: str, key: Optional[str] = None) -> bool:
+        """新交易入队，key 为去重键（默认txid），已入队过的交易返回 False"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO transfer_queue (txid, payload, worker_id, created_at, address) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key or transfer['txid'], json.dumps(transfer, ensure_ascii=False), worker_id, time.time(),
+                 transfer.get('address'))
+            )
+        return cursor.rowcount > 0
+
+    def is_queued(self, txid: str) -> bool:
+        """交易是否已由某个工作进程入队过（保留期内）"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM transfer_queue WHERE txid = ?", (txid,)
+            ).fetchone() is not None
+
+    def queued_keys(self) -> Set[str]:
+        """每个监控地址最近入队的去重键（最多 keys_per_address 个），工作进程启动时用来预置已处理交易"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT txid FROM (SELECT txid, ROW_NUMBER() OVER (PARTITION BY address ORDER BY id DESC) AS rank "
+                "FROM transfer_queue) WHERE rank <= ?", (self.keys_per_address,)
+            ).fetchall()
+        return {row['txid'] for row in rows}
+
+    def pending(self, limit: int = 100) -> List[Tuple[int, Dict]]:
+        """按入队顺序取待发送的交易"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM transfer_queue WHERE delivered_at IS NULL ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row['id'], json.loads(row['payload'])) for row in rows]
+
+    def mark_delivered(self, queue_id: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE transfer_queue SET delivered_at = ? WHERE id = ?", (time.time(), queue_id)
+            )
+
+    def prune(self) -> int:
+        """删除超过保留期、且不在所属地址最近 keys_per_address 个键内的已发送记录，清理长期无心跳的工作进程"""
+        now = time.time()
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM transfer_queue WHERE delivered_at IS NOT NULL AND delivered_at < ? AND id NOT IN ("
+                "SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY address ORDER BY id DESC) AS rank "
+                "FROM transfer_queue WHERE address IS NOT NULL) WHERE rank <= ?)",
+                (now - self.retention, self.keys_per_address)
+            ).rowcount
+            self._conn.execute(
+                "DELETE FROM shard_workers WHERE heartbeat_at < ?", (now - self.heartbeat_timeout * 10,)
+            )
+        return deleted
+
+    def status(self) -> Dict:
+        """工作进程和队列概况"""
+        cutoff = time.time() - self.heartbeat_timeout
+        with self._lock:
+            workers = [dict(row) for row in self._conn.execute(
+                "SELECT worker_id, host, pid, started_at, heartbeat_at, addresses FROM shard_workers "
+                "ORDER BY worker_id"
+            ).fetchall()]
+            pending = self._conn.execute(
+                "SELECT COUNT(*) FROM transfer_queue WHERE delivered_at IS NULL"
+            ).fetchone()[0]
+        for worker in workers:
+            worker['alive'] = worker['heartbeat_at'] >= cutoff
+        return {'workers': workers, 'pending': pending}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+分片监控工作进程
+每个进程只拉取 rendezvous 哈希分给自己的监控地址，新交易写入共享队列（SHARD_DB_PATH），
+由开启 SHARD_MODE 的主程序统一发送通知。所有工作进程和主程序须运行在同一台机器上：
+队列是WAL模式的SQLite，依赖同机共享内存，不能放在网络文件系统上跨主机共享。
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from typing import List, Optional
+from dotenv import load_dotenv
+
+# 导入自定义模块
+from shard_queue import ShardQueue, shard_owner, default_worker_id
+from tron_monitor import transfer_key
+from log_setup import setup_logging
+
+# 加载环境变量
+load_dotenv()
+
+class ShardWorker:
+    """分片拉取：心跳线程维护存活进程列表，主循环只处理归属自己的地址"""
+
+    def __init__(self, monitor, queue: ShardQueue, worker_id: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.monitor = monitor
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.heartbeat_interval = float(os.getenv('SHARD_HEARTBEAT_INTERVAL', '5'))
+        self.running = False
+        self._live: List[str] = [self.worker_id]
+        self._owned: List[str] = []
+        self._stop = threading.Event()
+
+    def _refresh_workers(self):
+        """刷新心跳并读取存活进程（自己总在列表中）"""
+        self.queue.heartbeat(self.worker_id, len(self._owned))
+        live = self.queue.live_workers()
+        if self.worker_id not in live:
+            live.append(self.worker_id)
+        if live != self._live:
+            self.logger.info(f"分片成员变化: {len(self._live)} -> {len(live)} 个工作进程")
+        self._live = live
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self._refresh_workers()
+            except Exception as e:
+                self.logger.error(f"分片心跳失败: {e}")
+
+    def is_owner(self, address: str) -> bool:
+        return shard_owner(address, self._live) == self.worker_id
+
+    def owned_addresses(self) -> List[str]:
+        """当前归属自己的监控地址"""
+        return [address for address in self.monitor.get_monitor_addresses() if self.is_owner(address)]
+
+    def run_cycle(self) -> int:
+        """拉取一轮归属地址，返回新入队的交易数"""
+        owned = self.owned_addresses()
+        if set(owned) != set(self._owned):
+            gained = len(set(owned) - set(self._owned))
+            lost = len(set(self._owned) - set(owned))
+            self.logger.info(f"分片重新分配: 负责 {len(owned)} 个地址（新增 {gained}，移交 {lost}）")
+        self._owned = owned
+
+        queued = 0
+        for address in owned:
+            if not self.running:
+                break
+            # 轮询途中有进程加入或退出时，已不归属自己的地址交给新的归属进程
+            if not self.is_owner(address):
+                continue
+            for transfer in self.monitor.iter_new_transfers([address]):
+                if self.queue.enqueue(transfer, self.worker_id, transfer_key(transfer)):
+                    queued += 1
+        return queued
+
+    def seed_seen(self) -> int:
+        """第一轮轮询前把共享队列中各地址最近入队的交易标记为已处理，重启或接管地址后不重复入队旧交易"""
+        keys = self.queue.queued_keys()
+        with self.monitor.state_lock:
+            self.monitor.processed_transactions |= keys
+        return len(keys)
+
+    def run(self):
+        """主循环，直到 stop() 被调用"""
+        self.running = True
+        self.logger.info(f"已从共享队列载入 {self.seed_seen()} 笔已入队交易")
+        self._refresh_workers()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='shard-heartbeat', daemon=True)
+        heartbeat.start()
+        self.logger.info(f"分片工作进程启动: {self.worker_id}")
+        try:
+            while self.running:
+                try:
+                    queued = self.run_cycle()
+                    if queued:
+                        self.logger.info(f"本轮入队 {queued} 笔新交易")
+                except Exception as e:
+                    self.logger.error(f"分片轮询出错: {e}")
+                self._stop.wait(int(os.getenv('MONITOR_INTERVAL', '30')))
+        finally:
+            self._stop.set()
+            self.queue.unregister(self.worker_id)
+            self.logger.info(f"分片工作进程退出: {self.worker_id}")
+
+    def stop(self, *args):
+        self.running = False
+        self._stop.set()
+
+
+def run_worker(api_key: Optional[str] = None):
+    """单个工作进程入口"""
+    if api_key:
+        os.environ['TRON_API_KEY'] = api_key
+    setup_logging()
+    from tron_monitor import TronUSDTMonitor
+
+    queue = ShardQueue()
+    worker = ShardWorker(TronUSDTMonitor(), queue)
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+    worker.run()
+    queue.close()
+
+
+def print_status():
+    status = ShardQueue().status()
+    now = time.time()
+    print(f"待发送: {status['pending']} 笔")
+    for worker in status['workers']:
+        state = '存活' if worker['alive'] else '超时'
+        print(f"{worker['worker_id']}  {state}  地址 {worker['addresses']}  "
+              f"心跳 {now - worker['heartbeat_at']:.0f} 秒前")
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="分片监控工作进程")
+    parser.add_argument('--processes', type=int, default=1, help="本机启动的工作进程数")
+    parser.add_argument('--status', action='store_true', help="显示工作进程和队列状态后退出")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status()
+        return
+
+    if args.processes <= 1:
+        run_worker()
+        return
+
+    # 多进程：TRON_API_KEYS（逗号分隔）轮流分给各进程，分摊请求配额
+    api_keys = [key.strip() for key in os.getenv('TRON_API_KEYS', '').split(',') if key.strip()]
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(api_keys[i % len(api_keys)] if api_keys else None,),
+                                name=f'shard-worker-{i}')
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def terminate(*_):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGINT, terminate)
+    signal.signal(signal.SIGTERM, terminate)
+    for process in processes:
+        process.join()
+
+    if any(process.exitcode and process.exitcode > 0 for process in processes):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
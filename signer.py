@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+钱包签名器
+进程内只解密一次私钥，密钥保存在锁定内存（不换出到磁盘）中，缓存钱包地址，退出时清零
+"""
+
+import os
+import atexit
+import ctypes
+import ctypes.util
+import logging
+import subprocess
+import threading
+from typing import List, Optional
+from tronpy.keys import PrivateKey
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+_KEY_SIZE = 32
+
+
+def _libc():
+    """加载 libc（非 Linux/macOS 平台返回 None）"""
+    try:
+        return ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    except Exception:
+        return None
+
+
+class WalletSigner:
+    """私钥签名器
+
+    未指定 key_hex / key_file 时，私钥来源与以前一致：TRON_PRIVATE_KEY 环境变量，
+    或 TRON_PRIVATE_KEY_FILE 指向的 GPG 加密文件。
+    默认在启动时解密；SIGNER_LAZY_UNLOCK=true 时首次签名才解密。
+    配置了钱包地址时，懒加载模式下查询地址也无需解密（解密后会核对一致）。
+    """
+
+    def __init__(self, key_hex: Optional[str] = None, key_file: Optional[str] = None,
+                 address: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._key: Optional[bytearray] = None
+        self._key_view = None
+        self._private_key: Optional[PrivateKey] = None
+        self._locked_memory = False
+        self._closed = False
+        self._key_hex = key_hex
+        self._key_file = key_file
+        if key_hex is None and key_file is None:
+            address = address or os.getenv('TRON_WALLET_ADDRESS')
+        self._address: Optional[str] = address or None
+        self.lazy = os.getenv('SIGNER_LAZY_UNLOCK', 'false').lower() == 'true'
+        atexit.register(self.close)
+
+    def _read_key_hex(self) -> Optional[bytes]:
+        """读取十六进制私钥（支持加密存储）"""
+        # 方法1：直接配置的私钥（环境变量）
+        private_key_hex = self._key_hex
+        if private_key_hex is None and self._key_file is None:
+            private_key_hex = os.getenv('TRON_PRIVATE_KEY')
+        if private_key_hex:
+            return private_key_hex.encode()
+
+        # 方法2：从加密文件获取私钥
+        encrypted_file = self._key_file or os.getenv('TRON_PRIVATE_KEY_FILE', 'private_key.txt.gpg')
+        if os.path.exists(encrypted_file):
+            try:
+                gpg_passphrase = os.getenv('GPG_PASSPHRASE')
+                result = subprocess.run(
+                    [
+                        'gpg', '--batch', '--yes',
+                        '--pinentry-mode', 'loopback',
+                        f'--passphrase={gpg_passphrase}',
+                        '--decrypt', encrypted_file
+                    ],
+                    capture_output=True,
+                    check=True
+                )
+                return result.stdout.strip()
+            except subprocess.CalledProcessError as e:
+                self.logger.error(f"解密私钥文件失败: {e}")
+                return None
+
+        self.logger.error("未找到私钥配置")
+        return None
+
+    def _store_key(self, key_bytes: bytes):
+        """把私钥放入固定大小的缓冲区并尝试锁定内存页"""
+        self._key = bytearray(_KEY_SIZE)
+        self._key_view = (ctypes.c_char * _KEY_SIZE).from_buffer(self._key)
+        self._key[:] = key_bytes
+        libc = _libc()
+        if libc is not None:
+            self._locked_memory = libc.mlock(ctypes.addressof(self._key_view), ctypes.c_size_t(_KEY_SIZE)) == 0
+        if not self._locked_memory:
+            self.logger.warning("无法锁定私钥所在内存页，私钥可能被换出到磁盘")
+
+    def unlock(self) -> bool:
+        """解密并加载私钥（每个进程只做一次），返回是否可用"""
+        if self._key is not None:
+            return True
+        with self._lock:
+            if self._key is not None:
+                return True
+            if self._closed:
+                return False
+            try:
+                key_hex = self._read_key_hex()
+                if not key_hex:
+                    return False
+                private_key = PrivateKey(bytes.fromhex(key_hex.decode()))
+                address = private_key.public_key.to_base58check_address()
+                if self._address and self._address != address:
+                    self.logger.error(f"私钥与配置的钱包地址不一致: {address} != {self._address}")
+                    return False
+                self._store_key(private_key.to_bytes())
+                # 密钥对象只构造一次，签名时复用；配置的明文私钥不再保留
+                self._private_key = private_key
+                self._key_hex = None
+                self._address = address
+                self.logger.info(f"私钥已加载: {address}")
+                return True
+            except Exception as e:
+                self.logger.error(f"获取私钥失败: {e}")
+                return False
+
+    @property
+    def address(self) -> Optional[str]:
+        """钱包地址（缓存，未配置地址时首次访问会解密私钥）"""
+        if self._address is None:
+            self.unlock()
+        return self._address
+
+    def sign(self, txn):
+        """签名交易：持锁使用解密时构造的密钥对象，不会与 close 并发"""
+        if not self.unlock():
+            raise ValueError("私钥不可用，无法签名")
+        with self._lock:
+            if self._private_key is None:
+                raise ValueError("私钥已清除，无法签名")
+            return txn.sign(self._private_key)
+
+    def close(self):
+        """清零并解锁私钥缓冲区"""
+        with self._lock:
+            self._closed = True
+            self._private_key = None
+            if self._key is None:
+                return
+            ctypes.memset(ctypes.addressof(self._key_view), 0, _KEY_SIZE)
+            if self._locked_memory:
+                libc = _libc()
+                if libc is not None:
+                    libc.munlock(ctypes.addressof(self._key_view), ctypes.c_size_t(_KEY_SIZE))
+            self._key_view = None
+            self._key = None
+            self._locked_memory = False
+            self.logger.info("私钥缓冲区已清零")
+
+
+def load_signers() -> List[WalletSigner]:
+    """按配置加载签名钱包池
+
+    TRON_PRIVATE_KEYS（私钥，逗号分隔）和 TRON_PRIVATE_KEY_FILES（GPG加密文件，逗号分隔）
+    中的每一项对应一个付款钱包；都未配置时只使用单个私钥（TRON_PRIVATE_KEY / TRON_PRIVATE_KEY_FILE）。
+    """
+    keys = [key.strip() for key in os.getenv('TRON_PRIVATE_KEYS', '').split(',') if key.strip()]
+    files = [path.strip() for path in os.getenv('TRON_PRIVATE_KEY_FILES', '').split(',') if path.strip()]
+    signers = [WalletSigner(key_hex=key) for key in keys] + [WalletSigner(key_file=path) for path in files]
+    return signers or [WalletSigner()]
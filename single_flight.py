@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+相同查询合并（single-flight）
+同一时刻多个相同的只读查询（如多人同时 /balance）只执行一次，其余调用等待同一个结果，
+上游请求量与同时查看的人数无关。
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from metrics import COALESCED_REQUESTS
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """按键合并进行中的协程调用（在同一个事件循环中使用）"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]], label: str = '') -> T:
+        """执行 fn()；已有相同 key 的调用在进行时直接等待它的结果（异常同样共享）"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            COALESCED_REQUESTS.inc(view=label or str(key))
+        # 某个等待方被取消时不影响共享的执行和其他等待方
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, done: asyncio.Future):
+        if self._inflight.get(key) is done:
+            del self._inflight[key]
+        # 所有等待方都已取消时，避免“异常未被读取”的警告
+        if not done.cancelled():
+            done.exception()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+运行时状态快照
+把 TronUSDTMonitor 的内存状态（已处理交易、余额缓存、各地址最后同步时间）定时和退出时写成紧凑的
+二进制文件，启动时用 mmap 读回，重启后的第一轮轮询与稳态轮询一样只处理真正的新交易，不会重复提醒。
+
+文件格式（小端，版本 1）：
+- 头部：魔数 b'TMSS'、版本、保留位、保存时间、已处理交易数、地址数、正文 CRC32
+- 已处理交易：每条 33 字节，txid 的 32 字节原始值 + 方向（0 转入 / 1 转出）
+- 地址：每条 58 字节，34 字节地址 + 余额、余额查询时间、最后同步时间（float64，缺失为 NaN）
+版本或校验不符时忽略快照冷启动。
+"""
+
+import os
+import mmap
+import math
+import time
+import zlib
+import struct
+import logging
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+from tron_monitor import OUTBOUND
+
+# 加载环境变量
+load_dotenv()
+
+MAGIC = b'TMSS'
+VERSION = 1
+HEADER = struct.Struct('<4sHHdIII')
+SEEN_RECORD = struct.Struct('<32sB')
+ADDRESS_RECORD = struct.Struct('<34sddd')
+_OUT_SUFFIX = ':' + OUTBOUND
+_NAN = float('nan')
+
+
+class StateSnapshot:
+    """监控器运行时状态的二进制快照（STATE_SNAPSHOT_PATH 为空时不启用）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = path if path is not None else os.getenv('STATE_SNAPSHOT_PATH', 'monitor_state.bin')
+        self.interval = float(os.getenv('STATE_SNAPSHOT_INTERVAL', '60'))
+        self.last_saved = 0.0
+
+    def encode(self, monitor) -> bytes:
+        """把监控器状态编码为快照内容"""
+        # 持监控器的状态锁复制一份再编码：轮询和机器人查询线程写入时也持这把锁，
+        # 复制期间集合不会变化，编码耗时不占用锁
+        with monitor.state_lock:
+            seen = tuple(monitor.processed_transactions)
+            balances = dict(monitor.balance_cache)
+            synced = dict(monitor.last_synced)
+
+        body = bytearray()
+        count = 0
+        for key in seen:
+            txid, _, direction = key.partition(':')
+            try:
+                raw = bytes.fromhex(txid)
+            except ValueError:
+                continue
+            if len(raw) != 32:
+                continue
+            body += SEEN_RECORD.pack(raw, 1 if direction == OUTBOUND else 0)
+            count += 1
+
+        addresses = [address for address in set(balances) | set(synced) if len(address) == 34]
+        for address in addresses:
+            balance, balance_at = balances.get(address, (_NAN, _NAN))
+            body += ADDRESS_RECORD.pack(address.encode('ascii'), balance, balance_at, synced.get(address, _NAN))
+
+        header = HEADER.pack(MAGIC, VERSION, 0, time.time(), count, len(addresses), zlib.crc32(body))
+        return header + bytes(body)
+
+    def save(self, monitor) -> Optional[int]:
+        """写入快照（先写临时文件再替换），返回写入字节数"""
+        if not self.path:
+            return None
+        try:
+            data = self.encode(monitor)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.last_saved = time.time()
+            return len(data)
+        except Exception as e:
+            self.logger.error(f"写入状态快照失败: {e}")
+            return None
+
+    def maybe_save(self, monitor) -> Optional[int]:
+        """距上次保存超过 STATE_SNAPSHOT_INTERVAL 秒时保存"""
+        if time.time() - self.last_saved >= self.interval:
+            return self.save(monitor)
+        return None
+
+    def load(self) -> Optional[Dict]:
+        """mmap 读取快照，返回 {'saved_at', 'seen', 'balances', 'synced'}；不存在或无效时返回 None"""
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                self.logger.warning(f"状态快照不完整，忽略: {self.path}")
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, version, _, saved_at, seen_count, address_count, crc = HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or version != VERSION:
+                    self.logger.warning(f"状态快照版本不符（{magic!r} v{version}），忽略: {self.path}")
+                    return None
+                seen_end = HEADER.size + seen_count * SEEN_RECORD.size
+                end = seen_end + address_count * ADDRESS_RECORD.size
+                view = memoryview(mm)
+                try:
+                    if len(mm) != end or zlib.crc32(view[HEADER.size:end]) != crc:
+                        self.logger.warning(f"状态快照校验失败，忽略: {self.path}")
+                        return None
+                    seen = {raw.hex() + _OUT_SUFFIX if direction else raw.hex()
+                            for raw, direction in SEEN_RECORD.iter_unpack(view[HEADER.size:seen_end])}
+                    balances, synced = {}, {}
+                    for raw, balance, balance_at, last_synced in ADDRESS_RECORD.iter_unpack(view[seen_end:end]):
+                        address = raw.decode('ascii')
+                        if not math.isnan(balance):
+                            balances[address] = (balance, balance_at)
+                        if not math.isnan(last_synced):
+                            synced[address] = last_synced
+                finally:
+                    view.release()
+        return {'saved_at': saved_at, 'seen': seen, 'balances': balances, 'synced': synced}
+
+    def restore(self, monitor) -> bool:
+        """把快照合并进监控器状态"""
+        start = time.perf_counter()
+        try:
+            state = self.load()
+        except Exception as e:
+            self.logger.error(f"读取状态快照失败，冷启动: {e}")
+            return False
+        if state is None:
+            return False
+        with monitor.state_lock:
+            monitor.processed_transactions |= state['seen']
+            for address, (balance, balance_at) in state['balances'].items():
+                monitor.balance_cache.setdefault(address, (balance, balance_at))
+            for address, last_synced in state['synced'].items():
+                monitor.last_synced.setdefault(address, last_synced)
+        age = time.time() - state['saved_at']
+        self.logger.info(f"已恢复状态快照: {len(state['seen'])} 笔已处理交易、{len(state['balances'])} 个余额，"
+                         f"快照保存于 {age:.0f} 秒前，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        return True
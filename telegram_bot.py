@@ -8,16 +8,24 @@ import os
 import logging
 import asyncio
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Awaitable, Set
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
-from telegram.error import Forbidden, NetworkError, TimedOut
+from telegram.error import BadRequest, Forbidden, NetworkError, TimedOut
 from dotenv import load_dotenv
 
 # 导入自定义模块
 from tron_monitor import TronUSDTMonitor
 from wallet_operations import TronWallet
 from address_manager import AddressManager
+from batch_payout import BatchPayoutEngine, parse_payout_csv
+from receipt_tracker import ReceiptTracker
+from log_setup import setup_logging
+from webhook_server import WebhookServer
+from latency_tracer import LatencyTracer
+from circuit_breaker import BREAKERS
+from single_flight import SingleFlight
+from paginator import PageCache, page_slice, join_page, page_keyboard, parse_page_callback, NOOP_CALLBACK
 
 # 加载环境变量
 load_dotenv()
@@ -25,7 +33,7 @@ load_dotenv()
 class TelegramBot:
     """简化Telegram机器人"""
     
-    def __init__(self):
+    def __init__(self, tron_monitor: Optional[TronUSDTMonitor] = None):
         self.logger = logging.getLogger(__name__)
         
         # 获取配置
@@ -38,11 +46,34 @@ class TelegramBot:
         
         # 初始化组件
         self.address_manager = AddressManager()
-        self.tron_monitor = TronUSDTMonitor()
+        # 与监控循环共用同一个监控器，/balance、/latest 读到的是轮询维护的余额缓存和同步状态
+        self.tron_monitor = tron_monitor or TronUSDTMonitor()
         self.wallet_operations = TronWallet()
+        self.batch_engine = BatchPayoutEngine(self.wallet_operations)
+        self.receipt_tracker = ReceiptTracker(self.wallet_operations, self._on_transfer_receipt)
+        # 入账通知延迟追踪（监控循环写入，/perf 查看）
+        self.latency_tracer = LatencyTracer()
+        # /balance、/latest 的分页渲染缓存（按页内数据版本失效）
+        self.pages = PageCache()
+        # 多人同时查询同一页时只查一次上游（BOT_SINGLE_FLIGHT=false 关闭）
+        self.single_flight = None
+        if os.getenv('BOT_SINGLE_FLIGHT', 'true').lower() == 'true':
+            self.single_flight = SingleFlight()
+        # 后台执行中的转账任务：事件循环只持有任务的弱引用，需要保留引用直到完成
+        self._transfer_tasks: Set[asyncio.Task] = set()
         
         # 初始化机器人
-        self.application = Application.builder().token(self.bot_token).build()
+        builder = Application.builder().token(self.bot_token)
+        # 自建 Bot API 服务或压测用的模拟服务
+        api_base_url = os.getenv('TELEGRAM_API_BASE_URL')
+        if api_base_url:
+            api_base_url = api_base_url.rstrip('/')
+            builder = builder.base_url(f"{api_base_url}/bot").base_file_url(f"{api_base_url}/file/bot")
+        # 并发处理更新数（默认逐条处理，转账命令和确认回调不会并发执行）
+        concurrent_updates = int(os.getenv('TELEGRAM_CONCURRENT_UPDATES', '1'))
+        if concurrent_updates > 1:
+            builder = builder.concurrent_updates(concurrent_updates)
+        self.application = builder.build()
         self._setup_handlers()
         
         self.logger.info("简化Telegram机器人初始化完成")
@@ -56,12 +87,23 @@ class TelegramBot:
         self.application.add_handler(CommandHandler("help", self.help_command))
         self.application.add_handler(CommandHandler("status", self.status_command))
         # 监控相关命令
-        self.application.add_handler(CommandHandler("balance", self.balance_command))
-        self.application.add_handler(CommandHandler("latest", self.latest_transaction_command))
+        # 只读查询开启 single-flight 时不阻塞更新分发：逐条处理更新时同时到达的查询也能合并
+        block = self.single_flight is None
+        self.application.add_handler(CommandHandler("balance", self.balance_command, block=block))
+        self.application.add_handler(CommandHandler("latest", self.latest_transaction_command, block=block))
+        self.application.add_handler(CommandHandler("history", self.history_command))
+        self.application.add_handler(CommandHandler("stats", self.stats_command))
+        self.application.add_handler(CommandHandler("perf", self.perf_command))
         self.application.add_handler(CommandHandler("whitelist", self.whitelist_command))
         # 钱包相关命令
         self.application.add_handler(CommandHandler("wallet_balance", self.wallet_balance_command))
         self.application.add_handler(CommandHandler("transfer", self.transfer_command))
+        self.application.add_handler(CommandHandler("batch_transfer", self.batch_transfer_command))
+        self.application.add_handler(MessageHandler(
+            filters.Document.FileExtension("csv") & filters.CaptionRegex(r'^/batch_transfer'),
+            self.batch_transfer_command
+        ))
+        self.application.add_handler(CommandHandler("batch_resume", self.batch_resume_command))
         # 回调查询处理器
         self.application.add_handler(CallbackQueryHandler(self.button_callback))
         # 错误处理器
@@ -82,9 +124,13 @@ class TelegramBot:
 /status - 显示监控状态
 /balance - 查询监控地址余额
 /latest - 显示最新交易
+/history - 查询地址入账历史
+/stats - 入账统计
+/perf - 通知延迟统计
 /whitelist - 显示白名单地址
 /wallet_balance - 查询钱包余额
 /transfer - 转账到白名单地址
+/batch_transfer - 批量转账到白名单地址
 
 💡 提示：白名单地址在 .env 文件中配置
         """
@@ -103,11 +149,16 @@ class TelegramBot:
 🔍 监控命令：
 /balance - 查询所有监控地址的USDT余额
 /latest - 显示监控地址的最新交易记录
+/history <序号/地址> [条数] - 查询地址入账历史和每日汇总
+/stats [序号/地址] [today/week/month] - 入账统计（总额、来源排行、分时段）
+/perf [分钟] - 入账通知各阶段延迟分位数（索引、去重、排队、发送）
 /status - 显示监控服务状态
 
 💰 钱包命令：
 /wallet_balance - 查询钱包TRX和USDT余额
 /transfer - 转账到白名单地址（支持序号、别名、地址）
+/batch_transfer [USDT/TRX] - 批量转账，命令后换行逐行填写"别名,金额"，或上传CSV并以该命令作为说明
+/batch_resume <批次号> - 续跑批次中失败的转账
 
 📋 管理命令：
 /whitelist - 显示当前白名单地址列表
@@ -142,7 +193,9 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
 📊 监控状态
 
 📡 监控地址：{len(monitor_addresses)} 个
+🪙 监控代币：{', '.join(self.tron_monitor.token_registry.symbols())}
 ✅ 白名单地址：{len(whitelist_addresses)} 个
+🔌 上游状态：{self._upstream_status()}
 🕐 当前时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 💡 提示：使用 /balance 查看余额，/latest 查看最新交易
@@ -154,6 +207,105 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
             self.logger.error(f"获取状态失败: {e}")
             await update.message.reply_text("❌ 获取状态失败")
     
+    def _upstream_status(self) -> str:
+        """熔断中的上游端点，/status 展示用"""
+        open_endpoints = BREAKERS.open_endpoints()
+        if not open_endpoints:
+            return "正常"
+        return f"⚠️ {len(open_endpoints)} 个端点熔断（{', '.join(open_endpoints)}），查询返回缓存数据"
+    
+    async def _render_view(self, view: str, page: int, context: ContextTypes.DEFAULT_TYPE):
+        """渲染分页视图的一页，返回 (文本, 内联键盘)"""
+        if view == 'whitelist':
+            text, page, pages = self.address_manager.format_whitelist_page(page)
+            return text, page_keyboard(view, page, pages)
+        if view == 'addresses':
+            token_type = context.user_data.get("transfer_token", "USDT")
+            text, page, pages = self.address_manager.format_address_list_page(
+                page,
+                prefix=f"已选择币种：{token_type}\n\n",
+                footer=("\n请输入转账命令：\n/transfer <序号/别名/地址> <金额> <备注(可选)>\n"
+                        "如：/transfer 1 10 测试")
+            )
+            return text, page_keyboard(view, page, pages)
+        if view in ('balance', 'latest'):
+            render_page = self._balance_page if view == 'balance' else self._latest_page
+            if not self.single_flight:
+                return await asyncio.to_thread(render_page, page)
+            return await self.single_flight.do((view, page), lambda: asyncio.to_thread(render_page, page), view)
+        raise ValueError(f"未知的分页视图: {view}")
+    
+    @staticmethod
+    def _format_time(ts) -> str:
+        if isinstance(ts, (int, float)) and ts > 1e10:
+            ts = int(ts / 1000)
+        return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else '未知'
+    
+    def _balance_page(self, page: int):
+        """余额视图的一页：只查询本页地址，余额不变时复用渲染结果"""
+        addresses, page, pages = page_slice(self.tron_monitor.get_monitor_addresses(), page)
+        infos = []
+        for address in addresses:
+            try:
+                infos.append((address, self.tron_monitor.get_balance_info(address)))
+            except Exception as e:
+                self.logger.error(f"查询地址 {address} 余额失败: {e}")
+                infos.append((address, None))
+        version = tuple((address, tuple(info.values()) if info else None) for address, info in infos)
+        
+        def render():
+            entries = []
+            for address, info in infos:
+                entry = f"📍 {address[:10]}...{address[-10:]}\n"
+                if info is None:
+                    entry += "   ❌ 查询失败\n\n"
+                elif info['balance'] is None:
+                    entry += "   ⚠️ 上游不可用，暂无缓存余额\n\n"
+                elif info['stale']:
+                    entry += f"   💵 USDT: {info['balance']:,.2f}\n"
+                    entry += f"   ⚠️ 上游不可用，余额查询于 {self._format_time(info['updated_at'])}\n\n"
+                else:
+                    entry += f"   💵 USDT: {info['balance']:,.2f}\n\n"
+                entries.append(entry)
+            return join_page("💰 监控地址余额\n\n", entries, page, pages), page_keyboard('balance', page, pages)
+        
+        return self.pages.get(('balance', page), version, render)
+    
+    def _latest_page(self, page: int):
+        """最新交易视图的一页：每个地址一条最新入账，本页数据不变时复用渲染结果"""
+        addresses, page, pages = page_slice(self.tron_monitor.get_monitor_addresses(), page)
+        rows = []
+        for address in addresses:
+            try:
+                latest_tx = self.tron_monitor.get_latest_transfer(address)
+            except Exception as e:
+                self.logger.error(f"查询地址 {address} 最新交易失败: {e}")
+                latest_tx = None
+            sync = self.tron_monitor.sync_status(address)
+            rows.append((address, latest_tx, sync['last_synced'] if sync['degraded'] else None, sync['degraded']))
+        version = tuple((address, tx['txid'] if tx else None, synced, degraded)
+                        for address, tx, synced, degraded in rows)
+        
+        def render():
+            entries, buttons = [], []
+            for address, tx, synced, degraded in rows:
+                entry = f"📍 {address[:10]}...{address[-10:]}\n"
+                if tx:
+                    entry += f"🕐 时间: {self._format_time(tx.get('timestamp', 0))}\n"
+                    entry += f"💰 金额: {tx['amount']} {tx.get('token', 'USDT')}\n"
+                    entry += f"🔗 交易哈希: {tx['txid'][:20]}...\n"
+                    buttons.append([InlineKeyboardButton(
+                        f"在区块链浏览器查看 {address[:6]}...{address[-4:]}",
+                        url=f"https://tronscan.org/#/transaction/{tx['txid']}")])
+                else:
+                    entry += "📭 暂无交易记录\n"
+                if degraded:
+                    entry += f"⚠️ 上游不可用，交易数据截至 {self._format_time(synced) if synced else '本次启动后尚未同步'}\n"
+                entries.append(entry + "\n")
+            return join_page("🧾 最新入账\n\n", entries, page, pages), page_keyboard('latest', page, pages, buttons)
+        
+        return self.pages.get(('latest', page), version, render)
+    
     async def balance_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """余额查询命令"""
         if not self._is_authorized(update.effective_user.id):
@@ -161,29 +313,14 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
             return
         
         try:
-            await update.message.reply_text("🔄 正在查询余额，请稍候...")
-            
-            # 获取监控地址
-            monitor_addresses = os.getenv('MONITOR_ADDRESSES', '').split(',')
-            monitor_addresses = [addr.strip() for addr in monitor_addresses if addr.strip()]
-            
-            if not monitor_addresses:
+            if not self.tron_monitor.get_monitor_addresses():
                 await update.message.reply_text("❌ 未配置监控地址")
                 return
             
-            balance_text = "💰 监控地址余额\n\n"
-            
-            for address in monitor_addresses:
-                try:
-                    balance = self.tron_monitor.get_address_balance(address)
-                    balance_text += f"📍 {address[:10]}...{address[-10:]}\n"
-                    balance_text += f"   💵 USDT: {balance:,.2f}\n\n"
-                except Exception as e:
-                    self.logger.error(f"查询地址 {address} 余额失败: {e}")
-                    balance_text += f"📍 {address[:10]}...{address[-10:]}\n"
-                    balance_text += f"   ❌ 查询失败\n\n"
-            
-            await update.message.reply_text(balance_text)
+            await update.message.reply_text("🔄 正在查询余额，请稍候...")
+            # 只查询第一页的地址，翻页时再查询对应页
+            text, reply_markup = await self._render_view('balance', 0, context)
+            await update.message.reply_text(text, reply_markup=reply_markup)
             
         except Exception as e:
             self.logger.error(f"余额查询失败: {e}")
@@ -195,38 +332,180 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
             await update.message.reply_text("❌ 您没有权限使用此机器人")
             return
         try:
-            await update.message.reply_text("🔄 正在查询最新交易，请稍候...")
+            # 最新交易从本地存储读取，无需等待提示；所有地址合成一条分页消息
+            if not self.tron_monitor.get_monitor_addresses():
+                await update.message.reply_text("❌ 未配置监控地址")
+                return
+            text, reply_markup = await self._render_view('latest', 0, context)
+            await update.message.reply_text(text, reply_markup=reply_markup)
+        except Exception as e:
+            self.logger.error(f"最新交易查询失败: {e}")
+            await update.message.reply_text("❌ 最新交易查询失败")
+    
+    async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """入账历史命令：/history <序号/地址> [条数]"""
+        if not self._is_authorized(update.effective_user.id):
+            await update.message.reply_text("❌ 您没有权限使用此机器人")
+            return
+        try:
             monitor_addresses = os.getenv('MONITOR_ADDRESSES', '').split(',')
             monitor_addresses = [addr.strip() for addr in monitor_addresses if addr.strip()]
             if not monitor_addresses:
                 await update.message.reply_text("❌ 未配置监控地址")
                 return
-            found = False
-            for address in monitor_addresses:
-                try:
-                    latest_tx = self.tron_monitor.get_latest_transfer(address)
-                    if latest_tx:
-                        found = True
-                        # 格式化时间戳
-                        ts = latest_tx.get('timestamp', 0)
-                        if isinstance(ts, (int, float)) and ts > 1e10:
-                            ts = int(ts / 1000)
-                        time_str = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else '未知'
-                        msg = f"📍 {address[:10]}...{address[-10:]}\n"
-                        msg += f"🕐 时间: {time_str}\n"
-                        msg += f"💰 金额: {latest_tx['amount']} USDT\n"
-                        msg += f"🔗 交易哈希: {latest_tx['txid'][:20]}..."
-                        # 构造按钮
-                        keyboard = [[InlineKeyboardButton("在区块链浏览器查看", url=f"https://tronscan.org/#/transaction/{latest_tx['txid']}")]]
-                        reply_markup = InlineKeyboardMarkup(keyboard)
-                        await update.message.reply_text(msg, reply_markup=reply_markup)
-                except Exception as e:
-                    self.logger.error(f"查询地址 {address} 最新交易失败: {e}")
-            if not found:
-                await update.message.reply_text("📭 所有监控地址暂无交易记录")
+            if not context.args:
+                address_list = "\n".join(
+                    f"{i}. {addr[:10]}...{addr[-10:]}" for i, addr in enumerate(monitor_addresses, 1)
+                )
+                await update.message.reply_text(
+                    f"📋 监控地址\n\n{address_list}\n\n请输入：/history <序号/地址> [条数]"
+                )
+                return
+            address = self._resolve_monitor_address(context.args[0], monitor_addresses)
+            if not address:
+                await update.message.reply_text("❌ 未找到监控地址，请检查序号或地址")
+                return
+            limit = 10
+            if len(context.args) >= 2:
+                if not context.args[1].isdigit() or not 0 < int(context.args[1]) <= 50:
+                    await update.message.reply_text("❌ 条数必须是1-50之间的整数")
+                    return
+                limit = int(context.args[1])
+            
+            history = self.tron_monitor.get_transfer_history(address, limit=limit)
+            daily_totals = self.tron_monitor.get_daily_totals(address, days=7)
+            
+            lines = [f"📜 入账历史\n📍 {address[:10]}...{address[-10:]}\n"]
+            if history:
+                for tx in history:
+                    ts = tx.get('timestamp', 0)
+                    if isinstance(ts, (int, float)) and ts > 1e10:
+                        ts = int(ts / 1000)
+                    time_str = datetime.fromtimestamp(ts).strftime('%m-%d %H:%M') if ts else '未知'
+                    lines.append(f"🕐 {time_str}  💰 {tx['amount']:,.2f} {tx.get('token', 'USDT')}  🔗 {tx['txid'][:10]}...")
+            else:
+                lines.append("📭 暂无入账记录")
+            lines.append("\n📊 近7日USDT入账汇总")
+            if daily_totals:
+                for day in daily_totals:
+                    lines.append(f"{day['day']}: {day['total']:,.2f} USDT（{day['count']} 笔）")
+            else:
+                lines.append("近7日无入账")
+            await update.message.reply_text("\n".join(lines))
         except Exception as e:
-            self.logger.error(f"最新交易查询失败: {e}")
-            await update.message.reply_text("❌ 最新交易查询失败")
+            self.logger.error(f"入账历史查询失败: {e}")
+            await update.message.reply_text("❌ 入账历史查询失败")
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """入账统计命令：/stats [序号/地址] [today|24h|week|month]"""
+        if not self._is_authorized(update.effective_user.id):
+            await update.message.reply_text("❌ 您没有权限使用此机器人")
+            return
+        try:
+            monitor_addresses = os.getenv('MONITOR_ADDRESSES', '').split(',')
+            monitor_addresses = [addr.strip() for addr in monitor_addresses if addr.strip()]
+            
+            period_names = {'today': '今日', '24h': '近24小时', 'week': '近7日', 'month': '近30日'}
+            period = 'today'
+            address = None
+            for arg in context.args or []:
+                if arg.lower() in period_names:
+                    period = arg.lower()
+                    continue
+                address = self._resolve_monitor_address(arg, monitor_addresses)
+                if not address:
+                    await update.message.reply_text(
+                        "❌ 参数无效\n\n用法：/stats [序号/地址] [today/24h/week/month]"
+                    )
+                    return
+            
+            stats = self.tron_monitor.get_inflow_stats(address, period)
+            if stats is None:
+                await update.message.reply_text("❌ 入账统计失败")
+                return
+            
+            scope = f"{address[:10]}...{address[-10:]}" if address else "全部监控地址"
+            lines = [
+                f"📊 {period_names[period]}入账统计",
+                f"📍 {scope}\n",
+                f"💰 合计: {stats['total']:,.2f} USDT（{stats['count']} 笔）"
+            ]
+            if not address and len(stats['by_address']) > 1:
+                lines.append("\n📥 按接收地址")
+                for row in stats['by_address']:
+                    to_addr = row['to_address']
+                    lines.append(f"{to_addr[:6]}...{to_addr[-6:]}: {row['total']:,.2f}（{row['count']} 笔）")
+            if stats['top_senders']:
+                lines.append("\n📤 主要来源")
+                for row in stats['top_senders']:
+                    sender = row['from_address']
+                    addr_info = self.address_manager.get_address_info(sender)
+                    name = addr_info['alias'] if addr_info else f"{sender[:6]}...{sender[-6:]}"
+                    lines.append(f"{name}: {row['total']:,.2f}（{row['count']} 笔）")
+            if stats['series']:
+                lines.append("\n🕐 按小时" if stats['bucket'] == 'hour' else "\n📅 按日期")
+                time_format = '%H:00' if stats['bucket'] == 'hour' else '%m-%d'
+                for row in stats['series']:
+                    label = datetime.fromtimestamp(row['bucket_start']).strftime(time_format)
+                    lines.append(f"{label}: {row['total']:,.2f}（{row['count']} 笔）")
+            await update.message.reply_text("\n".join(lines))
+        except Exception as e:
+            self.logger.error(f"入账统计失败: {e}")
+            await update.message.reply_text("❌ 入账统计失败")
+    
+    async def perf_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """通知延迟统计命令：/perf [分钟]"""
+        if not self._is_authorized(update.effective_user.id):
+            await update.message.reply_text("❌ 您没有权限使用此机器人")
+            return
+        try:
+            window = None
+            if context.args:
+                if not context.args[0].isdigit():
+                    await update.message.reply_text("❌ 参数无效\n\n用法：/perf [分钟]")
+                    return
+                window = int(context.args[0]) * 60
+            
+            summary = self.latency_tracer.summary(window)
+            scope = f"近 {context.args[0]} 分钟" if window else "最近"
+            if not summary['transfers']:
+                await update.message.reply_text(f"📭 {scope}没有入账通知记录")
+                return
+            
+            stage_names = {
+                'index': '出块→拉取',
+                'dedup': '拉取→去重',
+                'queue': '去重→入队',
+                'send': '入队→送达',
+                'total': '出块→送达'
+            }
+            lines = [
+                f"⏱ {scope}入账通知延迟（{summary['transfers']} 笔）",
+                f"🔄 轮询间隔: {os.getenv('MONITOR_INTERVAL', '30')} 秒\n"
+            ]
+            for name, label in stage_names.items():
+                stage = summary['stages'][name]
+                if not stage['count']:
+                    continue
+                lines.append(
+                    f"{label}: p50 {stage['p50']:.2f}s / p90 {stage['p90']:.2f}s / "
+                    f"p99 {stage['p99']:.2f}s / 最大 {stage['max']:.2f}s"
+                )
+            if summary['failed_sends']:
+                lines.append(f"\n⚠️ 发送失败: {summary['failed_sends']} 次")
+            await update.message.reply_text("\n".join(lines))
+        except Exception as e:
+            self.logger.error(f"延迟统计失败: {e}")
+            await update.message.reply_text("❌ 延迟统计失败")
+    
+    def _resolve_monitor_address(self, input_text: str, monitor_addresses: list) -> Optional[str]:
+        """根据序号或完整地址查找监控地址"""
+        if input_text.isdigit():
+            index = int(input_text) - 1
+            if 0 <= index < len(monitor_addresses):
+                return monitor_addresses[index]
+            return None
+        return input_text if input_text in monitor_addresses else None
     
     async def whitelist_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """白名单命令"""
@@ -235,8 +514,8 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
             return
         
         try:
-            whitelist_text = self.address_manager.format_whitelist()
-            await update.message.reply_text(whitelist_text)
+            text, reply_markup = await self._render_view('whitelist', 0, context)
+            await update.message.reply_text(text, reply_markup=reply_markup)
             
         except Exception as e:
             self.logger.error(f"显示白名单失败: {e}")
@@ -251,25 +530,39 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
         try:
             await update.message.reply_text("🔄 正在查询钱包余额，请稍候...")
             
-            # 获取私钥
-            private_key = self.wallet_operations._get_private_key()
-            if not private_key:
+            # 钱包地址已缓存，不再每次解密私钥
+            if not self.wallet_operations.wallet_addresses:
                 await update.message.reply_text("❌ 未配置钱包私钥")
                 return
             
-            # 获取钱包地址
-            wallet_address = private_key.public_key.to_base58check_address()
+            # 钱包池各钱包的余额、可用能量和还能负担的USDT转账笔数
+            pool = await asyncio.to_thread(self.wallet_operations.get_pool_status)
             
-            # 查询余额
-            balance = self.wallet_operations.get_balance(wallet_address)
-            trx_balance = balance['TRX']
-            usdt_balance = balance['USDT']
+            def describe(status):
+                affordable = f"{status['affordable']} 笔"
+                if pool['burn_enabled']:
+                    affordable += f"（含燃烧TRX: {status['affordable_with_burn']} 笔）"
+                return (
+                    f"🪙 TRX: {status['trx']:,.6f}\n"
+                    f"💵 USDT: {status['usdt']:,.2f}\n"
+                    f"⚡ 可用能量: {status['available_energy']:,}\n"
+                    f"📊 预计可负担USDT转账: {affordable}"
+                )
+            
+            if len(pool['wallets']) == 1:
+                body = describe(pool['wallets'][0])
+            else:
+                blocks = [
+                    f"👛 {w['address'][:8]}...{w['address'][-6:]}{' (转账中)' if w['busy'] else ''}\n{describe(w)}"
+                    for w in pool['wallets']
+                ]
+                blocks.append(f"📦 钱包池合计（{len(pool['wallets'])} 个钱包）\n{describe(pool['total'])}")
+                body = "\n\n".join(blocks)
             
             balance_text = f"""
 💰 钱包余额
 
-🪙 TRX: {trx_balance:,.6f}
-💵 USDT: {usdt_balance:,.2f}
+{body}
 
 💡 提示：使用 /transfer 进行转账
             """
@@ -353,6 +646,96 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
             self.logger.error(f"转账命令处理失败: {e}")
             await update.message.reply_text("❌ 转账命令处理失败")
     
+    async def batch_transfer_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """批量转账命令，CSV 每行为 别名,金额（别名也可以是序号或地址）"""
+        if not self._is_authorized(update.effective_user.id):
+            await update.message.reply_text("❌ 您没有权限使用此机器人")
+            return
+        try:
+            text = update.message.text or update.message.caption or ""
+            first_line, _, csv_text = text.partition('\n')
+            args = first_line.split()[1:]
+            token_type = args[0].upper() if args else 'USDT'
+            if token_type not in ("TRX", "USDT"):
+                await update.message.reply_text("❌ 币种只支持 USDT 或 TRX")
+                return
+            if update.message.document:
+                csv_file = await update.message.document.get_file()
+                csv_text = (await csv_file.download_as_bytearray()).decode('utf-8-sig')
+            if not csv_text.strip():
+                await update.message.reply_text(
+                    "用法：\n/batch_transfer USDT\n别名1,100\n别名2,50.5\n\n"
+                    "也可以上传CSV文件，并在文件说明中填写 /batch_transfer USDT"
+                )
+                return
+            
+            items, errors = parse_payout_csv(csv_text, self.address_manager)
+            if errors:
+                await update.message.reply_text("❌ CSV校验失败\n\n" + "\n".join(errors[:20]))
+                return
+            result = await asyncio.to_thread(self.batch_engine.prepare, items, token_type)
+            if not result['success']:
+                await update.message.reply_text("❌ 批量转账校验失败\n\n" + "\n".join(result['errors'][:20]))
+                return
+            
+            batch_id = result['batch_id']
+            preview = "\n".join(f"{i}. {item['alias']}: {item['amount']} {token_type}" for i, item in enumerate(items[:10], 1))
+            if len(items) > 10:
+                preview += f"\n... 共 {len(items)} 笔"
+            confirm_text = f"""
+⚠️ 批量转账确认
+
+🆔 批次号: {batch_id}
+📋 笔数: {result['count']}
+💰 合计: {result['total']} {token_type}
+👛 付款钱包: {len(result['wallets'])} 个
+
+{preview}
+
+🔒 请确认转账信息是否正确
+            """
+            keyboard = [
+                [InlineKeyboardButton("✅ 确认批量转账", callback_data=f"batch_confirm:{batch_id}"),
+                 InlineKeyboardButton("❌ 取消", callback_data=f"batch_cancel:{batch_id}")]
+            ]
+            await update.message.reply_text(confirm_text, reply_markup=InlineKeyboardMarkup(keyboard))
+        except Exception as e:
+            self.logger.error(f"批量转账命令处理失败: {e}")
+            await update.message.reply_text("❌ 批量转账命令处理失败")
+    
+    async def batch_resume_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """续跑批量转账中未成功的部分"""
+        if not self._is_authorized(update.effective_user.id):
+            await update.message.reply_text("❌ 您没有权限使用此机器人")
+            return
+        if not context.args:
+            await update.message.reply_text("用法：/batch_resume <批次号>")
+            return
+        try:
+            batch_id = context.args[0]
+            message = await update.message.reply_text(f"🔄 批次 {batch_id} 正在续跑，请稍候...")
+            result = await asyncio.to_thread(self.batch_engine.execute, batch_id)
+            await message.edit_text(self._format_batch_result(result))
+        except Exception as e:
+            self.logger.error(f"批量转账续跑失败: {e}")
+            await update.message.reply_text("❌ 批量转账续跑失败")
+    
+    def _format_batch_result(self, result: Dict[str, Any]) -> str:
+        """格式化批量转账执行结果"""
+        if 'summary' not in result:
+            return f"❌ 批量转账失败\n\n错误信息: {result.get('error')}"
+        summary = result['summary']
+        lines = [
+            f"{'✅' if result['success'] else '⚠️'} 批次 {result['batch_id']} 执行结果\n",
+            f"📤 已广播: {summary.get('broadcast', 0)} 笔",
+            f"❌ 未完成: {len(result['failed'])} 笔"
+        ]
+        for item in result['failed'][:10]:
+            lines.append(f"  {item['seq']}. {item['alias']} {item['amount']}: {item['error'] or item['status']}")
+        if result['failed']:
+            lines.append(f"\n💡 使用 /batch_resume {result['batch_id']} 重试未完成的转账")
+        return "\n".join(lines)
+    
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """按钮回调处理，支持币种选择和转账确认，参数用user_data"""
         if not self._is_authorized(update.effective_user.id):
@@ -361,72 +744,117 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
         query = update.callback_query
         await query.answer()
         try:
+            if query.data == NOOP_CALLBACK:
+                return
+            page_request = parse_page_callback(query.data)
+            if page_request:
+                text, reply_markup = await self._render_view(*page_request, context)
+                try:
+                    await query.edit_message_text(text, reply_markup=reply_markup)
+                except BadRequest as e:
+                    # 连点同一页时内容没变，Telegram 会拒绝编辑
+                    if 'not modified' not in str(e).lower():
+                        raise
+                return
             if query.data == "cancel_transfer":
                 await query.edit_message_text("❌ 转账已取消")
                 return
+            if query.data.startswith("batch_cancel:"):
+                await query.edit_message_text("❌ 批量转账已取消")
+                return
+            if query.data.startswith("batch_confirm:"):
+                batch_id = query.data.split(":", 1)[1]
+                # 先占用批次再改消息：连点或并发的重复回调被拒绝，不覆盖第一次点击的进度和结果
+                error = await asyncio.to_thread(self.batch_engine.claim, batch_id, False)
+                if error:
+                    self.logger.warning(f"忽略重复的批量转账确认: {error}")
+                    return
+                # 编辑消息同时移除确认按钮；已占用的批次即使编辑失败也要执行完并释放
+                try:
+                    await query.edit_message_text(f"🔄 批次 {batch_id} 正在执行，请稍候...")
+                except Exception as e:
+                    self.logger.warning(f"更新批量转账消息失败: {e}")
+                result = await asyncio.to_thread(self.batch_engine.run, batch_id)
+                await query.edit_message_text(self._format_batch_result(result))
+                return
             if query.data.startswith("choose_token:"):
                 token_type = query.data.split(":")[1]
                 context.user_data["transfer_token"] = token_type
-                address_list = self.address_manager.format_address_list()
-                await query.edit_message_text(
-                    f"已选择币种：{token_type}\n\n{address_list}\n\n"
-                    "请输入转账命令：\n/transfer <序号/别名/地址> <金额> <备注(可选)>\n"
-                    "如：/transfer 1 10 测试"
-                )
+                text, reply_markup = await self._render_view('addresses', 0, context)
+                await query.edit_message_text(text, reply_markup=reply_markup)
                 return
             if query.data == "transfer_confirm":
-                params = context.user_data.get("transfer_params")
+                # 取出即清除，避免重复点击确认导致重复转账
+                params = context.user_data.pop("transfer_params", None)
                 if not params:
                     await query.edit_message_text("❌ 转账参数丢失，请重新发起转账")
                     return
-                target_address = params["target_address"]
-                amount = params["amount"]
-                token_type = params["token_type"]
-                remark = params["remark"]
-                await query.edit_message_text("🔄 正在执行转账，请稍候...")
-                try:
-                    if token_type == "TRX":
-                        result = self.wallet_operations.transfer_trx(target_address, amount)
-                    else:
-                        result = self.wallet_operations.transfer_usdt(target_address, amount)
-                    
-                    # 获取交易哈希，无论成功与否
-                    txid = result.get('txid')
-                    if not txid:
-                        raise Exception("未获取到交易哈希")
-                    
-                    addr_info = self.address_manager.get_address_info(target_address)
-                    alias = addr_info['alias'] if addr_info else "未知"
-                    
-                    # 生成区块链浏览器链接
-                    explorer_url = f"https://tronscan.org/#/transaction/{txid}"
-                    
-                    success_text = f"""
-📤 转账已提交
+                await query.edit_message_text("🔄 正在广播转账，请稍候...")
+                # 广播和回执跟踪都在后台进行，处理器立即返回
+                task = asyncio.create_task(self._execute_transfer(query.message, params))
+                self._transfer_tasks.add(task)
+                task.add_done_callback(self._transfer_tasks.discard)
+        except Exception as e:
+            self.logger.error(f"按钮回调处理失败: {e}")
+            await query.edit_message_text("❌ 操作失败")
+    
+    async def _execute_transfer(self, message, params: Dict[str, Any]):
+        """后台执行转账：广播后把消息更新为已广播，并登记回执跟踪"""
+        target_address = params["target_address"]
+        amount = params["amount"]
+        token_type = params["token_type"]
+        remark = params["remark"]
+        try:
+            if token_type == "TRX":
+                result = await asyncio.to_thread(self.wallet_operations.transfer_trx, target_address, amount)
+            else:
+                result = await asyncio.to_thread(self.wallet_operations.transfer_usdt, target_address, amount)
+            
+            txid = result.get('txid')
+            if not result.get('success') or not txid:
+                await message.edit_text(f"❌ 转账提交失败\n\n错误信息: {result.get('error', '未获取到交易哈希')}")
+                return
+            
+            addr_info = self.address_manager.get_address_info(target_address)
+            alias = addr_info['alias'] if addr_info else "未知"
+            text = f"""
+📤 转账已广播
 
 📤 目标地址: {alias}
 📍 地址: {target_address}
 💰 金额: {amount} {token_type}
 📝 备注: {remark if remark else "无"}
 🔗 交易哈希: {txid}
-
-💡 点击下方按钮查看交易状态
-                    """
-                    
-                    # 创建查看按钮
-                    keyboard = [
-                        [InlineKeyboardButton("🌐 在区块链浏览器查看", url=explorer_url)]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-                    
-                    await query.edit_message_text(success_text, reply_markup=reply_markup)
-                    
-                except Exception as e:
-                    self.logger.error(f"转账执行失败: {e}")
-                    await query.edit_message_text(f"❌ 转账提交失败\n\n错误信息: {str(e)}")
+            """.strip()
+            
+            await message.edit_text(f"{text}\n\n⏳ 状态: 等待链上确认", reply_markup=self._explorer_markup(txid))
+            self.receipt_tracker.track(txid, {'message': message, 'text': text})
         except Exception as e:
-            self.logger.error(f"按钮回调处理失败: {e}")
-            await query.edit_message_text("❌ 操作失败")
+            self.logger.error(f"转账执行失败: {e}")
+            try:
+                await message.edit_text(f"❌ 转账提交失败\n\n错误信息: {str(e)}")
+            except Exception as edit_error:
+                self.logger.error(f"更新转账失败消息失败: {edit_error}")
+    
+    async def _on_transfer_receipt(self, txid: str, receipt: Optional[Dict[str, Any]], context: Dict[str, Any]):
+        """回执跟踪的最终结果：更新转账消息的状态"""
+        if receipt is None:
+            status = "⚠️ 状态: 超时未查到回执，请在区块链浏览器核实"
+        else:
+            icon = "✅" if receipt['status'] == 'SUCCESS' else "❌"
+            status = (
+                f"{icon} 状态: {receipt['status']}（区块 {receipt['block']}）\n"
+                f"⛽ 手续费: {receipt['fee']:,.6f} TRX，能量: {receipt['energy_used']:,}"
+            )
+        await context['message'].edit_text(f"{context['text']}\n\n{status}", reply_markup=self._explorer_markup(txid))
+    
+    def _explorer_markup(self, txid: str) -> InlineKeyboardMarkup:
+        """区块链浏览器查看按钮"""
+        explorer_url = f"https://tronscan.org/#/transaction/{txid}"
+        keyboard = [
+            [InlineKeyboardButton("🌐 在区块链浏览器查看", url=explorer_url)]
+        ]
+        return InlineKeyboardMarkup(keyboard)
     
     def _is_authorized(self, user_id: int) -> bool:
         """检查用户是否授权"""
@@ -456,9 +884,13 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
 /status - 显示监控状态
 /balance - 查询监控地址余额
 /latest - 显示最新交易
+/history - 查询地址入账历史
+/stats - 入账统计
+/perf - 通知延迟统计
 /whitelist - 显示白名单地址
 /wallet_balance - 查询钱包余额
 /transfer - 转账到白名单地址
+/batch_transfer - 批量转账到白名单地址
 
 💡 提示：白名单地址在 .env 文件中配置
         """
@@ -467,6 +899,40 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
         except Exception as e:
             self.logger.error(f"推送启动信息失败: {e}")
 
+    async def run_webhook(self, is_running: Callable[[], bool],
+                          post_init: Optional[Callable[[Application], Awaitable[None]]] = None,
+                          post_stop: Optional[Callable[[Application], Awaitable[None]]] = None):
+        """Webhook模式运行：启动本地接收服务并向Telegram注册 WEBHOOK_URL，is_running() 为 False 时退出"""
+        webhook_url = os.getenv('WEBHOOK_URL')
+        if not webhook_url:
+            raise ValueError("Webhook模式需要设置WEBHOOK_URL")
+        # 更新里的用户ID来自推送内容本身，没有密钥时任何能访问端点的人都能伪造授权用户的操作
+        if not os.getenv('WEBHOOK_SECRET_TOKEN'):
+            raise ValueError("Webhook模式需要设置WEBHOOK_SECRET_TOKEN")
+        server = WebhookServer(self.application)
+        await self.application.initialize()
+        try:
+            if post_init:
+                await post_init(self.application)
+            await server.start()
+            await self.application.bot.set_webhook(
+                url=webhook_url,
+                secret_token=server.secret_token,
+                max_connections=int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40')),
+                allowed_updates=Update.ALL_TYPES
+            )
+            await self.application.start()
+            self.logger.info(f"Webhook模式运行中: {webhook_url}")
+            while is_running():
+                await asyncio.sleep(1)
+        finally:
+            await server.stop()
+            if self.application.running:
+                await self.application.stop()
+            if post_stop:
+                await post_stop(self.application)
+            await self.application.shutdown()
+
     def run(self):
         """运行机器人"""
         try:
@@ -478,10 +944,7 @@ WHITELIST_ADDRESSES=地址1=别名1,描述1|地址2=别名2,描述2
 
 if __name__ == "__main__":
     # 设置日志
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    setup_logging()
     
     try:
         bot = TelegramBot()
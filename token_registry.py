@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+监控代币配置与元数据缓存
+MONITOR_TOKENS 配置要监控入账的代币（符号或TRC20合约地址，TRX 表示原生TRX），
+代币精度和符号缓存在本地存储中，优先取自TronGrid记录自带的 token_info，缺失时才查合约
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, Optional, Set
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+TRX = 'TRX'
+TRX_DECIMALS = 6
+
+# 常用代币的主网合约
+KNOWN_TOKENS = {
+    'USDT': 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t',
+    'USDC': 'TEkxiTehnzSmSe2XqrBj4w32RUN966rdz8',
+}
+
+
+class TokenRegistry:
+    """监控的代币集合 + 持久化的代币元数据（合约 -> 符号、精度、名称）"""
+
+    def __init__(self, tron, store, usdt_contract_address: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.tron = tron
+        self.store = store
+        self._lock = threading.Lock()
+
+        known = dict(KNOWN_TOKENS)
+        if usdt_contract_address:
+            known['USDT'] = usdt_contract_address
+
+        self.watch_trx = False
+        self.contracts: Set[str] = set()
+        for entry in os.getenv('MONITOR_TOKENS', 'USDT').split(','):
+            entry = entry.strip()
+            if not entry:
+                continue
+            if entry.upper() == TRX:
+                self.watch_trx = True
+            elif entry.upper() in known:
+                self.contracts.add(known[entry.upper()])
+            else:
+                self.contracts.add(entry)
+
+        self._metadata: Dict[str, Dict] = store.get_token_metadata()
+        # 内置代币在没有缓存时也知道符号和精度，首次启动不用查合约
+        for symbol, contract in known.items():
+            self._metadata.setdefault(contract, {'symbol': symbol, 'decimals': 6, 'name': symbol})
+
+    def symbols(self) -> list:
+        """监控中的代币符号（用于展示）"""
+        symbols = sorted(self._metadata.get(c, {}).get('symbol') or c[:8] for c in self.contracts)
+        return symbols + [TRX] if self.watch_trx else symbols
+
+    def remember(self, contract: str, token_info: Optional[dict]) -> Optional[Dict]:
+        """记下TronGrid记录自带的 token_info（有变化才写库），返回该合约的元数据"""
+        if token_info and token_info.get('decimals') is not None and token_info.get('symbol'):
+            metadata = {
+                'symbol': token_info['symbol'],
+                'decimals': int(token_info['decimals']),
+                'name': token_info.get('name') or token_info['symbol'],
+            }
+            if self._metadata.get(contract) != metadata:
+                with self._lock:
+                    self._metadata[contract] = metadata
+                self.store.save_token_metadata(contract, **metadata)
+            return metadata
+        return self.metadata(contract)
+
+    def metadata(self, contract: str) -> Optional[Dict]:
+        """合约的元数据：先查缓存，未命中时调用合约的 symbol()/decimals() 并写入缓存"""
+        metadata = self._metadata.get(contract)
+        if metadata:
+            return metadata
+        try:
+            token = self.tron.get_contract(contract)
+            metadata = {
+                'symbol': token.functions.symbol(),
+                'decimals': int(token.functions.decimals()),
+                'name': token.functions.name(),
+            }
+        except Exception as e:
+            self.logger.error(f"查询代币元数据失败 {contract}: {e}")
+            return None
+        with self._lock:
+            self._metadata[contract] = metadata
+        self.store.save_token_metadata(contract, **metadata)
+        self.logger.info(f"代币元数据已缓存: {contract} {metadata['symbol']} ({metadata['decimals']} 位小数)")
+        return metadata
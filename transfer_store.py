@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+本地转账存储
+使用SQLite保存检测到的入账记录（USDT等TRC20代币和TRX）、按小时/按天的入账汇总、
+历史回填进度和代币元数据
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+ROLLUP_BUCKETS = ('hour', 'day')
+
+def bucket_start(timestamp_ms: int, bucket: str) -> int:
+    """计算毫秒时间戳所在汇总桶的起始时间（秒，按本地时间对齐）"""
+    dt = datetime.fromtimestamp(timestamp_ms / 1000)
+    if bucket == 'hour':
+        dt = dt.replace(minute=0, second=0, microsecond=0)
+    else:
+        dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    return int(dt.timestamp())
+
+
+class TransferStore:
+    """本地转账存储（SQLite）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path or os.getenv('TRANSFER_DB_PATH', 'transfers.db')
+
+        # 监控线程、机器人和回填工作线程共用同一个连接，写操作通过锁串行化
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+        self.logger.info(f"本地转账存储初始化完成: {self.db_path}")
+
+    def _init_schema(self):
+        """创建表和索引"""
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS transfers (
+                    txid TEXT NOT NULL,
+                    from_address TEXT,
+                    to_address TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    timestamp INTEGER NOT NULL,
+                    block INTEGER,
+                    token TEXT NOT NULL DEFAULT 'USDT',
+                    PRIMARY KEY (txid, to_address)
+                )
+            """)
+            # 旧库升级：多代币之前的记录都是USDT
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(transfers)")}
+            if 'token' not in columns:
+                self._conn.execute("ALTER TABLE transfers ADD COLUMN token TEXT NOT NULL DEFAULT 'USDT'")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transfers_to_ts ON transfers (to_address, timestamp)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transfers_txid ON transfers (txid)"
+            )
+            rollup_columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(transfer_rollups)")}
+            if rollup_columns and 'token' not in rollup_columns:
+                # 旧版汇总不区分代币，删除后按转账记录重建
+                self._conn.execute("DROP TABLE transfer_rollups")
+                rollup_columns = set()
+            rollups_exist = bool(rollup_columns)
+            # 按 (代币, 粒度, 接收地址, 桶起始时间, 发送方) 增量累加的入账汇总
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS transfer_rollups (
+                    token TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    to_address TEXT NOT NULL,
+                    bucket_start INTEGER NOT NULL,
+                    from_address TEXT NOT NULL,
+                    total REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (token, bucket, to_address, bucket_start, from_address)
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_rollups_bucket_start ON transfer_rollups (bucket, bucket_start)"
+            )
+            if not rollups_exist:
+                # 旧库升级：根据已有转账记录补建汇总
+                rows = self._conn.execute(
+                    "SELECT token, from_address, to_address, amount, timestamp FROM transfers"
+                ).fetchall()
+                self._apply_rollups(
+                    (row['token'], row['from_address'], row['to_address'], row['amount'], row['timestamp'])
+                    for row in rows
+                )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+                    address TEXT PRIMARY KEY,
+                    fingerprint TEXT,
+                    fetched INTEGER NOT NULL DEFAULT 0,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    updated_at INTEGER NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS token_metadata (
+                    contract TEXT PRIMARY KEY,
+                    symbol TEXT NOT NULL,
+                    decimals INTEGER NOT NULL,
+                    name TEXT
+                )
+            """)
+
+    def _apply_rollups(self, rows: Iterable[Tuple[str, Optional[str], str, float, int]]):
+        """把新入库的转账累加到汇总表（调用方持有锁并处于事务中）"""
+        deltas = {}
+        for token, from_address, to_address, amount, timestamp in rows:
+            for bucket in ROLLUP_BUCKETS:
+                key = (token, bucket, to_address, bucket_start(timestamp, bucket), from_address or '')
+                total, count = deltas.get(key, (0.0, 0))
+                deltas[key] = (total + amount, count + 1)
+        self._conn.executemany(
+            "INSERT INTO transfer_rollups (token, bucket, to_address, bucket_start, from_address, total, count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (token, bucket, to_address, bucket_start, from_address) "
+            "DO UPDATE SET total = total + excluded.total, count = count + excluded.count",
+            [key + value for key, value in deltas.items()]
+        )
+
+    def add_transfers(self, transfers: List[Dict]) -> int:
+        """批量写入转账记录（已存在的忽略）并同步累加汇总，返回新写入的条数"""
+        if not transfers:
+            return 0
+        with self._lock, self._conn:
+            inserted = []
+            for t in transfers:
+                token = t.get('token', 'USDT')
+                row = (t['txid'], t.get('from'), t['to'], t['amount'], t.get('timestamp', 0), t.get('block', 0), token)
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO transfers (txid, from_address, to_address, amount, timestamp, block, token) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+                if cursor.rowcount == 1:
+                    inserted.append((token, row[1], row[2], row[3], row[4]))
+            # 只有真正新写入的记录才计入汇总，重复写入不会重复累加
+            self._apply_rollups(inserted)
+            return len(inserted)
+
+    @staticmethod
+    def _row_to_transfer(row: sqlite3.Row) -> Dict:
+        """把数据库行转换为与监控器一致的转账结构"""
+        return {
+            'txid': row['txid'],
+            'from': row['from_address'],
+            'to': row['to_address'],
+            'amount': row['amount'],
+            'timestamp': row['timestamp'],
+            'block': row['block'],
+            'token': row['token']
+        }
+
+    def get_latest_transfer(self, to_address: str) -> Optional[Dict]:
+        """获取地址最新一笔转入记录"""
+        transfers = self.get_transfers(to_address, limit=1)
+        return transfers[0] if transfers else None
+
+    def get_transfers(self, to_address: str, limit: int = 20, before: Optional[int] = None) -> List[Dict]:
+        """按时间倒序获取地址的转入记录，before 为毫秒时间戳（不含）"""
+        sql = ("SELECT txid, from_address, to_address, amount, timestamp, block, token FROM transfers "
+               "WHERE to_address = ?")
+        params = [to_address]
+        if before is not None:
+            sql += " AND timestamp < ?"
+            params.append(before)
+        sql += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_transfer(row) for row in rows]
+
+    def get_daily_totals(self, to_address: str, days: int = 7, token: str = 'USDT') -> List[Dict]:
+        """按本地日期汇总地址最近几天某个代币的转入金额和笔数（不含无入账的日期）"""
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT bucket_start, SUM(total) AS total, SUM(count) AS count FROM transfer_rollups "
+                "WHERE token = ? AND bucket = 'day' AND to_address = ? AND bucket_start >= ? "
+                "GROUP BY bucket_start ORDER BY bucket_start DESC",
+                (token, to_address, int(start.timestamp()))
+            ).fetchall()
+        return [
+            {
+                'day': datetime.fromtimestamp(row['bucket_start']).strftime('%Y-%m-%d'),
+                'total': row['total'],
+                'count': row['count']
+            }
+            for row in rows
+        ]
+
+    def get_rollup_stats(self, start: int, end: int, bucket: str = 'day',
+                         to_address: Optional[str] = None, top_senders: int = 5, token: str = 'USDT') -> Dict:
+        """基于汇总表统计 [start, end) 秒级时间范围内某个代币的入账
+
+        返回总额、笔数、按接收地址、按发送方（前 top_senders 名）和按时间桶的分组结果。
+        """
+        where = "token = ? AND bucket = ? AND bucket_start >= ? AND bucket_start < ?"
+        params = [token, bucket, start, end]
+        if to_address:
+            where += " AND to_address = ?"
+            params.append(to_address)
+
+        with self._lock:
+            total_row = self._conn.execute(
+                f"SELECT COALESCE(SUM(total), 0) AS total, COALESCE(SUM(count), 0) AS count "
+                f"FROM transfer_rollups WHERE {where}",
+                params
+            ).fetchone()
+            by_address = self._conn.execute(
+                f"SELECT to_address, SUM(total) AS total, SUM(count) AS count FROM transfer_rollups "
+                f"WHERE {where} GROUP BY to_address ORDER BY total DESC",
+                params
+            ).fetchall()
+            by_sender = self._conn.execute(
+                f"SELECT from_address, SUM(total) AS total, SUM(count) AS count FROM transfer_rollups "
+                f"WHERE {where} GROUP BY from_address ORDER BY total DESC LIMIT ?",
+                params + [top_senders]
+            ).fetchall()
+            series = self._conn.execute(
+                f"SELECT bucket_start, SUM(total) AS total, SUM(count) AS count FROM transfer_rollups "
+                f"WHERE {where} GROUP BY bucket_start ORDER BY bucket_start",
+                params
+            ).fetchall()
+
+        return {
+            'total': total_row['total'],
+            'count': total_row['count'],
+            'by_address': [dict(row) for row in by_address],
+            'top_senders': [dict(row) for row in by_sender],
+            'series': [dict(row) for row in series]
+        }
+
+    def get_checkpoint(self, address: str) -> Optional[Dict]:
+        """获取地址的回填进度"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT address, fingerprint, fetched, done, updated_at FROM backfill_checkpoints WHERE address = ?",
+                (address,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def save_checkpoint(self, address: str, fingerprint: Optional[str], fetched: int, done: bool, updated_at: int):
+        """保存地址的回填进度"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO backfill_checkpoints (address, fingerprint, fetched, done, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (address, fingerprint, fetched, 1 if done else 0, updated_at)
+            )
+
+    def clear_checkpoint(self, address: str):
+        """清除地址的回填进度（从头重新回填）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM backfill_checkpoints WHERE address = ?", (address,))
+
+    def get_token_metadata(self) -> Dict[str, Dict]:
+        """全部已缓存的代币元数据：合约 -> {symbol, decimals, name}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT contract, symbol, decimals, name FROM token_metadata").fetchall()
+        return {row['contract']: {'symbol': row['symbol'], 'decimals': row['decimals'], 'name': row['name']}
+                for row in rows}
+
+    def save_token_metadata(self, contract: str, symbol: str, decimals: int, name: Optional[str] = None):
+        """写入或更新代币元数据"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO token_metadata (contract, symbol, decimals, name) VALUES (?, ?, ?, ?)",
+                (contract, symbol, decimals, name)
+            )
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
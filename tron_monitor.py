@@ -1,30 +1,151 @@
 import os
 import time
+import codecs
 import logging
+import threading
 import json
 import requests
-from typing import List, Dict, Optional
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from tronpy import Tron
-from tronpy.providers import HTTPProvider
 from tronpy.contract import Contract
+from tronpy.keys import to_base58check_address
 from dotenv import load_dotenv
 from address_manager import AddressManager
+from transfer_store import TransferStore
+from token_registry import TokenRegistry, TRX, TRX_DECIMALS
+from alert_rules import AlertRuleEngine
+from circuit_breaker import BREAKERS, CircuitOpenError
+from latency_tracer import start_trace
+from log_setup import setup_logging, debug_sampled
+from metrics import (
+    InstrumentedHTTPProvider, TRONGRID_REQUEST_SECONDS, REQUEST_RETRIES, TRANSFERS_SEEN,
+    DEDUP_HITS, NEW_TRANSFERS, ALERT_DECISIONS, cache_result, endpoint_label
+)
 
 # 加载环境变量
 load_dotenv()
 
+_JSON_DECODER = json.JSONDecoder()
+
+# 转账方向（相对于被监控地址）
+INBOUND = 'in'
+OUTBOUND = 'out'
+
+
+def transfer_key(transfer: Dict) -> str:
+    """去重键：转入沿用txid，转出加后缀，两个监控地址之间的转账两边各通知一次"""
+    if transfer.get('direction') == OUTBOUND:
+        return f"{transfer['txid']}:{OUTBOUND}"
+    return transfer['txid']
+
+
+class _JSONChunkReader:
+    """按块读取JSON文本的游标，只保留尚未解析的部分"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """读入下一块数据，丢弃已解析部分；流结束时返回False"""
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self._buf = self._buf[self._pos:] + text
+                self._pos = 0
+                return True
+        self._buf = self._buf[self._pos:] + self._decoder.decode(b'', final=True)
+        self._pos = 0
+        self._eof = True
+        return False
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符（不消费），流结束返回空串"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill() and self._pos >= len(self._buf):
+                return ''
+
+    def expect(self, chars: str) -> str:
+        """消费下一个字符，必须是 chars 之一"""
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"JSON格式错误: 期望 {chars!r}，实际 {ch!r}")
+        self._pos += 1
+        return ch
+
+    def decode_value(self) -> Any:
+        """解析下一个完整的JSON值，数据不够时继续读入"""
+        self.peek()
+        while True:
+            try:
+                value, end = _JSON_DECODER.raw_decode(self._buf, self._pos)
+                # 值恰好结束在缓冲区末尾时（如数字）可能还没读完整
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+
+def iter_json_array(chunks: Iterable[bytes], key: str = 'data', tail: Optional[dict] = None) -> Iterator[Any]:
+    """流式解析顶层JSON对象，逐个产出 key 数组中的元素
+
+    内存占用只与单条记录大小相关，与整页大小无关。
+    其他顶层字段（如 meta）在迭代结束后写入 tail。
+    """
+    reader = _JSONChunkReader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.decode_value()
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    yield reader.decode_value()
+                    if reader.expect(',]') == ']':
+                        break
+        else:
+            value = reader.decode_value()
+            if tail is not None:
+                tail[name] = value
+        if reader.expect(',}') == '}':
+            return
+
+
 class TronUSDTMonitor:
     """Tron链USDT监控器"""
     
     def __init__(self):
         tron_api_key = os.getenv('TRON_API_KEY')
+        self.tron_api_key = tron_api_key
         self.tron = Tron(
-            provider=HTTPProvider(
+            provider=InstrumentedHTTPProvider(
                 os.getenv('TRON_NODE_URL', 'https://api.trongrid.io'),
-                api_key=tron_api_key
+                api_key=tron_api_key,
+                breakers=BREAKERS
             )
         )
         
+        # TronGrid REST 接口地址（压测时指向本地模拟服务）
+        self.api_base_url = os.getenv('TRONGRID_API_URL', 'https://api.trongrid.io').rstrip('/')
+        
         # USDT合约地址 (Tron主网)
         self.usdt_contract_address = os.getenv('USDT_CONTRACT_ADDRESS', 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t')
         self.usdt_contract = self.tron.get_contract(self.usdt_contract_address)
@@ -32,6 +153,18 @@ class TronUSDTMonitor:
         # 初始化地址管理器
         self.address_manager = AddressManager()
         
+        # 本地转账存储，/latest 和历史查询直接读库
+        self.transfer_store = TransferStore()
+        
+        # 监控的代币（MONITOR_TOKENS），元数据缓存在本地存储中
+        self.token_registry = TokenRegistry(self.tron, self.transfer_store, self.usdt_contract_address)
+        self.fetch_limit = int(os.getenv('MONITOR_FETCH_LIMIT', '50'))
+        # 同一个请求里同时取转出记录（归集、被盗等），不增加请求数
+        self.monitor_outbound = os.getenv('MONITOR_OUTBOUND', 'true').lower() == 'true'
+        
+        # 入账提醒规则（ALERT_RULES_FILE），静音的交易只入库不通知
+        self.alert_rules = AlertRuleEngine(self.address_manager)
+        
         # 只监控 MONITOR_ADDRESSES
         self.monitor_addresses = os.getenv('MONITOR_ADDRESSES', '').split(',')
         self.monitor_addresses = [addr.strip() for addr in self.monitor_addresses if addr.strip()]
@@ -41,115 +174,392 @@ class TronUSDTMonitor:
         
         # 记录已处理的交易
         self.processed_transactions = set()
+        # 保护已处理交易、余额缓存和同步时间：轮询、机器人查询线程和状态快照会同时访问
+        self.state_lock = threading.Lock()
         
-        # 余额缓存
+        # 余额缓存；上游熔断时继续用最后一次查到的余额（标明查询时间）
         self.balance_cache = {}
         self.cache_timeout = 30  # 30秒缓存
         
-        # 设置日志
-        logging.basicConfig(
-            level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
+        # 每个地址最后一次成功拉取交易的时间，上游熔断时用于标明数据截至何时
+        self.last_synced: Dict[str, float] = {}
+        
+        # 流式读取响应的块大小
+        self.stream_chunk_size = 16 * 1024
+        
+        # 设置日志（已由入口程序配置过时不会重复配置）
+        setup_logging()
         self.logger = logging.getLogger(__name__)
         
         self.logger.info(f"监控地址列表：{self.monitor_addresses}")
         self.logger.info(f"白名单地址列表：{self.address_manager.get_whitelist_addresses()}")
     
-    def _make_api_request(self, url: str, params: dict = None, max_retries: int = 3) -> Optional[dict]:
-        """发送API请求，带重试机制"""
+    def _api_headers(self) -> dict:
+        """TronGrid请求头，配置了API Key时带上以获得更高的请求配额"""
         headers = {
             'Accept': 'application/json',
             'User-Agent': 'TronUSDTMonitor/1.0'
         }
+        if self.tron_api_key:
+            headers['TRON-PRO-API-KEY'] = self.tron_api_key
+        return headers
+    
+    def _make_api_request(self, url: str, params: dict = None, max_retries: int = 3) -> Optional[dict]:
+        """发送API请求，带重试机制；端点熔断时立即返回None"""
+        headers = self._api_headers()
+        endpoint = endpoint_label(url)
+        breaker = BREAKERS.get(endpoint)
         
         for attempt in range(max_retries):
             try:
-                response = requests.get(url, params=params, headers=headers, timeout=10)
-                response.raise_for_status()
-                return response.json()
+                with breaker.guard(), TRONGRID_REQUEST_SECONDS.time(endpoint=endpoint):
+                    response = requests.get(url, params=params, headers=headers, timeout=10)
+                    response.raise_for_status()
+                    return response.json()
+            except CircuitOpenError as e:
+                debug_sampled(self.logger, "%s", e)
+                return None
             except requests.exceptions.RequestException as e:
                 self.logger.warning(f"API请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
+                if attempt < max_retries - 1 and not breaker.is_open:
+                    REQUEST_RETRIES.inc(endpoint=endpoint)
                     time.sleep(2 ** attempt)  # 指数退避
                 else:
                     self.logger.error(f"API请求最终失败: {e}")
                     return None
     
+    def _stream_api_records(self, url: str, params: dict = None, meta: Optional[dict] = None,
+                            max_retries: int = 3) -> Iterator[dict]:
+        """流式发送API请求，边下载边逐条产出响应中 data 数组的记录
+
+        只对建立连接阶段重试；重试耗尽、端点熔断（CircuitOpenError）或开始产出记录后出错都抛给调用方，
+        避免把失败当成空页。响应中的其他顶层字段（如 meta）在迭代结束后写入 meta。
+        """
+        headers = self._api_headers()
+        endpoint = endpoint_label(url)
+        breaker = BREAKERS.get(endpoint)
+        
+        # 耗时从发起请求算到响应读完（或调用方提前停止读取）
+        start = time.perf_counter()
+        response = None
+        for attempt in range(max_retries):
+            try:
+                with breaker.guard():
+                    response = requests.get(url, params=params, headers=headers, timeout=10, stream=True)
+                    response.raise_for_status()
+                break
+            except requests.exceptions.RequestException as e:
+                if response is not None:
+                    response.close()
+                    response = None
+                self.logger.warning(f"API请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+                if attempt < max_retries - 1 and not breaker.is_open:
+                    REQUEST_RETRIES.inc(endpoint=endpoint)
+                    time.sleep(2 ** attempt)  # 指数退避
+                else:
+                    self.logger.error(f"API请求最终失败: {e}")
+                    TRONGRID_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+                    raise
+        
+        try:
+            with response:
+                yield from iter_json_array(response.iter_content(chunk_size=self.stream_chunk_size), 'data', meta)
+        finally:
+            TRONGRID_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    
+    def _stream_all_pages(self, url: str, params: dict) -> Iterator[dict]:
+        """按响应 meta 中的 fingerprint 逐页产出记录，直到没有下一页"""
+        params = dict(params)
+        while True:
+            meta = {}
+            yield from self._stream_api_records(url, params, meta)
+            if meta.get('success') is False:
+                raise RuntimeError(f"TronGrid返回失败: {meta.get('error')}")
+            fingerprint = (meta.get('meta') or {}).get('fingerprint')
+            if not fingerprint:
+                return
+            params['fingerprint'] = fingerprint
+    
+    def _stream_page(self, url: str, params: dict, fingerprints: Dict[str, Optional[str]], name: str) -> Iterator[dict]:
+        """从 fingerprints[name] 处取一页记录，读完后把下一页的 fingerprint 写回（None 表示已到底，之后不再请求）"""
+        if name in fingerprints and fingerprints[name] is None:
+            return
+        params = dict(params)
+        if fingerprints.get(name):
+            params['fingerprint'] = fingerprints[name]
+        meta = {}
+        yield from self._stream_api_records(url, params, meta)
+        if meta.get('success') is False:
+            raise RuntimeError(f"TronGrid返回失败: {meta.get('error')}")
+        fingerprints[name] = (meta.get('meta') or {}).get('fingerprint')
+    
+    def _list_records(self, url: str, params: dict, all_pages: bool,
+                      fingerprints: Optional[Dict[str, Optional[str]]], name: str) -> Iterator[dict]:
+        """按翻页方式选择：单页、翻到底，或按 fingerprints 续取一页"""
+        if fingerprints is not None:
+            return self._stream_page(url, params, fingerprints, name)
+        if all_pages:
+            return self._stream_all_pages(url, params)
+        return self._stream_api_records(url, params)
+    
+    def _parse_transfer(self, tx: dict, token: Optional[Dict] = None) -> Dict:
+        """把TronGrid的TRC20记录转换为内部转账结构（token 为代币元数据，默认USDT）"""
+        token = token or {'symbol': 'USDT', 'decimals': 6}
+        return {
+            'txid': tx['transaction_id'],
+            'from': tx.get('from'),
+            'to': tx.get('to'),
+            'amount': float(tx.get('value', 0)) / 10 ** token['decimals'],
+            'timestamp': tx.get('block_timestamp', 0),
+            'block': tx.get('block', 0),
+            'token': token['symbol']
+        }
+    
+    def _direction_params(self, limit: int, only_confirmed: bool, min_timestamp: Optional[int]) -> dict:
+        """监控转出时不加 only_to，一次请求拿到两个方向的记录"""
+        params = {'limit': limit}
+        if not self.monitor_outbound:
+            params['only_to'] = 'true'
+        if only_confirmed:
+            params['only_confirmed'] = 'true'
+        if min_timestamp is not None:
+            params['min_timestamp'] = min_timestamp
+        return params
+    
+    def _classify(self, address: str, from_address: Optional[str], to_address: Optional[str]) -> Optional[str]:
+        """按被监控地址判断方向，自己转给自己算转入"""
+        if to_address == address:
+            return INBOUND
+        if from_address == address and self.monitor_outbound:
+            return OUTBOUND
+        return None
+    
+    def iter_token_transfers(self, address: str, limit: Optional[int] = None, only_confirmed: bool = False,
+                             min_timestamp: Optional[int] = None, all_pages: bool = False,
+                             fingerprints: Optional[Dict[str, Optional[str]]] = None) -> Iterator[Dict]:
+        """逐条产出地址在全部监控代币上的转账记录，带 direction（in / out）和被监控地址 address
+
+        TRC20 只请求一次且不按合约、方向过滤，在本地按 MONITOR_TOKENS 的合约拆分、按收发方判断方向，
+        代币越多、同时监控转出也不增加请求；监控原生TRX时再请求一次普通交易列表。
+        all_pages 时每个列表按 fingerprint 翻页到底（配合 min_timestamp 限定范围），limit 为每页条数。
+        传入 fingerprints（键为 trc20、trx）时每个列表只续取一页，供回填按页保存进度，见 _stream_page。
+        """
+        limit = limit or self.fetch_limit
+        registry = self.token_registry
+        if registry.contracts:
+            api_url = f"{self.api_base_url}/v1/accounts/{address}/transactions/trc20"
+            params = self._direction_params(limit, only_confirmed, min_timestamp)
+            for tx in self._list_records(api_url, params, all_pages, fingerprints, 'trc20'):
+                direction = self._classify(address, tx.get('from'), tx.get('to'))
+                if not direction:
+                    continue
+                token_info = tx.get('token_info') or {}
+                contract = token_info.get('address')
+                if contract not in registry.contracts:
+                    continue
+                token = registry.remember(contract, token_info)
+                if token:
+                    transfer = self._parse_transfer(tx, token)
+                    transfer['direction'] = direction
+                    transfer['address'] = address
+                    yield transfer
+        if registry.watch_trx:
+            yield from self.iter_trx_transfers(address, limit, only_confirmed, min_timestamp, all_pages, fingerprints)
+    
+    def iter_trx_transfers(self, address: str, limit: int = 50, only_confirmed: bool = False,
+                           min_timestamp: Optional[int] = None, all_pages: bool = False,
+                           fingerprints: Optional[Dict[str, Optional[str]]] = None) -> Iterator[Dict]:
+        """逐条产出地址的原生TRX转账记录（只统计执行成功的 TransferContract）"""
+        api_url = f"{self.api_base_url}/v1/accounts/{address}/transactions"
+        params = self._direction_params(limit, only_confirmed, min_timestamp)
+        params['search_internal'] = 'false'
+        for tx in self._list_records(api_url, params, all_pages, fingerprints, 'trx'):
+            contracts = (tx.get('raw_data') or {}).get('contract') or []
+            if not contracts or contracts[0].get('type') != 'TransferContract':
+                continue
+            if (tx.get('ret') or [{}])[0].get('contractRet', 'SUCCESS') != 'SUCCESS':
+                continue
+            value = contracts[0].get('parameter', {}).get('value', {})
+            try:
+                to_address = to_base58check_address(value['to_address'])
+                from_address = to_base58check_address(value['owner_address'])
+            except (KeyError, ValueError):
+                continue
+            direction = self._classify(address, from_address, to_address)
+            if not direction:
+                continue
+            yield {
+                'txid': tx['txID'],
+                'from': from_address,
+                'to': to_address,
+                'amount': float(value.get('amount', 0)) / 10 ** TRX_DECIMALS,
+                'timestamp': tx.get('block_timestamp', 0),
+                'block': tx.get('blockNumber', 0),
+                'token': TRX,
+                'direction': direction,
+                'address': address
+            }
+    
+    def iter_usdt_transfers(self, address: str, limit: int = 50, meta: Optional[dict] = None,
+                            fingerprint: Optional[str] = None, only_confirmed: bool = False,
+                            min_timestamp: Optional[int] = None) -> Iterator[Dict]:
+        """逐条产出指定地址的USDT转入记录（流式解析，解析出一条即产出一条）
+
+        传入上一页响应 meta 中的 fingerprint 可继续翻页；only_confirmed 只返回已固化的交易。
+        """
+        # 使用TronGrid API获取TRC20转账记录
+        api_url = f"{self.api_base_url}/v1/accounts/{address}/transactions/trc20"
+        params = {
+            'limit': limit,
+            'contract_address': self.usdt_contract_address,
+            'only_to': 'true'  # 只获取转入交易
+        }
+        if fingerprint:
+            params['fingerprint'] = fingerprint
+        if only_confirmed:
+            params['only_confirmed'] = 'true'
+        if min_timestamp is not None:
+            params['min_timestamp'] = min_timestamp
+        
+        for tx in self._stream_api_records(api_url, params, meta):
+            if tx.get('to') == address:
+                yield self._parse_transfer(tx)
+    
     def get_usdt_transfers(self, address: str, limit: int = 50) -> List[Dict]:
         """获取指定地址的USDT转账记录"""
         try:
-            transfers = []
-            
-            # 使用TronGrid API获取TRC20转账记录
-            api_url = "https://api.trongrid.io/v1/accounts/{}/transactions/trc20".format(address)
-            params = {
-                'limit': limit,
-                'contract_address': self.usdt_contract_address,
-                'only_to': 'true'  # 只获取转入交易
-            }
-            
-            data = self._make_api_request(api_url, params)
-            if not data or 'data' not in data:
-                self.logger.warning(f"无法获取地址 {address} 的交易数据")
-                return []
-            
-            for tx in data['data']:
-                if tx.get('to') == address:
-                    transfer_info = {
-                        'txid': tx['transaction_id'],
-                        'from': tx.get('from'),
-                        'to': tx.get('to'),
-                        'amount': float(tx.get('value', 0)) / 1_000_000,  # USDT有6位小数
-                        'timestamp': tx.get('block_timestamp', 0),
-                        'block': tx.get('block', 0)
-                    }
-                    transfers.append(transfer_info)
-            
-            return transfers
-            
+            return list(self.iter_usdt_transfers(address, limit))
         except Exception as e:
             self.logger.error(f"获取USDT转账记录失败: {e}")
             return []
     
     def get_latest_transfer(self, address: str) -> Optional[Dict]:
-        """获取指定地址的最新一笔转入交易"""
+        """获取指定地址的最新一笔转入交易（优先读本地存储）"""
         try:
-            transfers = self.get_usdt_transfers(address, limit=1)
+            latest = self.transfer_store.get_latest_transfer(address)
+            cache_result('transfer_store', latest is not None)
+            if latest:
+                return latest
+            # 本地还没有该地址的记录（如新加入的地址），查一次链上并入库
+            transfers = [t for t in self.iter_token_transfers(address) if t['direction'] == INBOUND]
             if transfers:
-                return transfers[0]
+                self.transfer_store.add_transfers(transfers)
+                return max(transfers, key=lambda t: t['timestamp'])
             return None
         except Exception as e:
             self.logger.error(f"获取最新交易失败: {e}")
             return None
     
-    def check_new_transfers(self) -> List[Dict]:
-        """检查新的USDT转入交易"""
-        new_transfers = []
+    def get_transfer_history(self, address: str, limit: int = 10) -> List[Dict]:
+        """从本地存储获取指定地址的转入历史"""
+        try:
+            return self.transfer_store.get_transfers(address, limit=limit)
+        except Exception as e:
+            self.logger.error(f"获取交易历史失败: {e}")
+            return []
+    
+    def get_daily_totals(self, address: str, days: int = 7) -> List[Dict]:
+        """从本地存储获取指定地址最近几天的每日转入汇总"""
+        try:
+            return self.transfer_store.get_daily_totals(address, days=days)
+        except Exception as e:
+            self.logger.error(f"获取每日汇总失败: {e}")
+            return []
+    
+    def get_inflow_stats(self, address: Optional[str] = None, period: str = 'today') -> Optional[Dict]:
+        """基于本地汇总统计入账（period: today / 24h / week / month），address 为空时统计全部地址"""
+        try:
+            now = datetime.now()
+            today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            if period == 'today':
+                start, bucket = today, 'hour'
+            elif period == '24h':
+                start, bucket = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=23), 'hour'
+            elif period == 'week':
+                start, bucket = today - timedelta(days=6), 'day'
+            elif period == 'month':
+                start, bucket = today - timedelta(days=29), 'day'
+            else:
+                raise ValueError(f"不支持的统计周期: {period}")
+            
+            stats = self.transfer_store.get_rollup_stats(
+                int(start.timestamp()), int(now.timestamp()) + 1, bucket=bucket, to_address=address
+            )
+            stats.update({'period': period, 'bucket': bucket, 'start': int(start.timestamp()), 'address': address})
+            return stats
+        except Exception as e:
+            self.logger.error(f"获取入账统计失败: {e}")
+            return None
+    
+    def iter_new_transfers(self, addresses: Optional[List[str]] = None) -> Iterator[Dict]:
+        """逐条产出监控代币（含TRX）的新交易（转入和转出），解析出一条即去重并产出，调用方可立即通知
+
+        每笔新交易带有 trace 字段，记录出块、拉取和去重完成的时间，供延迟追踪使用。
+        两个方向各自去重（见 transfer_key）：转入先按提醒规则判定，被静音的只入库不产出，
+        命中限定接收者的规则时带上 notify_users；转出不计入入账统计，总是提醒。
+        """
+        if addresses is None:
+            addresses = self.monitor_addresses
+        self.alert_rules.reload()
         
-        for address in self.monitor_addresses:
+        for address in addresses:
             try:
-                transfers = self.get_usdt_transfers(address, limit=20)
-                
-                for transfer in transfers:
+                for transfer in self.iter_token_transfers(address):
+                    fetched_at = time.time()
                     tx_id = transfer['txid']
-                    
-                    if tx_id not in self.processed_transactions:
-                        self.processed_transactions.add(tx_id)
-                        new_transfers.append(transfer)
-                        self.logger.info(f"发现新交易: {tx_id}, 金额: {transfer['amount']} USDT")
+                    key = transfer_key(transfer)
+                    TRANSFERS_SEEN.inc()
+
+                    with self.state_lock:
+                        seen = key in self.processed_transactions
+                        self.processed_transactions.add(key)
+                    if seen:
+                        DEDUP_HITS.inc()
+                    else:
+                        NEW_TRANSFERS.inc()
+                        trace = start_trace(transfer, fetched_at)
+                        if transfer['direction'] == OUTBOUND:
+                            trace['dedup_at'] = time.time()
+                            transfer['trace'] = trace
+                            debug_sampled(self.logger, "发现新转出: %s, 金额: %s %s", tx_id, transfer['amount'], transfer['token'])
+                            yield transfer
+                            continue
+                        self.transfer_store.add_transfers([transfer])
+                        trace['dedup_at'] = time.time()
+                        transfer['trace'] = trace
+                        debug_sampled(self.logger, "发现新交易: %s, 金额: %s %s", tx_id, transfer['amount'], transfer['token'])
+                        
+                        alert, rule, users = self.alert_rules.evaluate(transfer)
+                        ALERT_DECISIONS.inc(action='alert' if alert else 'mute')
+                        if not alert:
+                            debug_sampled(self.logger, "交易 %s 命中静音规则: %s", tx_id, rule)
+                            continue
+                        transfer['alert_rule'] = rule
+                        if users:
+                            transfer['notify_users'] = list(users)
+                        yield transfer
+                with self.state_lock:
+                    self.last_synced[address] = time.time()
                 
+            except CircuitOpenError as e:
+                debug_sampled(self.logger, "跳过地址 %s: %s", address, e)
             except Exception as e:
                 self.logger.error(f"检查地址 {address} 失败: {e}")
-        
-        return new_transfers
+    
+    def check_new_transfers(self) -> List[Dict]:
+        """检查监控代币的新交易（转入和转出）"""
+        return list(self.iter_new_transfers())
     
     def format_transfer_message(self, transfer: Dict) -> str:
         """格式化转账消息"""
         timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(transfer['timestamp'] / 1000))
         
-        message = f"🔔 新的USDT入账通知\n\n"
-        message += f"💰 金额: {transfer['amount']:,.2f} USDT\n"
+        token = transfer.get('token', 'USDT')
+        if transfer.get('direction') == OUTBOUND:
+            message = f"🚨 {token}转出通知\n\n"
+        else:
+            message = f"🔔 新的{token}入账通知\n\n"
+        message += f"💰 金额: {transfer['amount']:,.2f} {token}\n"
         message += f"📤 发送方: {transfer['from']}\n"
         message += f"📥 接收方: {transfer['to']}\n"
         message += f"🕐 时间: {timestamp}\n"
@@ -158,41 +568,57 @@ class TronUSDTMonitor:
         
         return message
     
-    def get_address_balance(self, address: str) -> float:
-        """获取地址的USDT余额"""
+    def get_balance_info(self, address: str) -> Dict:
+        """获取地址的USDT余额及查询时间：{'balance', 'updated_at', 'stale'}
+
+        上游不可用（端点熔断或查询失败）时返回最后一次查到的余额并标记 stale，
+        从未查到过时 balance 为 None，不再用 0 冒充余额。
+        """
+        current_time = time.time()
+        cached = self.balance_cache.get(address)
+        if cached and current_time - cached[1] < self.cache_timeout:
+            cache_result('balance', True)
+            return {'balance': cached[0], 'updated_at': cached[1], 'stale': False}
+        cache_result('balance', False)
+        
+        balance = None
         try:
-            # 检查缓存
-            current_time = time.time()
-            if address in self.balance_cache:
-                cached_balance, cache_time = self.balance_cache[address]
-                if current_time - cache_time < self.cache_timeout:
-                    return cached_balance
-            
             # 使用合约方法获取余额
-            balance = self.usdt_contract.functions.balanceOf(address)
-            balance_float = float(balance) / 1_000_000  # USDT有6位小数
-            
-            # 更新缓存
-            self.balance_cache[address] = (balance_float, current_time)
-            
-            return balance_float
-            
+            balance = float(self.usdt_contract.functions.balanceOf(address)) / 1_000_000  # USDT有6位小数
+        except CircuitOpenError as e:
+            debug_sampled(self.logger, "%s", e)
         except Exception as e:
             self.logger.error(f"获取余额失败: {e}")
-            # 如果合约调用失败，尝试使用API
+        
+        if balance is None:
+            # 如果合约调用失败，尝试使用API（该端点熔断时立即返回）
             try:
-                api_url = f"https://api.trongrid.io/v1/accounts/{address}/tokens/trc20"
+                api_url = f"{self.api_base_url}/v1/accounts/{address}/tokens/trc20"
                 params = {'contract_address': self.usdt_contract_address}
                 
                 data = self._make_api_request(api_url, params)
                 if data and 'data' in data and data['data']:
                     balance = float(data['data'][0].get('balance', 0)) / 1_000_000
-                    self.balance_cache[address] = (balance, current_time)
-                    return balance
             except Exception as api_e:
                 self.logger.error(f"API获取余额也失败: {api_e}")
-            
-            return 0.0
+        
+        if balance is not None:
+            with self.state_lock:
+                self.balance_cache[address] = (balance, current_time)
+            return {'balance': balance, 'updated_at': current_time, 'stale': False}
+        if cached:
+            return {'balance': cached[0], 'updated_at': cached[1], 'stale': True}
+        return {'balance': None, 'updated_at': None, 'stale': True}
+    
+    def get_address_balance(self, address: str) -> float:
+        """获取地址的USDT余额（上游不可用时为最后一次查到的余额，从未查到过时为0）"""
+        balance = self.get_balance_info(address)['balance']
+        return balance if balance is not None else 0.0
+    
+    def sync_status(self, address: str) -> Dict:
+        """地址交易数据的新鲜度：degraded 表示拉取交易的上游端点熔断中，last_synced 为最后一次成功拉取的时间"""
+        endpoint = endpoint_label(f"{self.api_base_url}/v1/accounts/{address}/transactions/trc20")
+        return {'degraded': BREAKERS.is_open(endpoint), 'last_synced': self.last_synced.get(address)}
     
     def refresh_monitor_addresses(self):
         """刷新监控地址列表（从地址管理器重新获取）"""
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+转账交易模板构建器
+缓存参考区块、预编码TRC20 transfer调用，本地完成protobuf编码和txid计算，
+每笔交易只需填入收款方和金额，构建过程不再访问节点
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from tronpy import Tron
+from tronpy.tron import Transaction
+from tronpy.keys import to_hex_address
+from dotenv import load_dotenv
+from metrics import cache_result
+
+# 加载环境变量
+load_dotenv()
+
+# 合约类型（Tron.proto 中 Transaction.Contract.ContractType）
+TRANSFER_CONTRACT = 1
+TRIGGER_SMART_CONTRACT = 31
+
+# TRC20 transfer(address,uint256) 的函数选择器
+TRC20_TRANSFER_SELECTOR = bytes.fromhex('a9059cbb')
+
+
+def _varint(value: int) -> bytes:
+    """protobuf varint 编码（负数按 int64 补码处理）"""
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field_varint(field: int, value: int) -> bytes:
+    """varint 字段，默认值 0 按 proto3 规则省略"""
+    if not value:
+        return b''
+    return _varint(field << 3) + _varint(value)
+
+
+def _field_bytes(field: int, value: bytes) -> bytes:
+    """length-delimited 字段，空值省略"""
+    if not value:
+        return b''
+    return _varint((field << 3) | 2) + _varint(len(value)) + value
+
+
+class TransferTxBuilder:
+    """转账交易模板构建器
+
+    参考区块在有效窗口内复用（默认60秒刷新一次），同一窗口内的所有交易共用；
+    txid 由本地编码的 raw_data 计算，不再调用 getsignweight。
+    首次构建每种交易时与节点计算的 txid 对比一次，不一致则自动停用，回退到 tronpy 构建。
+    """
+
+    def __init__(self, tron: Tron, usdt_contract_address: str, fee_limit: int = 20_000_000,
+                 ref_block_ttl: Optional[float] = None, verify: bool = True):
+        self.logger = logging.getLogger(__name__)
+        self.tron = tron
+        self.fee_limit = fee_limit
+        self.ref_block_ttl = ref_block_ttl if ref_block_ttl is not None else float(os.getenv('TX_REF_BLOCK_TTL', '60'))
+        self.enabled = True
+
+        self.usdt_contract_hex = to_hex_address(usdt_contract_address)
+        self._usdt_contract_bytes = bytes.fromhex(self.usdt_contract_hex)
+        self._usdt_type_url = b'type.googleapis.com/protocol.TriggerSmartContract'
+        self._trx_type_url = b'type.googleapis.com/protocol.TransferContract'
+
+        self._ref_block: Optional[Tuple[str, str]] = None
+        self._ref_block_time = 0.0
+        self._ref_lock = threading.Lock()
+        # 付款方地址 -> 预编码的 owner_address + contract_address 字段
+        self._owner_prefix: Dict[str, bytes] = {}
+        # verify=False 时跳过与节点的txid一致性核对（仅用于离线压测）
+        self._verified = set() if verify else {'USDT', 'TRX'}
+
+    def get_ref_block(self) -> Tuple[str, str]:
+        """获取缓存的参考区块 (ref_block_bytes, ref_block_hash)，过期后刷新"""
+        with self._ref_lock:
+            now = time.monotonic()
+            stale = self._ref_block is None or now - self._ref_block_time >= self.ref_block_ttl
+            cache_result('ref_block', not stale)
+            if stale:
+                ref_block_id = self.tron.get_latest_solid_block_id()
+                # 区块号的后2字节 + 区块哈希的后半部分，与 tronpy 的取法一致
+                self._ref_block = (ref_block_id[12:16], ref_block_id[16:32])
+                self._ref_block_time = now
+            return self._ref_block
+
+    def invalidate_ref_block(self):
+        """作废缓存的参考区块（如广播报 TAPOS_ERROR 时）"""
+        with self._ref_lock:
+            self._ref_block = None
+
+    def _usdt_prefix(self, owner_hex: str) -> bytes:
+        """预编码 TriggerSmartContract 中固定不变的 owner_address 和 contract_address 字段"""
+        prefix = self._owner_prefix.get(owner_hex)
+        if prefix is None:
+            prefix = _field_bytes(1, bytes.fromhex(owner_hex)) + _field_bytes(2, self._usdt_contract_bytes)
+            self._owner_prefix[owner_hex] = prefix
+        return prefix
+
+    def _encode_raw(self, contract_type: int, type_url: bytes, value: bytes, ref_block: Tuple[str, str],
+                    timestamp: int, expiration: int, fee_limit: int) -> bytes:
+        """按 Transaction.raw 的字段顺序编码"""
+        parameter = _field_bytes(1, type_url) + _field_bytes(2, value)
+        contract = _field_varint(1, contract_type) + _field_bytes(2, parameter)
+        return (
+            _field_bytes(1, bytes.fromhex(ref_block[0]))
+            + _field_bytes(4, bytes.fromhex(ref_block[1]))
+            + _field_varint(8, expiration)
+            + _field_bytes(11, contract)
+            + _field_varint(14, timestamp)
+            + _field_varint(18, fee_limit)
+        )
+
+    def _make_transaction(self, raw_data: dict, raw_bytes: bytes, kind: str) -> Transaction:
+        """用本地计算的txid构造交易对象；每种交易首次构建时与节点核对一次"""
+        txid = hashlib.sha256(raw_bytes).hexdigest()
+        txn = Transaction(raw_data, client=self.tron, txid=txid, permission=None)
+        if kind not in self._verified:
+            sign_weight = self.tron.get_sign_weight(txn)
+            node_txid = sign_weight.get('transaction', {}).get('transaction', {}).get('txID')
+            if node_txid != txid:
+                self.enabled = False
+                raise ValueError(f"本地txid与节点不一致，停用模板构建: {txid} != {node_txid}")
+            self._verified.add(kind)
+        return txn
+
+    def build_usdt_transfer(self, from_address: str, to_address: str, amount_sun: int,
+                            expiration_ms: int = 60_000, fee_limit: Optional[int] = None) -> Transaction:
+        """构建USDT转账交易（未签名），amount_sun 为最小单位金额，fee_limit 默认使用构建器的设置"""
+        fee_limit = fee_limit or self.fee_limit
+        owner_hex = to_hex_address(from_address)
+        to_hex = to_hex_address(to_address)
+        # transfer(address,uint256)：选择器 + 去掉0x41前缀的地址左补零 + 金额
+        call_data = (
+            TRC20_TRANSFER_SELECTOR
+            + bytes.fromhex(to_hex[2:]).rjust(32, b'\x00')
+            + amount_sun.to_bytes(32, 'big')
+        )
+        value = self._usdt_prefix(owner_hex) + _field_bytes(4, call_data)
+
+        ref_block = self.get_ref_block()
+        timestamp = int(time.time() * 1000)
+        expiration = timestamp + expiration_ms
+        raw_data = {
+            "contract": [{
+                "parameter": {
+                    "value": {
+                        "owner_address": owner_hex,
+                        "contract_address": self.usdt_contract_hex,
+                        "data": call_data.hex(),
+                        "call_token_value": 0,
+                        "call_value": 0,
+                        "token_id": 0,
+                    },
+                    "type_url": self._usdt_type_url.decode(),
+                },
+                "type": "TriggerSmartContract",
+            }],
+            "timestamp": timestamp,
+            "expiration": expiration,
+            "ref_block_bytes": ref_block[0],
+            "ref_block_hash": ref_block[1],
+            "fee_limit": fee_limit,
+        }
+        raw_bytes = self._encode_raw(TRIGGER_SMART_CONTRACT, self._usdt_type_url, value,
+                                     ref_block, timestamp, expiration, fee_limit)
+        return self._make_transaction(raw_data, raw_bytes, 'USDT')
+
+    def build_trx_transfer(self, from_address: str, to_address: str, amount_sun: int,
+                           expiration_ms: int = 60_000) -> Transaction:
+        """构建TRX转账交易（未签名），amount_sun 单位为 sun"""
+        owner_hex = to_hex_address(from_address)
+        to_hex = to_hex_address(to_address)
+        value = (
+            _field_bytes(1, bytes.fromhex(owner_hex))
+            + _field_bytes(2, bytes.fromhex(to_hex))
+            + _field_varint(3, amount_sun)
+        )
+
+        ref_block = self.get_ref_block()
+        timestamp = int(time.time() * 1000)
+        expiration = timestamp + expiration_ms
+        raw_data = {
+            "contract": [{
+                "parameter": {
+                    "value": {
+                        "owner_address": owner_hex,
+                        "to_address": to_hex,
+                        "amount": amount_sun,
+                    },
+                    "type_url": self._trx_type_url.decode(),
+                },
+                "type": "TransferContract",
+            }],
+            "timestamp": timestamp,
+            "expiration": expiration,
+            "ref_block_bytes": ref_block[0],
+            "ref_block_hash": ref_block[1],
+        }
+        raw_bytes = self._encode_raw(TRANSFER_CONTRACT, self._trx_type_url, value,
+                                     ref_block, timestamp, expiration, 0)
+        return self._make_transaction(raw_data, raw_bytes, 'TRX')
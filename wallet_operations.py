@@ -7,13 +7,20 @@ Tron钱包操作模块
 import os
 import time
 import logging
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 from tronpy import Tron
-from tronpy.providers import HTTPProvider
 from tronpy.contract import Contract
-from tronpy.keys import PrivateKey, is_base58check_address
+from tronpy.keys import is_base58check_address
+from tronpy.exceptions import TransactionNotFound, TaposError
 from dotenv import load_dotenv
 from address_manager import AddressManager
+from tx_builder import TransferTxBuilder
+from signer import WalletSigner, load_signers
+from metrics import InstrumentedHTTPProvider, cache_result
+from log_setup import debug_sampled
+from resource_forecaster import ResourceForecaster, DEFAULT_FEE_LIMIT, USDT_TX_BYTES, TRX_TX_BYTES
 
 # 加载环境变量
 load_dotenv()
@@ -26,22 +33,43 @@ class TronWallet:
         self.logger = logging.getLogger(__name__)
         tron_api_key = os.getenv('TRON_API_KEY')
         self.tron = Tron(
-            provider=HTTPProvider(
+            provider=InstrumentedHTTPProvider(
                 os.getenv('TRON_NODE_URL', 'https://api.trongrid.io'),
                 api_key=tron_api_key
             )
         )
-        # 获取私钥
-        self.private_key = self._get_private_key()
-        if not self.private_key:
-            self.logger.error("无法初始化私钥")
-            raise ValueError("无法初始化私钥")
+        # 签名钱包池：每个私钥每个进程只解密一次，保存在锁定内存中（懒加载模式下首次签名时解密）
+        self.signers: List[WalletSigner] = load_signers()
+        for signer in self.signers:
+            if not signer.lazy and not signer.unlock():
+                self.logger.error("无法初始化私钥")
+                raise ValueError("无法初始化私钥")
+        # 第一个钱包为主钱包
+        self.signer = self.signers[0]
+        # 每个付款钱包同一时间只处理一笔转账，不同钱包之间并行
+        self._wallet_locks: Dict[str, threading.Lock] = {}
+        # TronGrid REST 接口地址（余额查询的备用通道）
+        self.api_base_url = os.getenv('TRONGRID_API_URL', 'https://api.trongrid.io').rstrip('/')
         # USDT合约地址
         self.usdt_contract_address = os.getenv('USDT_CONTRACT_ADDRESS', 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t')
         self.usdt_contract = self.tron.get_contract(self.usdt_contract_address)
         # 安全设置
         self.max_trx_amount = float(os.getenv('MAX_TRX_AMOUNT', '100'))
         self.max_usdt_amount = float(os.getenv('MAX_USDT_AMOUNT', '1000'))
+        # 交易模板构建器（缓存参考区块、本地编码），TX_BUILDER_MODE=tronpy 时使用 tronpy 原生构建
+        self.tx_builder = None
+        if os.getenv('TX_BUILDER_MODE', 'template').lower() == 'template':
+            self.tx_builder = TransferTxBuilder(self.tron, self.usdt_contract_address, fee_limit=DEFAULT_FEE_LIMIT)
+        # 转账预检：并发查询余额和能量，短时间内复用账户快照
+        self.snapshot_ttl = float(os.getenv('ACCOUNT_SNAPSHOT_TTL', '5'))
+        self._account_snapshots = {}
+        self._snapshot_lock = threading.Lock()
+        # 预检、回执查询等并发链上查询共用的线程池
+        self._query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='wallet-query')
+        # 能量/带宽预测：缓存账户资源并按恢复规则推算，按收款方估算能量
+        self.resource_forecaster = ResourceForecaster(self.tron, self.usdt_contract_address, self._query_executor)
+        # 钱包池挑选付款钱包时并发评估各钱包（与查询线程池分开，避免嵌套提交占满线程）
+        self._pool_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='wallet-pool')
         # 自动同步白名单
         self.address_manager = AddressManager()
         self.allowed_addresses = [addr.strip() for addr in self.address_manager.get_whitelist_addresses()]
@@ -62,43 +90,27 @@ class TronWallet:
             self.logger.error(f"API请求失败: {e}")
             return None
     
-    def _get_private_key(self) -> Optional[PrivateKey]:
-        """获取私钥（支持加密存储）"""
-        try:
-            # 方法1：从环境变量获取私钥
-            private_key_hex = os.getenv('TRON_PRIVATE_KEY')
-            if private_key_hex:
-                return PrivateKey(bytes.fromhex(private_key_hex))
-            
-            # 方法2：从加密文件获取私钥
-            encrypted_file = os.getenv('TRON_PRIVATE_KEY_FILE', 'private_key.txt.gpg')
-            if os.path.exists(encrypted_file):
-                import subprocess
-                try:
-                    gpg_passphrase = os.getenv('GPG_PASSPHRASE')
-                    result = subprocess.run(
-                        [
-                            'gpg', '--batch', '--yes',
-                            '--pinentry-mode', 'loopback',
-                            f'--passphrase={gpg_passphrase}',
-                            '--decrypt', encrypted_file
-                        ],
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    private_key_hex = result.stdout.strip()
-                    return PrivateKey(bytes.fromhex(private_key_hex))
-                except subprocess.CalledProcessError as e:
-                    self.logger.error(f"解密私钥文件失败: {e}")
-                    return None
-            
-            self.logger.error("未找到私钥配置")
-            return None
-            
-        except Exception as e:
-            self.logger.error(f"获取私钥失败: {e}")
-            return None
+    @property
+    def address(self) -> Optional[str]:
+        """主钱包地址（缓存，不会重复解密私钥）"""
+        return self.signer.address
+    
+    @property
+    def wallet_addresses(self) -> List[str]:
+        """钱包池中所有付款钱包地址"""
+        return [signer.address for signer in self.signers if signer.address]
+    
+    def _signer_for(self, address: str) -> WalletSigner:
+        """按地址查找钱包池中的签名器"""
+        for signer in self.signers:
+            if signer.address == address:
+                return signer
+        raise ValueError(f"钱包池中没有该付款地址: {address}")
+    
+    def close(self):
+        """退出时清零所有私钥"""
+        for signer in self.signers:
+            signer.close()
     
     def _validate_transfer(self, to_address: str, amount: float, token_type: str) -> bool:
         """验证转账参数"""
@@ -140,25 +152,9 @@ class TronWallet:
             for attempt in range(3):
                 try:
                     trx_balance = self.tron.get_account_balance(address)
-                    # 调试：显示原始余额值和不同精度转换
-                    self.logger.info(f"TRX原始余额: {trx_balance}")
-                    
-                    # 测试不同的精度转换
-                    balance_raw = float(trx_balance)
-                    balance_6 = balance_raw / 1_000_000
-                    balance_9 = balance_raw / 1_000_000_000
-                    balance_12 = balance_raw / 1_000_000_000_000
-                    
-                    self.logger.info(f"不同精度转换结果:")
-                    self.logger.info(f"  原始值: {balance_raw}")
-                    self.logger.info(f"  除以1,000,000: {balance_6}")
-                    self.logger.info(f"  除以1,000,000,000: {balance_9}")
-                    self.logger.info(f"  除以1,000,000,000,000: {balance_12}")
-                    
-                    # 根据你的反馈，原始值已经是TRX单位，不需要转换
-                    # 直接使用原始值作为TRX余额
-                    trx_balance_float = balance_raw
-                    self.logger.info(f"使用原始值作为TRX余额: {trx_balance_float}")
+                    # tronpy 返回的已经是TRX单位，不需要转换
+                    trx_balance_float = float(trx_balance)
+                    debug_sampled(self.logger, "TRX余额 %s: %s", address, trx_balance_float)
                     break
                 except Exception as e:
                     self.logger.warning(f"TRX余额查询失败 (尝试 {attempt + 1}/3): {e}")
@@ -168,34 +164,17 @@ class TronWallet:
                     else:
                         # 最后一次尝试失败，使用API直接查询
                         try:
-                            api_url = f"https://api.trongrid.io/v1/accounts/{address}"
+                            api_url = f"{self.api_base_url}/v1/accounts/{address}"
                             data = self._make_api_request(api_url)
                             if data and 'data' in data and data['data']:
                                 raw_balance = data['data'][0].get('balance', 0)
-                                self.logger.info(f"API TRX原始余额: {raw_balance}")
                                 trx_balance_float = float(raw_balance)  # 直接使用原始值
-                                self.logger.info(f"API获取TRX余额成功: {trx_balance_float}")
+                                debug_sampled(self.logger, "API获取TRX余额 %s: %s", address, trx_balance_float)
                         except Exception as api_e:
                             self.logger.error(f"API获取TRX余额也失败: {api_e}")
             
             # 获取USDT余额
-            usdt_balance_float = 0.0
-            try:
-                usdt_balance = self.usdt_contract.functions.balanceOf(address)
-                usdt_balance_float = float(usdt_balance) / 1_000_000  # USDT有6位小数
-                self.logger.info(f"USDT余额查询成功: {usdt_balance_float}")
-            except Exception as e:
-                self.logger.error(f"USDT余额查询失败: {e}")
-                # 备用API查询
-                try:
-                    api_url = f"https://api.trongrid.io/v1/accounts/{address}/tokens/trc20"
-                    params = {'contract_address': self.usdt_contract_address}
-                    data = self._make_api_request(api_url, params)
-                    if data and 'data' in data and data['data']:
-                        usdt_balance_float = float(data['data'][0].get('balance', 0)) / 1_000_000
-                        self.logger.info(f"API获取USDT余额成功: {usdt_balance_float}")
-                except Exception as api_e:
-                    self.logger.error(f"API获取USDT余额也失败: {api_e}")
+            usdt_balance_float = self.get_usdt_balance(address)
             
             return {
                 'TRX': trx_balance_float,
@@ -206,10 +185,204 @@ class TronWallet:
             self.logger.error(f"获取余额失败: {e}")
             return {'TRX': 0.0, 'USDT': 0.0}
     
+    def get_usdt_balance(self, address: str) -> float:
+        """获取地址USDT余额（合约查询失败时走API）"""
+        try:
+            usdt_balance = self.usdt_contract.functions.balanceOf(address)
+            usdt_balance_float = float(usdt_balance) / 1_000_000  # USDT有6位小数
+            debug_sampled(self.logger, "USDT余额 %s: %s", address, usdt_balance_float)
+            return usdt_balance_float
+        except Exception as e:
+            self.logger.error(f"USDT余额查询失败: {e}")
+            # 备用API查询
+            try:
+                api_url = f"{self.api_base_url}/v1/accounts/{address}/tokens/trc20"
+                params = {'contract_address': self.usdt_contract_address}
+                data = self._make_api_request(api_url, params)
+                if data and 'data' in data and data['data']:
+                    usdt_balance_float = float(data['data'][0].get('balance', 0)) / 1_000_000
+                    debug_sampled(self.logger, "API获取USDT余额 %s: %s", address, usdt_balance_float)
+                    return usdt_balance_float
+            except Exception as api_e:
+                self.logger.error(f"API获取USDT余额也失败: {api_e}")
+            return 0.0
+    
+    def _get_usdt_account_snapshot(self, address: str) -> Dict[str, Any]:
+        """USDT转账预检所需的账户快照（USDT余额 + 能量），短时间内复用
+
+        能量来自资源预测器的缓存推算，通常只需查询USDT余额。
+        """
+        now = time.time()
+        with self._snapshot_lock:
+            snapshot = self._account_snapshots.get(address)
+        if snapshot and now - snapshot['fetched_at'] < self.snapshot_ttl:
+            cache_result('account_snapshot', True)
+            return dict(snapshot, cached=True)
+        cache_result('account_snapshot', False)
+        
+        usdt_future = self._query_executor.submit(self.get_usdt_balance, address)
+        resources = self.resource_forecaster.get_resources(address)
+        snapshot = {
+            'usdt': usdt_future.result(),
+            'available_energy': resources['available_energy'],
+            'fetched_at': now
+        }
+        with self._snapshot_lock:
+            self._account_snapshots[address] = snapshot
+        return dict(snapshot, cached=False)
+    
+    def invalidate_account_snapshot(self, address: str):
+        """转账广播后作废账户快照，下次预检重新查询"""
+        with self._snapshot_lock:
+            self._account_snapshots.pop(address, None)
+    
+    def invalidate_ref_block(self):
+        """作废模板构建器缓存的参考区块（广播报 TAPOS_ERROR 时），下一笔交易重新获取"""
+        if self.tx_builder:
+            self.tx_builder.invalidate_ref_block()
+    
+    def broadcast(self, txn) -> Dict[str, Any]:
+        """广播已签名交易；参考区块失效被节点拒绝时作废缓存后抛出"""
+        try:
+            return txn.broadcast()
+        except TaposError:
+            self.invalidate_ref_block()
+            raise
+    
+    def _evaluate_source(self, address: str, token_type: str, to_address: str, amount: float) -> Dict[str, Any]:
+        """评估钱包能否支付这笔转账，能支付时给出排序分数（优先不需燃烧TRX、能量和余额多的钱包）"""
+        try:
+            if token_type == 'TRX':
+                trx_balance = float(self.tron.get_account_balance(address))
+                if trx_balance < amount:
+                    return {'ok': False, 'error': f'余额不足: {trx_balance} < {amount}'}
+                return {'ok': True, 'score': (trx_balance,), 'balance': trx_balance}
+            
+            snapshot = self._get_usdt_account_snapshot(address)
+            if snapshot['usdt'] < amount:
+                return {'ok': False, 'error': f'余额不足: {snapshot["usdt"]} < {amount}'}
+            transfers = [(to_address, int(amount * 1_000_000))]
+            plan = self.resource_forecaster.plan_usdt_transfers(address, transfers)
+            if not plan['ok']:
+                # 资源是缓存推算的，判定不足时重新查询一次再下结论
+                self.resource_forecaster.get_resources(address, refresh=True)
+                plan = self.resource_forecaster.plan_usdt_transfers(address, transfers)
+            if not plan['ok']:
+                return {'ok': False, 'error': plan['error']}
+            return {
+                'ok': True,
+                'score': (plan['burn_trx'] == 0, plan['available_energy'], snapshot['usdt']),
+                'snapshot': snapshot,
+                'plan': plan
+            }
+        except Exception as e:
+            self.logger.error(f"评估付款钱包失败 {address}: {e}")
+            return {'ok': False, 'error': str(e)}
+    
+    def _acquire_source(self, token_type: str, to_address: str, amount: float) -> Tuple[Optional[str], Dict[str, Any]]:
+        """从钱包池挑选并占用付款钱包，返回 (地址, 评估结果)；没有可用钱包时地址为 None
+
+        优先选择空闲的钱包，所有可用钱包都忙时等待分数最高的一个；
+        占用后重新评估一次，因为上一笔转账可能刚改变了余额和能量。调用方负责 _release_source。
+        """
+        addresses = self.wallet_addresses
+        if not addresses:
+            return None, {'ok': False, 'error': '私钥不可用'}
+        if len(addresses) == 1:
+            checks = [self._evaluate_source(addresses[0], token_type, to_address, amount)]
+        else:
+            checks = list(self._pool_executor.map(
+                lambda address: self._evaluate_source(address, token_type, to_address, amount), addresses))
+        
+        eligible = sorted(
+            ((check['score'], address) for address, check in zip(addresses, checks) if check['ok']),
+            reverse=True
+        )
+        if not eligible:
+            if len(addresses) == 1:
+                return None, checks[0]
+            errors = '; '.join(f"{address[:8]}...: {check['error']}" for address, check in zip(addresses, checks))
+            return None, {'ok': False, 'error': f'钱包池中没有可支付的钱包（{errors}）'}
+        
+        check = {'ok': False, 'error': '钱包池中没有可支付的钱包'}
+        for blocking in (False, True):
+            for _, address in eligible:
+                lock = self._wallet_locks.setdefault(address, threading.Lock())
+                if not lock.acquire(blocking=blocking):
+                    continue
+                check = self._evaluate_source(address, token_type, to_address, amount)
+                if check['ok']:
+                    return address, check
+                lock.release()
+        return None, check
+    
+    def _release_source(self, address: str):
+        """释放付款钱包"""
+        self._wallet_locks[address].release()
+    
+    def get_pool_status(self) -> Dict[str, Any]:
+        """钱包池各钱包及合计的余额、可用能量和可负担的USDT转账笔数"""
+        def wallet_status(address):
+            usdt_future = self._query_executor.submit(self.get_usdt_balance, address)
+            forecast = self.resource_forecaster.affordable_transfers(address)
+            resources = self.resource_forecaster.get_resources(address)
+            return {
+                'address': address,
+                'trx': resources['trx_balance'] / 1_000_000,
+                'usdt': usdt_future.result(),
+                'available_energy': forecast['available_energy'],
+                'affordable': forecast['staked'],
+                'affordable_with_burn': forecast['with_burn'],
+                'busy': address in self._wallet_locks and self._wallet_locks[address].locked()
+            }
+        
+        wallets = list(self._pool_executor.map(wallet_status, self.wallet_addresses))
+        return {
+            'wallets': wallets,
+            'total': {
+                'trx': sum(w['trx'] for w in wallets),
+                'usdt': sum(w['usdt'] for w in wallets),
+                'available_energy': sum(w['available_energy'] for w in wallets),
+                'affordable': sum(w['affordable'] for w in wallets),
+                'affordable_with_burn': sum(w['affordable_with_burn'] for w in wallets)
+            },
+            'burn_enabled': self.resource_forecaster.burn_enabled
+        }
+    
+    def build_signed_transfer(self, token_type: str, to_address: str, amount: float,
+                              from_address: str, expiration_ms: int = 60_000,
+                              fee_limit: int = DEFAULT_FEE_LIMIT):
+        """构建并签名一笔转账交易（不广播）
+
+        expiration_ms 为交易有效期；批量转账时给每笔不同的有效期，
+        保证同一参考区块内金额和收款方相同的交易也有不同的txid。
+        fee_limit 仅对USDT转账有效，需要燃烧TRX支付能量时由资源规划给出。
+        """
+        if self.tx_builder and self.tx_builder.enabled:
+            try:
+                if token_type == 'TRX':
+                    txn = self.tx_builder.build_trx_transfer(
+                        from_address, to_address, int(amount * 1_000_000), expiration_ms)
+                else:
+                    txn = self.tx_builder.build_usdt_transfer(
+                        from_address, to_address, int(amount * 1_000_000), expiration_ms, fee_limit)
+                return self._signer_for(from_address).sign(txn)
+            except Exception as e:
+                self.logger.warning(f"模板构建交易失败，回退到tronpy构建: {e}")
+        
+        if token_type == 'TRX':
+            builder = self.tron.trx.transfer(from_address, to_address, int(amount * 1_000_000))
+        else:
+            builder = self.usdt_contract.functions.transfer(
+                to_address,
+                int(amount * 1_000_000)
+            ).with_owner(from_address).fee_limit(fee_limit)
+        return self._signer_for(from_address).sign(builder.expiration(expiration_ms).build())
+    
     def transfer_trx(self, to_address: str, amount: float) -> Dict[str, Any]:
         """转账TRX"""
         try:
-            self.logger.info(f"transfer_trx: to_address={repr(to_address)}, type={type(to_address)}, amount={amount}, type={type(amount)}")
+            self.logger.debug(f"transfer_trx: to_address={repr(to_address)}, type={type(to_address)}, amount={amount}, type={type(amount)}")
             to_address = to_address.strip()
             if not isinstance(to_address, str) or not to_address or not is_base58check_address(to_address):
                 self.logger.error(f"transfer_trx: 非法TRON主网地址: {repr(to_address)}")
@@ -219,20 +392,27 @@ class TronWallet:
                 return {'success': False, 'error': f'非法金额: {amount}'}
             if not self._validate_transfer(to_address, amount, 'TRX'):
                 return {'success': False, 'error': '参数验证失败'}
-            from_address = self.private_key.public_key.to_base58check_address()
-            balance = self.get_balance(from_address)
-            if balance['TRX'] < amount:
-                return {'success': False, 'error': f'余额不足: {balance["TRX"]} < {amount}'}
-            txn = self.tron.trx.transfer(
-                from_address,
-                to_address,
-                int(amount * 1_000_000)
-            )
-            signed_txn = txn.build().sign(self.private_key)
-            result = signed_txn.broadcast()
+            # 从钱包池挑选余额足够的付款钱包
+            from_address, check = self._acquire_source('TRX', to_address, amount)
+            if not from_address:
+                return {'success': False, 'error': check['error']}
+            try:
+                signed_txn = self.build_signed_transfer('TRX', to_address, amount, from_address)
+                # 广播前按当前带宽算出是否需要燃烧（转出的金额不算燃烧），查询失败不影响转账
+                try:
+                    burned_sun = self.resource_forecaster.bandwidth_burn(from_address, TRX_TX_BYTES)
+                except Exception as e:
+                    self.logger.warning(f"获取带宽失败，按未燃烧记账: {e}")
+                    burned_sun = 0
+                result = self.broadcast(signed_txn)
+                self.resource_forecaster.record_usage(
+                    from_address, bandwidth=TRX_TX_BYTES, burned_sun=burned_sun,
+                    transferred_sun=int(amount * 1_000_000))
+            finally:
+                self._release_source(from_address)
             txid = getattr(signed_txn, 'txid', None)
             self.logger.info(f"TRX转账txid: {txid}")
-            self.logger.info(f"TRX转账raw_data: {getattr(signed_txn, 'raw_data', None)}")
+            self.logger.debug(f"TRX转账raw_data: {getattr(signed_txn, 'raw_data', None)}")
             self.logger.info(f"TRX转账result: {result}")
             
             # 无论成功与否，都返回txid让用户查看
@@ -249,32 +429,53 @@ class TronWallet:
     
     def transfer_usdt(self, to_address: str, amount: float) -> Dict[str, Any]:
         """转账USDT"""
+        timings = {}
+        phase_start = time.perf_counter()
+        
+        def mark(phase: str):
+            nonlocal phase_start
+            now = time.perf_counter()
+            timings[phase] = round((now - phase_start) * 1000, 1)
+            phase_start = now
+        
         try:
-            self.logger.info(f"transfer_usdt: to_address={repr(to_address)}, type={type(to_address)}, amount={amount}, type={type(amount)}")
+            self.logger.debug(f"transfer_usdt: to_address={repr(to_address)}, type={type(to_address)}, amount={amount}, type={type(amount)}")
             to_address = to_address.strip()
             if not self._validate_transfer(to_address, amount, 'USDT'):
                 return {'success': False, 'error': '参数验证失败'}
-            from_address = self.private_key.public_key.to_base58check_address()
-            balance = self.get_balance(from_address)
-            if balance['USDT'] < amount:
-                return {'success': False, 'error': f'余额不足: {balance["USDT"]} < {amount}'}
-            resource = self.tron.get_account_resource(from_address)
-            energy_limit = resource.get('EnergyLimit', 0)
-            energy_used = resource.get('EnergyUsed', 0)
-            available_energy = energy_limit - energy_used
-            self.logger.info(f'USDT转账可用能量: {available_energy}')
-            energy_needed = 50000
-            if available_energy < energy_needed:
-                self.logger.error(f"能源不足: {available_energy} < {energy_needed}")
-                return {'success': False, 'error': f'能源不足: {available_energy} < {energy_needed}'}
-            txn = self.usdt_contract.functions.transfer(
-                to_address,
-                int(amount * 1_000_000)
-            ).with_owner(from_address).fee_limit(20_000_000).build().sign(self.private_key)
-            result = txn.broadcast()
+            mark('validate')
+            
+            # 预检并挑选付款钱包：USDT余额 + 按收款方估算的能量（资源来自缓存推算，不再每笔查询）
+            from_address, check = self._acquire_source('USDT', to_address, amount)
+            mark('preflight')
+            if not from_address:
+                self.logger.error(check['error'])
+                return {'success': False, 'error': check['error'], 'timings': timings}
+            try:
+                snapshot, plan = check['snapshot'], check['plan']
+                self.logger.info(
+                    f"USDT转账付款钱包: {from_address}, 可用能量: {plan['available_energy']}, "
+                    f"预计消耗: {plan['energy_needed']}, 需燃烧: {plan['burn_trx']} TRX"
+                )
+                plan_item = plan['items'][0]
+                
+                txn = self.build_signed_transfer('USDT', to_address, amount, from_address, fee_limit=plan_item['fee_limit'])
+                mark('build_sign')
+                result = self.broadcast(txn)
+                mark('broadcast')
+                self.invalidate_account_snapshot(from_address)
+                self.resource_forecaster.record_usage(
+                    from_address, energy=plan_item['energy'], bandwidth=USDT_TX_BYTES, burned_sun=plan_item['burn_sun'])
+                self.resource_forecaster.mark_recipient_funded(to_address)
+            finally:
+                self._release_source(from_address)
             txid = getattr(txn, 'txid', None)
             self.logger.info(f"USDT转账txid: {txid}")
             self.logger.info(f"USDT转账result: {result}")
+            self.logger.info(
+                f"USDT转账耗时(ms): 校验 {timings['validate']}, 预检 {timings['preflight']}"
+                f"{'(快照)' if snapshot['cached'] else ''}, 构建签名 {timings['build_sign']}, 广播 {timings['broadcast']}"
+            )
             
             # 无论成功与否，都返回txid让用户查看
             return {
@@ -282,11 +483,14 @@ class TronWallet:
                 'txid': txid,
                 'amount': amount,
                 'to_address': to_address,
-                'from_address': from_address
+                'from_address': from_address,
+                'energy': plan_item['energy'],
+                'burn_trx': plan_item['burn_sun'] / 1_000_000,
+                'timings': timings
             }
         except Exception as e:
             self.logger.error(f"USDT转账失败: {e}")
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'error': str(e), 'timings': timings}
     
     def get_transaction_info(self, txid: str) -> Dict[str, Any]:
         """获取交易信息"""
@@ -304,6 +508,39 @@ class TronWallet:
             self.logger.error(f"获取交易信息失败: {e}")
             return {'success': False, 'error': str(e)}
     
+    def _parse_receipt(self, txid: str, tx_info: Dict[str, Any]) -> Dict[str, Any]:
+        """解析交易回执：合约调用取 receipt.result（SUCCESS / REVERT / OUT_OF_ENERGY 等），TRX转账看 result"""
+        receipt = tx_info.get('receipt', {})
+        status = receipt.get('result')
+        if not status:
+            status = 'FAILED' if tx_info.get('result') == 'FAILED' else 'SUCCESS'
+        return {
+            'txid': txid,
+            'status': status,
+            'block': tx_info.get('blockNumber'),
+            'timestamp': tx_info.get('blockTimeStamp'),
+            'fee': tx_info.get('fee', 0) / 1_000_000,
+            'energy_used': receipt.get('energy_usage_total', 0),
+            'net_used': receipt.get('net_usage', 0)
+        }
+    
+    def get_transaction_receipts(self, txids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """并发查询一批交易回执，尚未上链或查询失败的为 None"""
+        def fetch(txid):
+            try:
+                tx_info = self.tron.get_transaction_info(txid)
+            except TransactionNotFound:
+                return None
+            except Exception as e:
+                self.logger.warning(f"查询交易回执失败 {txid}: {e}")
+                return None
+            if not tx_info.get('blockNumber'):
+                return None
+            return self._parse_receipt(txid, tx_info)
+        
+        futures = {txid: self._query_executor.submit(fetch, txid) for txid in txids}
+        return {txid: future.result() for txid, future in futures.items()}
+    
     def format_transfer_message(self, result: Dict[str, Any], token_type: str) -> str:
         """格式化转账结果消息"""
         if result['success']:
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Telegram Webhook 接收服务
+在机器人所在的事件循环中运行的轻量 HTTP 服务：校验密钥后把 Telegram 推送的更新直接放入
+Application.update_queue，不再长轮询 getUpdates。公网 HTTPS 一般由前置反向代理（nginx 等）终止。
+必须设置 WEBHOOK_SECRET_TOKEN：没有密钥的推送一律拒绝。
+"""
+
+import os
+import hmac
+import json
+import asyncio
+import logging
+from typing import Optional
+from telegram import Update
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+_MAX_BODY = 1024 * 1024
+_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+            405: 'Method Not Allowed', 413: 'Payload Too Large'}
+
+
+class WebhookServer:
+    """接收 Telegram 更新的 HTTP/1.1 服务（支持长连接，Telegram 会复用连接推送）"""
+
+    def __init__(self, application, listen: Optional[str] = None, port: Optional[int] = None,
+                 url_path: Optional[str] = None, secret_token: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.application = application
+        self.listen = listen or os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+        self.port = port if port is not None else int(os.getenv('WEBHOOK_PORT', '8443'))
+        self.url_path = '/' + (url_path or os.getenv('WEBHOOK_PATH', 'telegram')).strip('/')
+        self.secret_token = secret_token if secret_token is not None else os.getenv('WEBHOOK_SECRET_TOKEN')
+        # 单次读取（请求行、请求头、请求体）的超时，空闲的长连接到时关闭
+        self.read_timeout = float(os.getenv('WEBHOOK_READ_TIMEOUT', '60'))
+        self._server: Optional[asyncio.base_events.Server] = None
+        self.received = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Webhook服务已启动: http://{self.listen}:{self.port}{self.url_path}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self.logger.info("Webhook服务已停止")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await self._read(reader.readline())
+                if not request_line:
+                    break
+                method, path, version = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await self._read(reader.readline())
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                if length > _MAX_BODY:
+                    await self._respond(writer, 413, close=True)
+                    break
+                body = await self._read(reader.readexactly(length)) if length else b''
+                status = await self._process(method, path.split('?')[0], headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close' and version.strip() == 'HTTP/1.1'
+                await self._respond(writer, status, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        except Exception as e:
+            self.logger.error(f"处理Webhook请求失败: {e}")
+        finally:
+            writer.close()
+
+    async def _read(self, read):
+        """带超时的读取，超时抛出 asyncio.TimeoutError 由调用方关闭连接"""
+        return await asyncio.wait_for(read, self.read_timeout)
+
+    async def _process(self, method: str, path: str, headers: dict, body: bytes) -> int:
+        """校验并入队一条更新，返回HTTP状态码"""
+        if path != self.url_path:
+            return 404
+        if method != 'POST':
+            return 405
+        token = headers.get('x-telegram-bot-api-secret-token', '')
+        if not self.secret_token or not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.logger.warning("Webhook密钥校验失败，已拒绝")
+            return 403
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception as e:
+            self.logger.error(f"Webhook更新解析失败: {e}")
+            return 400
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return 200
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, close: bool = False):
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode()
+        )
+        await writer.drain()